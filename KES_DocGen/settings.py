@@ -89,6 +89,16 @@ DATABASES = {
     }
 }
 
+# Profil SQLite appliqué à chaque connexion (document/sqlite.py) ; {} pour le désactiver.
+# Pragmas propres à la connexion seulement : le journal WAL, enregistré dans le fichier,
+# s'active à part (manage.py db_maintenance --enable-wal). synchronous reste à FULL en
+# journal DELETE (NORMAL pourrait y corrompre la base sur coupure de courant) et passe à
+# NORMAL une fois la base en WAL (sqlite.WAL_PRAGMAS). Attente sur verrou : 5 s, le
+# timeout par défaut du pilote sqlite3.
+SQLITE_PRAGMAS = {
+    'cache_size': -20000,  # négatif : en Kio (~20 Mo)
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -139,8 +149,27 @@ REST_FRAMEWORK = {
     #'DEFAULT_PERMISSION_CLASSES': [
     #   'rest_framework.permissions.IsAuthenticated',
 #],
+    # Pagination par curseur (keyset) : voir document/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'document.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # JSON encodé / décodé par orjson s'il est installé (repli sur json) : voir document/renderers.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'document.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'document.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Taille de page maximale demandable avec ?page_size=
+API_MAX_PAGE_SIZE = 200
+
+# Droits par document (DocumentPermission) : filtrage des listes et contrôle par objet
+ENFORCE_DOCUMENT_PERMISSIONS = False
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:8000",
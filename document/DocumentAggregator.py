@@ -1,197 +1,341 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Prefetch
-from collections import OrderedDict
-from document.mod import AttestationFormationSerializer, FormationDetailSerializer
-from document.models import Affaire, AttestationFormation, Client, Entity, Facture, Formation, Offre, Participant, Product, Proforma, Rapport, Site
-from document.serializers import AffaireSerializer, FactureSerializer, OffreSerializer, ProformaSerializer, RapportSerializer
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Prefetch
+from collections import OrderedDict, defaultdict
+from itertools import islice
+from document.mod import (
+    AffaireFlatSerializer, AffaireSerializer, AttestationFormationFlatSerializer, AttestationFormationSerializer,
+    ClientSerializer, EntitySerializer, FactureFlatSerializer, FactureSerializer, FlatSerializer,
+    FormationDetailSerializer, FormationFlatSerializer, OffreFlatSerializer, OffreSerializer, ParticipantSerializer,
+    ProductSerializer, ProformaFlatSerializer, ProformaSerializer, RapportFlatSerializer, RapportSerializer,
+    SiteSerializer,
+)
+from document.conditional import compute_validators, not_modified, permission_validators, set_validators
+from document.filters import DocumentFilters, parse_datetime  # noqa: F401 (parse_datetime : compatibilité)
+from document.models import (
+    Affaire, AttestationFormation, Client, DocumentIndex, Entity, Facture, Formation, Offre, Participant, Product,
+    Proforma, Rapport, Site,
+)
+from document.pagination import keyset_page
+from document.permissions import readable, readable_index
+from document.renderers import NDJSONRenderer, ndjson_line
+from document.serializers import DocumentIndexSerializer
 
-from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from collections import OrderedDict
-from datetime import datetime
-from django.utils.dateparse import parse_datetime as django_parse_datetime
-from django.utils.timezone import make_aware, get_current_timezone
-def parse_datetime(date_str):
+class DocumentType:
     """
-    Parse une chaîne de date dans plusieurs formats possibles.
-    Retourne un objet datetime aware (avec timezone) ou None si le parsing échoue.
+    Source d'un type de document de l'agrégateur : requête, sérialiseur et ordre de pagination.
+    Les attributs `flat_*` servent au format normalisé (?include=), où les relations sont des ids.
     """
-    if not date_str:
-        return None
-
-    # Si c'est déjà un datetime
-    if isinstance(date_str, datetime):
-        return make_aware(date_str) if date_str.tzinfo is None else date_str
-
-    # Liste des formats de date possibles
-    date_formats = [
-        '%Y-%m-%d',  # 2025-01-09
-        '%d/%m/%Y',  # 09/01/2025
-        '%Y-%m-%d %H:%M:%S',  # 2025-01-09 15:30:00
-        '%Y-%m-%dT%H:%M:%S',  # 2025-01-09T15:30:00
-        '%Y-%m-%dT%H:%M:%S.%f',  # 2025-01-09T15:30:00.000
-        '%Y-%m-%dT%H:%M:%S.%fZ',  # 2025-01-09T15:30:00.000Z
-        '%d-%m-%Y',  # 09-01-2025
-        '%d-%m-%Y %H:%M:%S',  # 09-01-2025 15:30:00
-    ]
-
-    # Essayer d'abord le parser de Django
-    parsed_date = django_parse_datetime(date_str)
-    if parsed_date:
-        return make_aware(parsed_date) if parsed_date.tzinfo is None else parsed_date
-
-    # Essayer tous les formats
-    for date_format in date_formats:
-        try:
-            parsed_date = datetime.strptime(date_str, date_format)
-            return make_aware(parsed_date, timezone=get_current_timezone())
-        except ValueError:
-            continue
 
-    # Si la chaîne contient seulement une date (sans heure)
+    def __init__(self, model, serializer, select_related=(), prefetch_related=(), ordering=('-date_creation', '-id'),
+                 flat_serializer=None, flat_select_related=(), flat_prefetch_related=()):
+        self.model = model
+        self.serializer = serializer
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+        self.ordering = ordering
+        self.flat_serializer = flat_serializer or serializer
+        self.flat_select_related = flat_select_related
+        self.flat_prefetch_related = flat_prefetch_related
+
+    def queryset(self):
+        return self.model.objects.all()
+
+    def with_relations(self, queryset):
+        return queryset.select_related(*self.select_related).prefetch_related(*self.prefetch_related)
+
+    def with_flat_relations(self, queryset):
+        return queryset.select_related(*self.flat_select_related).prefetch_related(*self.flat_prefetch_related)
+
+
+
+DOCUMENT_TYPES = OrderedDict([
+    ('offres', DocumentType(
+        Offre, OffreSerializer,
+        select_related=('client', 'proforma', 'entity'),
+        prefetch_related=('produit', 'sites'),
+        flat_serializer=OffreFlatSerializer,
+        flat_select_related=('proforma',),
+        flat_prefetch_related=(
+            Prefetch('produit', queryset=Product.objects.only('id')),
+            Prefetch('sites', queryset=Site.objects.only('id')),
+        ),
+    )),
+    ('affaires', DocumentType(
+        Affaire, AffaireSerializer,
+        select_related=('offre__client', 'offre__entity', 'offre__proforma', 'facture'),
+        prefetch_related=(
+            'offre__produit',
+            'offre__sites',
+            'rapports__site',
+            'rapports__produit',
+            'formations__participants',
+            'formations__rapport__site',
+            'formations__rapport__produit',
+            'attestations__participant',
+        ),
+        flat_serializer=AffaireFlatSerializer,
+        flat_select_related=('facture',),
+        flat_prefetch_related=(
+            Prefetch('rapports', queryset=Rapport.objects.only('id', 'affaire')),
+            Prefetch('formations', queryset=Formation.objects.only('id', 'affaire')),
+            Prefetch('attestations', queryset=AttestationFormation.objects.only('id', 'affaire')),
+        ),
+    )),
+    ('proformas', DocumentType(Proforma, ProformaSerializer, flat_serializer=ProformaFlatSerializer)),
+    ('factures', DocumentType(Facture, FactureSerializer, flat_serializer=FactureFlatSerializer)),
+    ('rapports', DocumentType(
+        Rapport, RapportSerializer,
+        select_related=('site', 'produit'),
+        flat_serializer=RapportFlatSerializer,
+    )),
+    ('formations', DocumentType(
+        Formation, FormationDetailSerializer,
+        select_related=('rapport__site', 'rapport__produit'),
+        prefetch_related=('participants',),
+        ordering=('-id',),
+        flat_serializer=FormationFlatSerializer,
+        flat_prefetch_related=(Prefetch('participants', queryset=Participant.objects.only('id', 'formation')),),
+    )),
+    ('attestations', DocumentType(
+        AttestationFormation, AttestationFormationSerializer,
+        select_related=('participant',),
+        flat_serializer=AttestationFormationFlatSerializer,
+    )),
+])
+
+# Objets pouvant être joints à la réponse normalisée (?include=), en plus des documents
+INCLUDE_TYPES = OrderedDict(DOCUMENT_TYPES, **{
+    'clients': DocumentType(Client, ClientSerializer),
+    'entities': DocumentType(Entity, EntitySerializer),
+    'sites': DocumentType(Site, SiteSerializer),
+    'produits': DocumentType(Product, ProductSerializer),
+    'participants': DocumentType(Participant, ParticipantSerializer),
+})
+
+# Les réponses imbriquent documents et données de référence : toutes leurs versions comptent
+VERSIONED_MODELS = [source.model for source in INCLUDE_TYPES.values()]
+
+# Paramètres de pagination et de format, exclus des filtres
+RESERVED_PARAMS = {'page_size', 'types', 'format', 'include'} | {f'cursor_{doc_type}' for doc_type in DOCUMENT_TYPES}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Taille des lots lus (et préchargés) par l'export NDJSON
+EXPORT_CHUNK_SIZE = 500
+# Flux transverse (table DocumentIndex)
+FEED_PARAMS = {'page_size', 'cursor', 'format'}
+FEED_ORDERING = ('-date_creation', '-id')
+
+
+def get_page_size(params):
     try:
-        parsed_date = datetime.strptime(date_str.split()[0], '%Y-%m-%d')
-        return make_aware(parsed_date, timezone=get_current_timezone())
-    except (ValueError, IndexError):
-        return None
-    
+        page_size = int(params.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError({'page_size': "Un entier est attendu."})
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def document_feed(request, queryset):
+    """
+    Documents de tous types, du plus récent au plus ancien, lus dans DocumentIndex :
+    une requête pour la page (curseur `cursor`) et une pour les comptes par type.
+    """
+    params = request.query_params
+    filters = DocumentFilters(
+        {key: value for key, value in params.items() if key not in FEED_PARAMS},
+        [DocumentIndex]
+    )
+    queryset = readable_index(queryset.filter(filters.for_model(DocumentIndex)), request)
+
+    try:
+        entries, next_cursor = keyset_page(
+            queryset, FEED_ORDERING, cursor=params.get('cursor'), size=get_page_size(params)
+        )
+    except ValueError as e:
+        raise ValidationError({'cursor': str(e)})
+
+    counts = dict(queryset.order_by().values_list('doc_type').annotate(total=Count('id')))
+    return Response({
+        'results': DocumentIndexSerializer(entries, many=True).data,
+        'curseur_suivant': next_cursor,
+        'documents_par_type': counts,
+        'total_documents': sum(counts.values()),
+    })
+
+
 class DocumentAggregatorView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
     
     def get(self, request):
-        try:
-            # Récupérer tous les documents avec leurs relations
-            offres = Offre.objects.select_related(
-                'client',
-                'proforma',
-                'entity'
-            ).prefetch_related(
-                'produit',
-                'sites'
-            )
+        params = request.query_params
+        page_size = get_page_size(params)
+        doc_types = self.get_doc_types(params)
+        include = self.get_include(params)
+        filters = DocumentFilters(
+            {key: value for key, value in params.items() if key not in RESERVED_PARAMS},
+            [DOCUMENT_TYPES[doc_type].model for doc_type in doc_types]
+        )
 
-            affaires = Affaire.objects.select_related(
-                'offre__client',
-                'offre__entity',
-                'facture'
-            ).prefetch_related(
-                'rapports__site',
-                'rapports__produit',
-                'formations__participants',
-                'attestations__participant'
+        querysets = [
+            readable(DOCUMENT_TYPES[doc_type].queryset().filter(filters.for_model(DOCUMENT_TYPES[doc_type].model)), request)
+            for doc_type in doc_types
+        ]
+        related_models, salt = permission_validators(request, VERSIONED_MODELS)
+        etag, last_modified, totals = compute_validators(
+            querysets, related_models, salt=(request.accepted_media_type, salt)
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        # Export complet (?format=ndjson) : une ligne JSON par document, diffusée au fil de l'eau
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            response = StreamingHttpResponse(
+                self.stream_documents(doc_types, querysets),
+                content_type=NDJSONRenderer.media_type
             )
+            return set_validators(response, etag, last_modified)
 
+        try:
             # Initialiser le dictionnaire de réponse
             response_data = OrderedDict({
-                'documents': {
-                    'offres': [],
-                    'affaires': [],
-                    'proformas': [],
-                    'factures': [],
-                    'rapports': [],
-                    'formations': [],
-                    'attestations': []
-                },
+                'documents': OrderedDict(),
                 'metadata': {
                     'total_documents': 0,
-                    'documents_par_type': {}
+                    'documents_par_type': {},
+                    'curseurs_suivants': {},
                 }
             })
 
-            # Sérialiser les offres
-            for offre in offres:
-                offre_data = OffreSerializer(offre).data
-                response_data['documents']['offres'].append(offre_data)
-
-            # Sérialiser les affaires et leurs documents associés
-            for affaire in affaires:
-                affaire_data = AffaireSerializer(affaire).data
-                response_data['documents']['affaires'].append(affaire_data)
-                
-                # Ajouter les proformas
-                if hasattr(affaire.offre, 'proforma'):
-                    proforma_data = ProformaSerializer(affaire.offre.proforma).data
-                    response_data['documents']['proformas'].append(proforma_data)
-                
-                # Ajouter la facture
-                if hasattr(affaire, 'facture'):
-                    facture_data = FactureSerializer(affaire.facture).data
-                    response_data['documents']['factures'].append(facture_data)
-                
-                # Ajouter les rapports
-                rapports_data = RapportSerializer(affaire.rapports.all(), many=True).data
-                response_data['documents']['rapports'].extend(rapports_data)
-                
-                # Ajouter les formations
-                formations_data = FormationDetailSerializer(affaire.formations.all(), many=True).data
-                response_data['documents']['formations'].extend(formations_data)
-                
-                # Ajouter les attestations
-                attestations_data = AttestationFormationSerializer(affaire.attestations.all(), many=True).data
-                response_data['documents']['attestations'].extend(attestations_data)
-
-            # Calculer les métadonnées
-            for doc_type, docs in response_data['documents'].items():
-                response_data['metadata']['documents_par_type'][doc_type] = len(docs)
-                response_data['metadata']['total_documents'] += len(docs)
-
-            # Ajouter des filtres si spécifiés dans la requête
-            filters = request.query_params.dict()
-            if filters:
-                filtered_data = self.apply_filters(response_data['documents'], filters)
-                response_data['documents'] = filtered_data
-                # Recalculer les métadonnées pour les données filtrées
-                response_data['metadata'] = {
-                    'total_documents': sum(len(docs) for docs in filtered_data.values()),
-                    'documents_par_type': {
-                        doc_type: len(docs) for doc_type, docs in filtered_data.items()
-                    }
-                }
+            # Les filtres sont appliqués en base, avant toute sérialisation
+            for doc_type, queryset, total in zip(doc_types, querysets, totals):
+                source = DOCUMENT_TYPES[doc_type]
+                if include is None:
+                    serializer, with_relations = source.serializer, source.with_relations
+                else:
+                    serializer, with_relations = source.flat_serializer, source.with_flat_relations
 
-            return Response(response_data)
+                try:
+                    documents, next_cursor = keyset_page(
+                        with_relations(queryset),
+                        source.ordering,
+                        cursor=params.get(f'cursor_{doc_type}'),
+                        size=page_size
+                    )
+                except ValueError as e:
+                    raise ValidationError({f'cursor_{doc_type}': str(e)})
 
+                response_data['documents'][doc_type] = serializer(documents, many=True).data
+                response_data['metadata']['documents_par_type'][doc_type] = total
+                response_data['metadata']['total_documents'] += total
+                response_data['metadata']['curseurs_suivants'][doc_type] = next_cursor
+
+            if include is not None:
+                response_data['included'] = self.sideload(response_data['documents'], include)
+            return set_validators(Response(response_data), etag, last_modified)
+
+        except ValidationError:
+            raise
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def apply_filters(self, documents, filters):
+    def stream_documents(self, doc_types, querysets):
+        """
+        Parcourt chaque type de document par lots de EXPORT_CHUNK_SIZE : les relations sont
+        préchargées lot par lot, si bien que la mémoire utilisée ne dépend pas du volume.
+        """
+        for doc_type, queryset in zip(doc_types, querysets):
+            source = DOCUMENT_TYPES[doc_type]
+            queryset = source.with_relations(queryset).order_by(*source.ordering)
+
+            documents = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            while chunk := list(islice(documents, EXPORT_CHUNK_SIZE)):
+                for data in source.serializer(chunk, many=True).data:
+                    yield ndjson_line({'type': doc_type, 'document': data})
+
+    def get_include(self, params):
         """
-        Applique les filtres spécifiés aux documents.
+        Collections à joindre (?include=clients,sites...). None : format imbriqué habituel ;
+        liste (éventuellement vide) : format normalisé, relations sous forme d'ids.
         """
-        filtered_docs = OrderedDict()
-        
-        for doc_type, docs in documents.items():
-            filtered_docs[doc_type] = []
-            
-            for doc in docs:
-                match = True
-                for key, value in filters.items():
-                    # Gestion des filtres de date
-                    if 'date' in key.lower():
-                        try:
-                            doc_date = parse_datetime(doc.get(key, ''))
-                            filter_date = parse_datetime(value)
-                            if doc_date and filter_date:
-                                if doc_date.date() != filter_date.date():
-                                    match = False
-                                    break
-                        except:
-                            continue
-                    # Filtres de texte standard
-                    elif key in doc and str(doc[key]).lower() != str(value).lower():
-                        match = False
-                        break
-                
-                if match:
-                    filtered_docs[doc_type].append(doc)
-                    
-        return filtered_docs
+        if 'include' not in params:
+            return None
+        include = [name for name in params['include'].split(',') if name]
+        unknown = [name for name in include if name not in INCLUDE_TYPES]
+        if unknown:
+            raise ValidationError({'include': f"Collections inconnues : {', '.join(unknown)}."})
+        return include
+
+    def sideload(self, documents, include):
+        """
+        Charge une seule fois chaque objet référencé appartenant à une collection de `include`,
+        y compris les objets référencés par des objets joints (un offre jointe amène son client).
+        Les documents déjà présents dans `documents` ne sont pas répétés.
+        """
+        included = OrderedDict((name, OrderedDict()) for name in include)
+        seen = defaultdict(set)
+        for doc_type, items in documents.items():
+            seen[doc_type].update(item['id'] for item in items)
+
+        pending = self.references(
+            (DOCUMENT_TYPES[doc_type].flat_serializer, item)
+            for doc_type, items in documents.items()
+            for item in items
+        )
+        while True:
+            to_load = {
+                name: ids - seen[name]
+                for name, ids in pending.items()
+                if name in included and ids - seen[name]
+            }
+            if not to_load:
+                break
+            loaded = []
+            for name, ids in to_load.items():
+                source = INCLUDE_TYPES[name]
+                seen[name].update(ids)
+                queryset = readable(source.model.objects.filter(pk__in=ids), self.request)
+                queryset = source.with_flat_relations(queryset).order_by('pk')
+                for item in source.flat_serializer(queryset, many=True).data:
+                    included[name][item['id']] = item
+                    loaded.append((source.flat_serializer, item))
+            pending = self.references(loaded)
+
+        return OrderedDict((name, list(items.values())) for name, items in included.items())
+
+    def references(self, serialized):
+        """Regroupe par collection les ids référencés par des objets sérialisés à plat."""
+        references = defaultdict(set)
+        for serializer, item in serialized:
+            if issubclass(serializer, FlatSerializer):
+                for collection, pk in serializer.references(item):
+                    references[collection].add(pk)
+        return references
+
+    def get_doc_types(self, params):
+        if 'types' not in params:
+            return list(DOCUMENT_TYPES)
+        doc_types = [doc_type for doc_type in params['types'].split(',') if doc_type]
+        unknown = [doc_type for doc_type in doc_types if doc_type not in DOCUMENT_TYPES]
+        if unknown:
+            raise ValidationError({'types': f"Types inconnus : {', '.join(unknown)}."})
+        return doc_types
+
+class DocumentFeedView(APIView):
+    """Flux de tous les documents (filtres : client, entity, statut, doc_type, date_creation...)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return document_feed(request, DocumentIndex.objects.all())
 
 # Ajoutez cette configuration des URLs
 from django.urls import path
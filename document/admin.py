@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import Entity, Client, Site, Category, Product, Offre, Proforma, Facture, Rapport, Formation, Participant, \
-    AttestationFormation, Affaire
+    AttestationFormation, Affaire, DocumentSequence, ClientDocumentCounter, Job, DocumentIndex, DocumentPermission
 
 
 @admin.register(Entity)
@@ -88,6 +88,39 @@ class AttestationFormationAdmin(admin.ModelAdmin):
     list_filter = ['entity', 'client', 'formation']
 
 
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ['entity', 'doc_type', 'year', 'month', 'scope', 'last_number']
+    list_filter = ['entity', 'doc_type', 'year']
+
+
+@admin.register(ClientDocumentCounter)
+class ClientDocumentCounterAdmin(admin.ModelAdmin):
+    list_display = ['client', 'doc_type', 'total']
+    list_filter = ['doc_type']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'statut', 'attempts', 'run_after', 'date_creation']
+    list_filter = ['name', 'statut']
+
+
+@admin.register(DocumentIndex)
+class DocumentIndexAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'doc_type', 'client', 'statut', 'date_creation']
+    list_filter = ['doc_type', 'statut']
+    search_fields = ['reference']
+
+
+@admin.register(DocumentPermission)
+class DocumentPermissionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'content_type', 'object_id', 'can_read', 'can_edit']
+    list_filter = ['content_type', 'can_read', 'can_edit']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
+
+
 # Personnalisation de l'interface d'administration
 admin.site.site_header = "Gestion des Documents"
 admin.site.site_title = "Administration des Documents"
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class DocumentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'document'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid='document_sqlite_pragmas')
@@ -0,0 +1,152 @@
+"""
+GET conditionnels (ETag / Last-Modified).
+
+Les validateurs sont calculés par agrégat, sans charger ni sérialiser d'objet :
+nombre de lignes et Max(date_modification) du queryset filtré, plus la version
+(ModelVersion) des modèles imbriqués dans la réponse. Une requête dont
+If-None-Match / If-Modified-Since correspond reçoit une 304.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import serializers
+
+from .models import DocumentPermission, ModelVersion
+from .permissions import enforced
+
+
+@lru_cache(maxsize=None)
+def serializer_models(serializer_class):
+    """Modèles dont les données apparaissent dans les réponses de `serializer_class`."""
+    models = set()
+    collect_models(serializer_class(), models)
+    return frozenset(models)
+
+
+def collect_models(serializer, models):
+    model = serializer.Meta.model
+    models.add(model)
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.ModelSerializer):
+            collect_models(field, models)
+        elif isinstance(field, serializers.SerializerMethodField):
+            # Contenu inconnu : toutes les relations directes du modèle sont supposées lues
+            models.update(f.related_model for f in model._meta.concrete_fields if f.is_relation)
+        elif field.source != '*':
+            current = model
+            for attr in field.source.split('.'):
+                try:
+                    related = current._meta.get_field(attr)
+                except FieldDoesNotExist:
+                    break
+                if not related.is_relation:
+                    break
+                current = related.related_model
+                models.add(current)
+
+
+def has_date_modification(model):
+    try:
+        model._meta.get_field('date_modification')
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def queryset_state(queryset):
+    """(nombre de lignes, dernière modification ou None) du queryset, en une requête."""
+    queryset = queryset.order_by()
+    if has_date_modification(queryset.model):
+        state = queryset.aggregate(total=Count('pk'), last=Max('date_modification'))
+        return state['total'], state['last']
+    return queryset.count(), None
+
+
+def compute_validators(querysets, related_models=(), salt=''):
+    """
+    Retourne (etag, last_modified, comptes) pour une réponse construite à partir de
+    `querysets` et des modèles `related_models`.
+    Un modèle avec date_modification est suivi par son agrégat ; sa version ne sert qu'à
+    Last-Modified (une suppression ne fait pas avancer Max(date_modification)).
+    Les autres modèles sont suivis par leur version.
+    """
+    states = [queryset_state(queryset) for queryset in querysets]
+    models = set(related_models) | {queryset.model for queryset in querysets}
+    versions = ModelVersion.current(models)
+
+    aggregated = {queryset.model._meta.label_lower for queryset in querysets if has_date_modification(queryset.model)}
+    tag = (salt, states, sorted((label, version) for label, (version, _) in versions.items() if label not in aggregated))
+    etag = '"%s"' % hashlib.sha1(repr(tag).encode()).hexdigest()
+
+    dates = [last for _, last in states if last] + [date for _, date in versions.values()]
+    return etag, max(dates) if dates else None, [total for total, _ in states]
+
+
+def permission_validators(request, related_models):
+    """
+    Avec les droits par document, la réponse dépend de l'utilisateur et de ses droits :
+    (modèles suivis complétés de DocumentPermission, sel propre à l'utilisateur).
+    """
+    if not enforced(request):
+        return related_models, None
+    return set(related_models) | {DocumentPermission}, request.user.pk
+
+
+def not_modified(request, etag, last_modified):
+    """Réponse 304 si les validateurs envoyés par le client correspondent, sinon None."""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified et réponses 304 pour les actions list et retrieve d'un viewset."""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_get(queryset, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # Clé mal formée (/offres/abc/) : 404, comme get_object_or_404
+            raise Http404
+        return self.conditional_get(queryset, super().retrieve, request, *args, **kwargs)
+
+    def conditional_get(self, queryset, view, request, *args, **kwargs):
+        related_models, salt = permission_validators(request, serializer_models(self.get_serializer_class()))
+        etag, last_modified, _ = compute_validators(
+            [queryset],
+            related_models,
+            # La représentation dépend aussi des champs demandés (?fields=)
+            salt=(request.accepted_media_type, request.query_params.get('fields', ''), salt)
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+        return response
@@ -0,0 +1,182 @@
+"""
+Filtres de l'agrégateur de documents.
+
+Les paramètres de la requête sont analysés une seule fois (dates comprises), puis
+compilés en une condition Q par modèle. Syntaxe : `champ` (égalité), `champ__gte`,
+`champ__lte` (bornes incluses) et `champ__in` (liste séparée par des virgules).
+"""
+from datetime import datetime, timedelta
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime as django_parse_datetime
+from django.utils.timezone import get_current_timezone, make_aware
+from rest_framework.exceptions import ValidationError
+
+LOOKUPS = ('exact', 'gte', 'lte', 'in')
+
+# Formats acceptés en plus de l'ISO 8601 ; les premiers ne portent que sur un jour
+DAY_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y']
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%d-%m-%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M:%S',
+]
+
+
+def parse_datetime(date_str):
+    """
+    Parse une chaîne de date dans plusieurs formats possibles.
+    Retourne un objet datetime aware (avec timezone) ou None si le parsing échoue.
+    """
+    parsed = parse_date_value(date_str)
+    return parsed[0] if parsed else None
+
+
+def parse_date_value(date_str):
+    """
+    Comme parse_datetime, mais retourne (datetime aware, jour_entier) : `jour_entier`
+    indique une valeur sans heure, qui désigne alors toute la journée.
+    """
+    if not date_str:
+        return None
+
+    # Si c'est déjà un datetime
+    if isinstance(date_str, datetime):
+        return (make_aware(date_str) if date_str.tzinfo is None else date_str), False
+
+    date_str = date_str.strip()
+    for date_format in DAY_FORMATS:
+        try:
+            return make_aware(datetime.strptime(date_str, date_format), timezone=get_current_timezone()), True
+        except ValueError:
+            continue
+
+    # Puis le parser de Django (ISO 8601) et les autres formats
+    try:
+        parsed_date = django_parse_datetime(date_str)
+    except ValueError:
+        parsed_date = None
+    if parsed_date:
+        return (make_aware(parsed_date) if parsed_date.tzinfo is None else parsed_date), False
+
+    for date_format in DATETIME_FORMATS:
+        try:
+            return make_aware(datetime.strptime(date_str, date_format), timezone=get_current_timezone()), False
+        except ValueError:
+            continue
+    return None
+
+
+class FieldFilter:
+    """Un paramètre de filtre analysé : champ, opérateur et valeur(s) brute(s)."""
+
+    def __init__(self, param, field_name, lookup, raw):
+        self.param = param
+        self.field_name = field_name
+        self.lookup = lookup
+        self.values = [value.strip() for value in raw.split(',') if value.strip()] if lookup == 'in' else [raw]
+        self._dates = None
+
+    def dates(self):
+        """Valeurs de date analysées, une seule fois quel que soit le nombre de modèles."""
+        if self._dates is None:
+            dates = [parse_date_value(value) for value in self.values]
+            if None in dates:
+                raise ValidationError({self.param: "Date invalide."})
+            self._dates = dates
+        return self._dates
+
+    def compile(self, field):
+        """Condition Q pour `field`, le champ du modèle visé portant ce nom."""
+        if isinstance(field, (models.DateTimeField, models.DateField)):
+            return self.compile_date(field)
+
+        values = [self.to_python(field, value) for value in self.values]
+        name = field.attname if field.is_relation else field.name
+        if self.lookup == 'in':
+            return Q(**{f'{name}__in': values})
+        if self.lookup in ('gte', 'lte'):
+            return Q(**{f'{name}__{self.lookup}': values[0]})
+        # Texte libre : égalité insensible à la casse, comme auparavant
+        if not field.is_relation and not field.choices and isinstance(field, models.CharField):
+            return Q(**{f'{name}__iexact': values[0]})
+        return Q(**{name: values[0]})
+
+    def compile_date(self, field):
+        """
+        Les jours entiers deviennent des intervalles [début, lendemain[ : la colonne reste
+        comparée telle quelle, ce qui permet l'usage des index.
+        """
+        is_date = not isinstance(field, models.DateTimeField)
+        condition = Q()
+        for value, whole_day in self.dates():
+            start = value.date() if is_date else value
+            end = start + timedelta(days=1) if whole_day else None
+            if self.lookup == 'gte':
+                part = Q(**{f'{field.name}__gte': start})
+            elif self.lookup == 'lte':
+                part = Q(**{f'{field.name}__lt': end}) if end else Q(**{f'{field.name}__lte': start})
+            elif end:
+                part = Q(**{f'{field.name}__gte': start, f'{field.name}__lt': end})
+            else:
+                part = Q(**{field.name: start})
+            condition |= part
+        return condition
+
+    def to_python(self, field, value):
+        target = field.target_field if field.is_relation else field
+        # Champs à choix : la valeur est ramenée à sa clé (« valide » -> « VALIDE »)
+        if field.choices:
+            keys = {str(key).lower(): key for key, _ in field.flatchoices}
+            value = keys.get(value.lower(), value)
+        try:
+            return target.to_python(value)
+        except DjangoValidationError:
+            raise ValidationError({self.param: f"Valeur invalide : {value}."})
+
+
+class DocumentFilters:
+    """
+    Filtres d'une requête sur plusieurs modèles de documents. Une clé inconnue de tous
+    les modèles est refusée ; un filtre sur un champ qu'un modèle n'a pas est ignoré
+    pour ce modèle.
+    """
+
+    def __init__(self, params, document_models):
+        self.filters = []
+        errors = {}
+        for param, raw in params.items():
+            field_name, _, lookup = param.partition('__')
+            lookup = lookup or 'exact'
+            if lookup not in LOOKUPS:
+                errors[param] = f"Opérateur inconnu : {lookup} (attendu : {', '.join(LOOKUPS)})."
+            elif not any(get_concrete_field(model, field_name) for model in document_models):
+                errors[param] = "Filtre inconnu."
+            else:
+                self.filters.append(FieldFilter(param, field_name, lookup, raw))
+        if errors:
+            raise ValidationError(errors)
+        self._conditions = {}
+
+    def for_model(self, model):
+        if model not in self._conditions:
+            condition = Q()
+            for field_filter in self.filters:
+                field = get_concrete_field(model, field_filter.field_name)
+                if field is not None:
+                    condition &= field_filter.compile(field)
+            self._conditions[model] = condition
+        return self._conditions[model]
+
+
+def get_concrete_field(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.concrete else None
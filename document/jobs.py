@@ -0,0 +1,102 @@
+"""
+File de tâches locale, stockée en base (modèle Job) et exécutée par `manage.py run_jobs`.
+
+Les cascades lourdes (validation d'une offre ou d'un proforma) sont mises en file
+dans la même transaction que le changement de statut, puis exécutées hors requête HTTP.
+Les handlers doivent être idempotents : un job en échec est relancé tel quel.
+"""
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .models import Affaire, Job, Offre, Proforma
+
+RETRY_DELAY = timedelta(seconds=30)
+STALE_AFTER = timedelta(minutes=15)
+
+HANDLERS = {}
+
+
+def job(name):
+    """Enregistre la fonction décorée comme handler des jobs `name`."""
+    def decorator(func):
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=3, **payload):
+    if name not in HANDLERS:
+        raise ValueError(f"Aucun handler enregistré pour le job '{name}'.")
+    return Job.objects.create(name=name, payload=payload, max_attempts=max_attempts)
+
+
+def claim_next():
+    """
+    Réserve le prochain job exécutable. Le passage EN_ATTENTE -> EN_COURS est un
+    UPDATE conditionnel : si plusieurs workers visent le même job, un seul l'obtient.
+    """
+    while True:
+        job = Job.objects.filter(
+            statut='EN_ATTENTE', run_after__lte=now()
+        ).order_by('run_after', 'id').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, statut='EN_ATTENTE').update(
+            statut='EN_COURS',
+            attempts=F('attempts') + 1,
+            date_modification=now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run(job):
+    """Exécute un job réservé et enregistre son résultat, ou le replanifie en cas d'échec."""
+    try:
+        with transaction.atomic():
+            job.result = HANDLERS[job.name](**job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.statut = 'ECHEC'
+        else:
+            job.statut = 'EN_ATTENTE'
+            job.run_after = now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+    else:
+        job.statut = 'TERMINE'
+        job.error = ''
+    job.save()
+    return job
+
+
+def requeue_stale(older_than=STALE_AFTER):
+    """Remet en file les jobs restés EN_COURS après l'arrêt brutal d'un worker."""
+    return Job.objects.filter(
+        statut='EN_COURS', date_modification__lt=now() - older_than
+    ).update(statut='EN_ATTENTE', date_modification=now())
+
+
+@job('valider_offre')
+def valider_offre(offre_id):
+    """Crée le proforma d'une offre validée."""
+    offre = Offre.objects.select_for_update().select_related('client', 'entity').get(pk=offre_id)
+    proforma = Proforma.objects.filter(offre=offre).first()
+    if proforma is None:
+        proforma = offre.creer_affaire()
+    return {'proforma': proforma.pk, 'reference': proforma.reference}
+
+
+@job('valider_proforma')
+def valider_proforma(proforma_id):
+    """Crée l'affaire (et ses rapports et formations) d'un proforma validé."""
+    proforma = Proforma.objects.select_for_update().select_related('offre', 'client', 'entity').get(pk=proforma_id)
+    affaire = Affaire.objects.filter(offre_id=proforma.offre_id).first()
+    if affaire is None:
+        proforma.date_validation = now()
+        affaire = proforma.creer_affaire()
+    return {'affaire': affaire.pk, 'reference': affaire.reference}
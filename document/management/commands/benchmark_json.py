@@ -0,0 +1,52 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from document.models import Offre
+from document.optimizer import optimize
+from document.parsers import FastJSONParser
+from document.renderers import FastJSONRenderer, orjson
+from document.serializers import OffreDetailSerializer
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark JSON rendering/parsing of OffreDetailSerializer payloads: DRF vs orjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offres', type=int, default=200, help='Offers serialized into the payload')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per measure (best one is kept)')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed: FastJSONRenderer falls back to json'))
+
+        offres = optimize(Offre.objects.order_by('-id'), OffreDetailSerializer)[:options['offres']]
+        data = OffreDetailSerializer(offres, many=True).data
+        if not data:
+            self.stdout.write(self.style.WARNING('No offers to serialize, run seed_docs / create offers first'))
+            return
+
+        body = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != body:
+            self.stdout.write(self.style.ERROR('FastJSONRenderer output differs from JSONRenderer'))
+        self.stdout.write(f'{len(data)} offers, {len(body) / 1024:,.0f} KiB of JSON')
+
+        repeat = options['repeat']
+        for label, reference, fast in [
+            ('render', lambda: JSONRenderer().render(data), lambda: FastJSONRenderer().render(data)),
+            ('parse', lambda: JSONParser().parse(io.BytesIO(body)), lambda: FastJSONParser().parse(io.BytesIO(body))),
+        ]:
+            before, after = self.best(repeat, reference), self.best(repeat, fast)
+            self.stdout.write(
+                f'{label}: DRF {before * 1000:.2f} ms | fast {after * 1000:.2f} ms | x{before / after:.1f}'
+            )
+
+    def best(self, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from document.models import AttestationFormation, Offre, Rapport
+from document.optimizer import optimize
+from document.serializers import AttestationFormationListSerializer, OffreListSerializer, RapportListSerializer
+from document.values import values_mapping
+
+LISTS = {
+    'offres': (Offre, OffreListSerializer),
+    'rapports': (Rapport, RapportListSerializer),
+    'attestations': (AttestationFormation, AttestationFormationListSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare list serialization throughput (rows/s): DRF serializers vs values() rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows read per run')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per list (best one is kept)')
+        parser.add_argument('lists', nargs='*', help=f"Lists to measure among {', '.join(sorted(LISTS))} (default: all)")
+
+    def handle(self, *args, **options):
+        unknown = set(options['lists']) - set(LISTS)
+        if unknown:
+            raise CommandError(f"Unknown list(s): {', '.join(sorted(unknown))}")
+
+        for name in options['lists'] or sorted(LISTS):
+            model, serializer_class = LISTS[name]
+            queryset = model.objects.order_by('-id')[:options['rows']]
+            count = queryset.count()
+            if not count:
+                self.stdout.write(self.style.WARNING(f'{name}: no rows, skipped'))
+                continue
+
+            columns, build = values_mapping(serializer_class)
+            serializer = self.best(options['repeat'], lambda: serializer_class(
+                list(optimize(queryset, serializer_class)), many=True
+            ).data)
+            values = self.best(options['repeat'], lambda: [build(row) for row in queryset.values(*columns)])
+            self.stdout.write(
+                f'{name}: {count} rows | serializer {count / serializer:,.0f} rows/s'
+                f' | values() {count / values:,.0f} rows/s | x{serializer / values:.1f}'
+            )
+
+    def best(self, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,117 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from document.sqlite import configure
+
+# Comportement par défaut de Django sur SQLite : journal DELETE, synchronous FULL, timeout 5 s
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000}
+
+
+class Command(BaseCommand):
+    help = 'Concurrent read/write throughput on a scratch SQLite file: default settings vs SQLITE_PRAGMAS, with and without WAL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=3.0, help='Duration of each run')
+        parser.add_argument('--rows', type=int, default=20000, help='Rows preloaded in the scratch table')
+
+    def handle(self, *args, **options):
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+        profiles = [
+            ('default', DEFAULT_PRAGMAS),
+            ('SQLITE_PRAGMAS', pragmas),
+            ('SQLITE_PRAGMAS + WAL', {**pragmas, 'journal_mode': 'WAL'}),
+        ]
+        results = {}
+        for name, pragmas in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.prepare(path, pragmas, options['rows'])
+                results[name] = self.run(path, pragmas, options)
+            reads, writes, errors = results[name]
+            self.stdout.write(
+                f"{name}: {reads / options['seconds']:,.0f} reads/s | {writes / options['seconds']:,.0f} writes/s"
+                f" | {errors} locked error(s)"
+            )
+
+        base_reads, base_writes, _ = results.pop('default')
+        for name, (reads, writes, _) in results.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'Reads x{reads / max(base_reads, 1):.1f}, writes x{writes / max(base_writes, 1):.1f} with {name}'
+            ))
+
+    def connect(self, path, pragmas):
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        configure(connection.cursor(), pragmas)
+        return connection
+
+    def prepare(self, path, pragmas, rows):
+        connection = self.connect(path, pragmas)
+        connection.execute('CREATE TABLE document (id INTEGER PRIMARY KEY, client_id INTEGER, reference TEXT, statut TEXT)')
+        connection.execute('CREATE INDEX document_client ON document (client_id, id)')
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO document (client_id, reference, statut) VALUES (?, ?, ?)',
+            ((i % 200, f'KIP-OFF-{i:06d}', 'BROUILLON') for i in range(rows))
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def run(self, path, pragmas, options):
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def reader():
+            connection, done = self.connect(path, pragmas), 0
+            while not stop.is_set():
+                try:
+                    connection.execute(
+                        'SELECT id, reference, statut FROM document WHERE client_id = ? ORDER BY id DESC LIMIT 50',
+                        (random.randrange(200),)
+                    ).fetchall()
+                    done += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        counts['errors'] += 1
+            connection.close()
+            with lock:
+                counts['reads'] += done
+
+        def writer():
+            connection, done = self.connect(path, pragmas), 0
+            while not stop.is_set():
+                try:
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.execute(
+                        'INSERT INTO document (client_id, reference, statut) VALUES (?, ?, ?)',
+                        (random.randrange(200), f'KIP-PRO-{random.randrange(10 ** 6):06d}', 'BROUILLON')
+                    )
+                    connection.execute('UPDATE document SET statut = ? WHERE id = ?', ('ENVOYE', random.randrange(1, 1000)))
+                    connection.execute('COMMIT')
+                    done += 1
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    with lock:
+                        counts['errors'] += 1
+            connection.close()
+            with lock:
+                counts['writes'] += done
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counts['reads'], counts['writes'], counts['errors']
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from document.search import TABLE as SEARCH_TABLE, search_available
+from document.sqlite import enable_wal
+
+CHECKPOINT_MODES = ['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE']
+
+
+class Command(BaseCommand):
+    help = 'SQLite maintenance: ANALYZE, PRAGMA optimize, incremental vacuum and WAL checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-analyze', action='store_true', help='Do not run ANALYZE')
+        parser.add_argument('--vacuum-pages', type=int, default=0,
+                            help='Free pages to reclaim with incremental_vacuum (0: all)')
+        parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                            help='Switch the database to auto_vacuum=INCREMENTAL (runs a full VACUUM once)')
+        parser.add_argument('--enable-wal', action='store_true',
+                            help='Switch the database to journal_mode=WAL (persistent, adds -wal/-shm files)')
+        parser.add_argument('--checkpoint', default='TRUNCATE', choices=CHECKPOINT_MODES,
+                            help='WAL checkpoint mode (default: TRUNCATE)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('db_maintenance only applies to SQLite databases.')
+
+        with connection.cursor() as cursor:
+            if options['enable_wal']:
+                mode = enable_wal(cursor)
+                if mode != 'wal':
+                    raise CommandError(f'Could not switch to WAL (journal_mode is {mode}).')
+                self.stdout.write('Switched to journal_mode=WAL.')
+
+            if options['enable_incremental_vacuum']:
+                self.stdout.write('Switching to auto_vacuum=INCREMENTAL (full VACUUM)...')
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
+
+            if not options['skip_analyze']:
+                self.stdout.write('Running ANALYZE...')
+                cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+            self.stdout.write('PRAGMA optimize done.')
+
+            if search_available():
+                cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+                self.stdout.write('Full-text search index merged.')
+
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == 2:
+                cursor.execute('PRAGMA freelist_count')
+                free_pages = cursor.fetchone()[0]
+                cursor.execute(f"PRAGMA incremental_vacuum({int(options['vacuum_pages'])})")
+                cursor.fetchall()
+                cursor.execute('PRAGMA freelist_count')
+                self.stdout.write(f'Incremental vacuum: {free_pages - cursor.fetchone()[0]} page(s) reclaimed.')
+            else:
+                self.stdout.write('Incremental vacuum skipped (auto_vacuum is not INCREMENTAL, '
+                                  'see --enable-incremental-vacuum).')
+
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0].lower() == 'wal':
+                cursor.execute(f"PRAGMA wal_checkpoint({options['checkpoint']})")
+                busy, log_pages, checkpointed = cursor.fetchone()
+                status = 'blocked by active readers/writers' if busy else 'ok'
+                self.stdout.write(f'WAL checkpoint ({options["checkpoint"]}): {checkpointed}/{log_pages} page(s), {status}.')
+            else:
+                self.stdout.write('WAL checkpoint skipped (journal_mode is not WAL, see --enable-wal).')
+
+        self.stdout.write(self.style.SUCCESS('Database maintenance completed successfully!'))
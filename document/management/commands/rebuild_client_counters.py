@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from document.models import ClientDocumentCounter
+
+class Command(BaseCommand):
+    help = 'Rebuild per-client document counters from existing documents'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding client document counters...')
+        counters = ClientDocumentCounter.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{len(counters)} counters rebuilt successfully!'))
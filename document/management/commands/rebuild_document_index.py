@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from document.models import DocumentIndex
+
+class Command(BaseCommand):
+    help = 'Rebuild the cross-type document index from existing documents'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding document index...')
+        total = DocumentIndex.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{total} documents indexed successfully!'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from document.search import SearchIndex, search_available
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index (SQLite FTS5) from existing data'
+
+    def handle(self, *args, **kwargs):
+        if not search_available():
+            self.stdout.write(self.style.WARNING('No full-text search table on this database (SQLite + migrate required).'))
+            return
+        self.stdout.write('Rebuilding search index...')
+        total = SearchIndex.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{total} entries indexed successfully!'))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from document import jobs
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (offer and proforma validation cascades)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit as soon as the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=0, help='Exit after running this many jobs (0 = no limit)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Starting job worker...')
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f'{requeued} stale jobs requeued.')
+
+        processed = 0
+        while not options['max_jobs'] or processed < options['max_jobs']:
+            job = jobs.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            job = jobs.run(job)
+            processed += 1
+            if job.statut == 'ECHEC':
+                self.stdout.write(self.style.ERROR(f'{job} failed: {job.error.strip().splitlines()[-1]}'))
+            else:
+                self.stdout.write(f'{job}')
+
+        self.stdout.write(self.style.SUCCESS(f'{processed} jobs processed.'))
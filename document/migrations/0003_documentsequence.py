@@ -0,0 +1,69 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+# (modèle, code du compteur, filtres de la numérotation, champs définissant le scope)
+SEQUENCES = [
+    ('Offre', 'OFF', {}, []),
+    ('Proforma', 'PRO', {'doc_type': 'PRO'}, []),
+    ('Affaire', 'AFF', {'doc_type': 'AFF'}, []),
+    ('Facture', 'FAC', {'doc_type': 'FAC'}, []),
+    ('Rapport', 'RAP', {'doc_type': 'RAP'}, []),
+    ('AttestationFormation', 'ATT', {'doc_type': 'ATT'}, ['affaire__client_id', 'formation_id']),
+]
+
+
+def backfill_sequences(apps, schema_editor):
+    DocumentSequence = apps.get_model('document', 'DocumentSequence')
+
+    sequences = []
+    for model_name, doc_type, filters, scope_fields in SEQUENCES:
+        model = apps.get_model('document', model_name)
+        rows = model.objects.filter(**filters).annotate(
+            year=ExtractYear('date_creation'),
+            month=ExtractMonth('date_creation'),
+        ).values('entity_id', 'year', 'month', *scope_fields).annotate(
+            last_number=Max('sequence_number')
+        ).order_by()
+
+        for row in rows:
+            sequences.append(DocumentSequence(
+                entity_id=row['entity_id'],
+                doc_type=doc_type,
+                year=row['year'],
+                month=row['month'],
+                scope='-'.join(str(row[field]) for field in scope_fields),
+                last_number=row['last_number'] or 0,
+            ))
+
+    DocumentSequence.objects.bulk_create(sequences)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0002_alter_rapport_produit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=3)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('scope', models.CharField(blank=True, default='', max_length=50)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sequences', to='document.entity')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entity', 'doc_type', 'year', 'month', 'scope'), name='unique_document_sequence')],
+            },
+        ),
+        migrations.RunPython(backfill_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+COUNTERS = [
+    ('Offre', 'OFF'),
+    ('Proforma', 'PRO'),
+    ('Affaire', 'AFF'),
+    ('Facture', 'FAC'),
+    ('Rapport', 'RAP'),
+    ('AttestationFormation', 'ATT'),
+]
+
+
+def backfill_counters(apps, schema_editor):
+    ClientDocumentCounter = apps.get_model('document', 'ClientDocumentCounter')
+
+    counters = []
+    for model_name, doc_type in COUNTERS:
+        model = apps.get_model('document', model_name)
+        rows = model.objects.values('client_id').annotate(total=Count('id')).order_by()
+        counters.extend(
+            ClientDocumentCounter(client_id=row['client_id'], doc_type=doc_type, total=row['total'])
+            for row in rows
+        )
+
+    ClientDocumentCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0003_documentsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientDocumentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=3)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_counters', to='document.client')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('client', 'doc_type'), name='unique_client_document_counter')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0005_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='affaire',
+            index=models.Index(fields=['entity', 'date_creation'], name='affaire_entity_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='affaire',
+            index=models.Index(fields=['client', 'date_creation'], name='affaire_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='affaire',
+            index=models.Index(fields=['statut', 'date_creation'], name='affaire_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attestationformation',
+            index=models.Index(fields=['entity', 'date_creation'], name='attestation_entity_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attestationformation',
+            index=models.Index(fields=['client', 'date_creation'], name='attestation_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attestationformation',
+            index=models.Index(fields=['statut', 'date_creation'], name='attestation_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['entity', 'date_creation'], name='facture_entity_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['client', 'date_creation'], name='facture_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['statut', 'date_creation'], name='facture_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offre',
+            index=models.Index(fields=['entity', 'date_creation'], name='offre_entity_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offre',
+            index=models.Index(fields=['client', 'date_creation'], name='offre_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offre',
+            index=models.Index(fields=['statut', 'date_creation'], name='offre_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proforma',
+            index=models.Index(fields=['entity', 'date_creation'], name='proforma_entity_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proforma',
+            index=models.Index(fields=['client', 'date_creation'], name='proforma_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proforma',
+            index=models.Index(fields=['statut', 'date_creation'], name='proforma_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rapport',
+            index=models.Index(fields=['entity', 'date_creation'], name='rapport_entity_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rapport',
+            index=models.Index(fields=['client', 'date_creation'], name='rapport_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rapport',
+            index=models.Index(fields=['statut', 'date_creation'], name='rapport_statut_date_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+DOCUMENTS = [
+    ('Offre', 'OFF'),
+    ('Proforma', 'PRO'),
+    ('Affaire', 'AFF'),
+    ('Facture', 'FAC'),
+    ('Rapport', 'RAP'),
+    ('AttestationFormation', 'ATT'),
+]
+
+
+def backfill_index(apps, schema_editor):
+    DocumentIndex = apps.get_model('document', 'DocumentIndex')
+
+    for model_name, doc_type in DOCUMENTS:
+        model = apps.get_model('document', model_name)
+        rows = model.objects.values_list('pk', 'reference', 'entity_id', 'client_id', 'statut', 'date_creation')
+        DocumentIndex.objects.bulk_create(
+            [
+                DocumentIndex(
+                    doc_type=doc_type,
+                    object_id=pk,
+                    reference=reference,
+                    entity_id=entity_id,
+                    client_id=client_id,
+                    statut=statut,
+                    date_creation=date_creation,
+                )
+                for pk, reference, entity_id, client_id, statut, date_creation in rows.iterator()
+            ],
+            batch_size=500
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0006_document_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=3)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('reference', models.CharField(max_length=50)),
+                ('statut', models.CharField(max_length=20)),
+                ('date_creation', models.DateTimeField()),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='document.client')),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='document.entity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date_creation', 'id'], name='docindex_date_idx'), models.Index(fields=['client', 'date_creation', 'id'], name='docindex_client_date_idx'), models.Index(fields=['entity', 'date_creation', 'id'], name='docindex_entity_date_idx'), models.Index(fields=['statut', 'date_creation', 'id'], name='docindex_statut_date_idx'), models.Index(fields=['reference'], name='docindex_reference_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'object_id'), name='unique_document_index')],
+            },
+        ),
+        migrations.RunPython(backfill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:27
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_date_modification(apps, schema_editor):
+    # Faute d'historique, la dernière modification connue est la création
+    for model_name in ['Proforma', 'Affaire', 'Facture', 'Rapport', 'AttestationFormation']:
+        apps.get_model('document', model_name).objects.update(date_modification=F('date_creation'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0007_documentindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=100, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('date_modification', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='affaire',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='attestationformation',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='facture',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='proforma',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='rapport',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_date_modification, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0008_date_modification_modelversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='affaire',
+            index=models.Index(fields=['date_creation', 'id'], name='affaire_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attestationformation',
+            index=models.Index(fields=['date_creation', 'id'], name='attestation_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['date_creation', 'id'], name='facture_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['date_creation', 'id'], name='job_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offre',
+            index=models.Index(fields=['date_creation', 'id'], name='offre_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proforma',
+            index=models.Index(fields=['date_creation', 'id'], name='proforma_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rapport',
+            index=models.Index(fields=['date_creation', 'id'], name='rapport_date_idx'),
+        ),
+    ]
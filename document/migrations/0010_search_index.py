@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# (type, code de rowid, table, expression du contenu indexé) : voir document/search.py
+SOURCES = [
+    ('offres', 1, 'document_offre', "reference"),
+    ('proformas', 2, 'document_proforma', "reference"),
+    ('affaires', 3, 'document_affaire', "reference"),
+    ('factures', 4, 'document_facture', "reference"),
+    ('rapports', 5, 'document_rapport', "reference"),
+    ('clients', 6, 'document_client', "TRIM(nom || ' ' || COALESCE(email, ''))"),
+    ('sites', 7, 'document_site', "TRIM(nom || ' ' || COALESCE(localisation, ''))"),
+    ('participants', 8, 'document_participant', "TRIM(nom || ' ' || prenom || ' ' || COALESCE(email, ''))"),
+]
+
+
+def create_search_index(apps, schema_editor):
+    """Table FTS5 et remplissage initial ; rien à faire hors SQLite (recherche LIKE)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE document_search USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, content, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    for kind, code, table, content in SOURCES:
+        schema_editor.execute(
+            f"INSERT INTO document_search (rowid, kind, object_id, content) "
+            f"SELECT id * 16 + {code}, '{kind}', id, {content} FROM {table}"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS document_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
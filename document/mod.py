@@ -105,6 +105,76 @@ class AffaireSerializer(serializers.ModelSerializer):
                  'date_fin_prevue', 'offre', 'rapports', 'formations',
                  'attestations', 'facture']
 
+# Serializers « à plat » du format normalisé (?include=) : les relations sont des
+# identifiants, et Meta.sideload indique dans quelle collection de `included` les chercher.
+class FlatSerializer(serializers.ModelSerializer):
+    class Meta:
+        sideload = {}
+
+    @classmethod
+    def references(cls, data):
+        """Identifiants référencés par un objet sérialisé : [(collection, id), ...]."""
+        for field, collection in cls.Meta.sideload.items():
+            value = data.get(field)
+            for pk in value if isinstance(value, list) else [value]:
+                if pk is not None:
+                    yield collection, pk
+
+class OffreFlatSerializer(FlatSerializer):
+    proforma = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = Offre
+        fields = ['id', 'reference', 'client', 'entity', 'date_creation', 'statut',
+                  'date_modification', 'date_validation', 'produit', 'sites', 'proforma']
+        sideload = {'client': 'clients', 'entity': 'entities', 'produit': 'produits',
+                    'sites': 'sites', 'proforma': 'proformas'}
+
+class ProformaFlatSerializer(FlatSerializer):
+    class Meta:
+        model = Proforma
+        fields = ['id', 'reference', 'statut', 'date_creation', 'offre', 'client', 'entity']
+        sideload = {'offre': 'offres', 'client': 'clients', 'entity': 'entities'}
+
+class FactureFlatSerializer(FlatSerializer):
+    class Meta:
+        model = Facture
+        fields = ['id', 'reference', 'statut', 'date_creation', 'affaire', 'client', 'entity']
+        sideload = {'affaire': 'affaires', 'client': 'clients', 'entity': 'entities'}
+
+class AffaireFlatSerializer(FlatSerializer):
+    rapports = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    formations = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    attestations = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    facture = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = Affaire
+        fields = ['id', 'reference', 'date_creation', 'statut', 'date_debut', 'date_fin_prevue',
+                  'offre', 'client', 'entity', 'rapports', 'formations', 'attestations', 'facture']
+        sideload = {'offre': 'offres', 'client': 'clients', 'entity': 'entities', 'rapports': 'rapports',
+                    'formations': 'formations', 'attestations': 'attestations', 'facture': 'factures'}
+
+class RapportFlatSerializer(FlatSerializer):
+    class Meta:
+        model = Rapport
+        fields = ['id', 'reference', 'statut', 'date_creation', 'affaire', 'site', 'produit']
+        sideload = {'affaire': 'affaires', 'site': 'sites', 'produit': 'produits'}
+
+class FormationFlatSerializer(FlatSerializer):
+    participants = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Formation
+        fields = ['id', 'titre', 'date_debut', 'date_fin', 'description', 'affaire', 'rapport', 'participants']
+        sideload = {'affaire': 'affaires', 'rapport': 'rapports', 'participants': 'participants'}
+
+class AttestationFormationFlatSerializer(FlatSerializer):
+    class Meta:
+        model = AttestationFormation
+        fields = ['id', 'reference', 'details_formation', 'date_creation', 'affaire', 'formation', 'participant']
+        sideload = {'affaire': 'affaires', 'formation': 'formations', 'participant': 'participants'}
+
 # ViewSets
 class OffreViewSet(viewsets.ModelViewSet):
     queryset = Offre.objects.all()
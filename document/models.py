@@ -1,7 +1,13 @@
-from django.db import models
+import weakref
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
 from django.core.validators import RegexValidator
-from django.db.models import Max
-from django.utils.timezone import now
+from django.db.models import Case, Count, F, Max, Value, When
+from django.utils.timezone import localtime, now
 
 
 class Entity(models.Model):
@@ -60,6 +66,150 @@ class Product(models.Model):
         return self.name
 
 
+def reserve_counter(model, field, count=1, seed=None, **lookup):
+    """
+    Incrémente de `count` le compteur `field` de la ligne identifiée par `lookup`
+    (créée si besoin avec la valeur `seed()`) et retourne la première valeur réservée.
+    L'incrément est un UPDATE unique, qui verrouille la ligne jusqu'à la fin de la transaction.
+    """
+    with transaction.atomic():
+        counter, created = model.objects.select_for_update().get_or_create(
+            defaults={field: seed or 0},  # seed n'est appelé qu'à la création
+            **lookup
+        )
+        model.objects.filter(pk=counter.pk).update(**{field: F(field) + count})
+        counter.refresh_from_db(fields=[field])
+    return getattr(counter, field) - count + 1
+
+
+def month_bounds(date):
+    """Début et fin (exclue) du mois de `date`, dans le fuseau horaire courant."""
+    start = localtime(date).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def document_indexes(prefix):
+    """
+    Index composites des documents, alignés sur les filtres les plus fréquents :
+    pagination par curseur (date de création, id) et listes filtrées par client,
+    entité ou statut puis triées par date de création. La numérotation (entité, mois)
+    passe par l'index entité/date : chaque table n'a qu'un type de document.
+    """
+    return [
+        models.Index(fields=['date_creation', 'id'], name=f'{prefix}_date_idx'),
+        models.Index(fields=['entity', 'date_creation'], name=f'{prefix}_entity_date_idx'),
+        models.Index(fields=['client', 'date_creation'], name=f'{prefix}_client_date_idx'),
+        models.Index(fields=['statut', 'date_creation'], name=f'{prefix}_statut_date_idx'),
+    ]
+
+
+class DocumentSequence(models.Model):
+    """
+    Compteur des numéros de séquence par (entité, type de document, année, mois).
+    Le champ `scope` permet de subdiviser un compteur (ex: attestations par client et formation).
+    """
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name="sequences")
+    doc_type = models.CharField(max_length=3)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    scope = models.CharField(max_length=50, blank=True, default='')
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['entity', 'doc_type', 'year', 'month', 'scope'],
+                name='unique_document_sequence'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.entity_id}-{self.doc_type}-{self.year}-{self.month:02d} #{self.last_number}"
+
+    @classmethod
+    def allocate(cls, entity, doc_type, date=None, count=1, scope='', seed=None):
+        """
+        Réserve `count` numéros consécutifs et retourne le premier.
+        `seed` est appelé une seule fois, à la création du compteur, pour reprendre
+        la numérotation à partir des documents déjà existants.
+        """
+        date = date or now()
+        return reserve_counter(
+            cls, 'last_number', count, seed,
+            entity=entity, doc_type=doc_type, year=date.year, month=date.month, scope=scope
+        )
+
+
+class ClientDocumentCounter(models.Model):
+    """
+    Nombre de documents de chaque type par client.
+    Maintenu dans la même transaction que l'insertion (et décrémenté à la suppression),
+    il remplace le count() effectué à chaque génération de référence.
+    """
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="document_counters")
+    doc_type = models.CharField(max_length=3)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'doc_type'], name='unique_client_document_counter')
+        ]
+
+    def __str__(self):
+        return f"{self.client_id}-{self.doc_type} #{self.total}"
+
+    @classmethod
+    def increment(cls, client, doc_type, count=1, seed=None):
+        """Réserve `count` rangs consécutifs pour le client et retourne le premier."""
+        return reserve_counter(cls, 'total', count, seed, client=client, doc_type=doc_type)
+
+    @classmethod
+    def increment_many(cls, doc_type, counts, seed=None):
+        """
+        Variante de increment() pour plusieurs clients à la fois, en un nombre constant de requêtes.
+        `counts` associe un client_id au nombre de rangs à réserver ; `seed(client_ids)` retourne
+        le nombre de documents existants des clients dont le compteur doit être créé.
+        Retourne {client_id: premier rang réservé}.
+        """
+        with transaction.atomic():
+            rows = cls.objects.select_for_update().filter(doc_type=doc_type, client_id__in=counts)
+            existants = set(rows.values_list('client_id', flat=True))
+            manquants = [client_id for client_id in counts if client_id not in existants]
+            if manquants:
+                totaux = seed(manquants) if seed else {}
+                cls.objects.bulk_create(
+                    [cls(client_id=client_id, doc_type=doc_type, total=totaux.get(client_id, 0)) for client_id in manquants],
+                    ignore_conflicts=True
+                )
+            rows.update(total=F('total') + Case(
+                *[When(client_id=client_id, then=Value(count)) for client_id, count in counts.items()],
+                default=Value(0)
+            ))
+            totals = dict(rows.values_list('client_id', 'total'))
+        return {client_id: totals[client_id] - count + 1 for client_id, count in counts.items()}
+
+    @classmethod
+    def decrement(cls, client_id, doc_type, count=1):
+        cls.objects.filter(
+            client_id=client_id, doc_type=doc_type, total__gte=count
+        ).update(total=F('total') - count)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Recalcule tous les compteurs à partir des documents existants."""
+        cls.objects.all().delete()
+        counters = []
+        for model in DOCUMENT_MODELS:
+            rows = model.objects.values('client_id').annotate(total=Count('id')).order_by()
+            counters.extend(
+                cls(client_id=row['client_id'], doc_type=model.reference_code, total=row['total'])
+                for row in rows
+            )
+        return cls.objects.bulk_create(counters)
+
+
 class Document(models.Model):
     STATUTS = [
         ('BROUILLON', 'Brouillon'),
@@ -71,12 +221,18 @@ class Document(models.Model):
     reference = models.CharField(max_length=50, unique=True, editable=False)
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
     date_creation = models.DateTimeField(auto_now_add=True)
+    # À renseigner aussi dans les QuerySet.update() : sert de validateur HTTP (ETag / Last-Modified)
+    date_modification = models.DateTimeField(auto_now=True)
     statut = models.CharField(max_length=10, choices=STATUTS, default='BROUILLON')
     doc_type = models.CharField(
         max_length=3,
         validators=[RegexValidator(regex='^[A-Z]{3}$')]
     )  # PRF, FAC, etc.
     sequence_number = models.IntegerField()
+    permissions = GenericRelation('DocumentPermission')
+
+    reference_code = None  # OFF, PRO, etc. : code utilisé dans la référence et les compteurs
+    permission_parent = None  # Clé du document dont les droits sont copiés à la création
 
     class Meta:
         abstract = True
@@ -84,44 +240,92 @@ class Document(models.Model):
     def __str__(self):
         return self.reference
 
+    def allocate_sequence_number(self, scope='', count=1, **filters):
+        """
+        Réserve le prochain numéro de séquence du mois pour ce document
+        (ou les `count` suivants, pour une création en masse).
+        """
+        date = self.date_creation or now()
+
+        def last_sequence():
+            return self.sequence_queryset(date, **filters).aggregate(
+                Max('sequence_number')
+            )['sequence_number__max'] or 0
+
+        return DocumentSequence.allocate(
+            self.entity, self.reference_code, date, count=count, scope=scope, seed=last_sequence
+        )
 
+    def sequence_queryset(self, date, **filters):
+        """Documents numérotés dans la même séquence que celui-ci pour le mois de `date`."""
+        start, end = month_bounds(date)
+        return type(self).objects.filter(
+            entity=self.entity,
+            date_creation__gte=start,
+            date_creation__lt=end,
+            **filters
+        )
+
+    def build_reference(self, rank, date):
+        """Référence du document à partir de son rang chez le client et de sa date de création."""
+        raise NotImplementedError
+
+    def next_client_rank(self, client):
+        """Réserve le rang du document parmi les documents de même type du client."""
+        return ClientDocumentCounter.increment(
+            client,
+            self.reference_code,
+            seed=lambda: type(self).objects.filter(client=client).count()
+        )
+
+    @classmethod
+    def next_client_ranks(cls, counts):
+        """Réserve des rangs pour plusieurs clients : {client_id: nombre} -> {client_id: premier rang}."""
+        def existing_counts(client_ids):
+            return dict(
+                cls.objects.filter(client_id__in=client_ids).order_by()
+                .values('client_id').annotate(total=Count('id')).values_list('client_id', 'total')
+            )
+
+        return ClientDocumentCounter.increment_many(cls.reference_code, counts, seed=existing_counts)
 
 
 class Offre(Document):
+    reference_code = 'OFF'
+
     produit = models.ManyToManyField(Product)
-    date_modification = models.DateTimeField(auto_now=True)
     date_validation = models.DateTimeField(blank=True, null=True)  # Date d'acceptation
     sites = models.ManyToManyField(Site)
 
+    class Meta:
+        indexes = document_indexes('offre')
+
+    def build_reference(self, rank, date):
+        return f"{self.entity.code}-OFF-{date.year}-{date.month:02d}-{self.client.id}-{rank}-{self.sequence_number:04d}"
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.reference:
             if not self.sequence_number:
-                last_sequence = Offre.objects.filter(
-                    entity=self.entity,
-                    date_creation__year=now().year,
-                    date_creation__month=now().month
-                ).aggregate(Max('sequence_number'))['sequence_number__max']
-                self.sequence_number = (last_sequence or 0) + 1
-                print(self.sequence_number, last_sequence)
-            total_offres_client = Offre.objects.filter(client=self.client).count() + 1
+                self.sequence_number = self.allocate_sequence_number()
+            total_offres_client = self.next_client_rank(self.client)
             date = self.date_creation or now()
-            self.reference = f"{self.entity.code}-OFF-{date.year}-{date.month:02d}-{self.client.id}-{total_offres_client}-{self.sequence_number:04d}"
+            self.reference = self.build_reference(total_offres_client, date)
 
-        if self.statut == 'VALIDE' and not self.date_validation:
-            self.date_validation = now() 
-            self.creer_affaire()
-        elif self.statut == 'VALIDE' and self.date_validation:
+        if self.statut == 'VALIDE':
             self.date_validation = now()
-            self.creer_affaire()
 
-        print(self.reference)
         super().save(*args, **kwargs)
 
+        if self.statut == 'VALIDE' and not Proforma.objects.filter(offre=self).exists():
+            # Création du proforma déléguée à la file de jobs, comme pour /offres/{pk}/valider/
+            from . import jobs  # Import local pour éviter les imports circulaires
+            jobs.enqueue('valider_offre', offre_id=self.pk)
+
     def creer_affaire(self):
         """
         Crée l'affaire et le proforma associés à l'offre.
-        Cette méthode est appelée automatiquement quand le statut passe à 'VALIDE'.
+        Appelée par la file de jobs (valider_offre) quand le statut passe à 'VALIDE'.
         """
         if self.statut != 'VALIDE':
             raise ValueError("L'offre doit être en statut 'VALIDE' pour créer une affaire.")
@@ -147,31 +351,37 @@ class Offre(Document):
 
 
 class Proforma(Document):
+    reference_code = 'PRO'
+    permission_parent = 'offre'
+
     offre = models.OneToOneField(Offre, on_delete=models.CASCADE, related_name="proforma")
 
+    class Meta:
+        indexes = document_indexes('proforma')
+
+    def build_reference(self, rank, date):
+        return f"{self.entity.code}-PRO-{self.offre.id}-{date.year}-{date.month:02d}-{self.client.id}-{rank}-{self.sequence_number:04d}"
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.reference:
             if not self.sequence_number:
-                last_sequence = Proforma.objects.filter(
-                    entity=self.entity,
-                    doc_type='PRO',
-                    date_creation__year=now().year,
-                    date_creation__month=now().month
-                ).aggregate(Max('sequence_number'))['sequence_number__max']
-                self.sequence_number = (last_sequence or 0) + 1
-            total_proformas_client = Proforma.objects.filter(client=self.client).count() + 1
+                self.sequence_number = self.allocate_sequence_number(doc_type='PRO')
+            total_proformas_client = self.next_client_rank(self.client)
             date = self.date_creation or now()
-            self.reference = f"{self.entity.code}-PRO-{self.offre.id}-{date.year}-{date.month:02d}-{self.client.id}-{total_proformas_client}-{self.sequence_number:04d}"
-        if self.statut == 'VALIDE':
-            self.date_validation = now()
-            self.creer_affaire()
-
+            self.reference = self.build_reference(total_proformas_client, date)
         super().save(*args, **kwargs)
 
+        if self.statut == 'VALIDE' and not Affaire.objects.filter(offre_id=self.offre_id).exists():
+            # L'affaire, ses rapports et ses formations sont créés par la file de jobs,
+            # comme pour /proformas/{pk}/valider/
+            from . import jobs  # Import local pour éviter les imports circulaires
+            jobs.enqueue('valider_proforma', proforma_id=self.pk)
+
     def creer_affaire(self):
             """
             Crée l'affaire et le proforma associés à l'offre.
-            Cette méthode est appelée automatiquement quand le statut passe à 'VALIDE'.
+            Appelée par la file de jobs (valider_proforma) quand le statut passe à 'VALIDE'.
             """
             if self.statut != 'VALIDE':
                 raise ValueError("L'offre doit être en statut 'VALIDE' pour créer une affaire.")
@@ -195,6 +405,9 @@ class Proforma(Document):
             return affaire
 
 class Affaire(Document):
+    reference_code = 'AFF'
+    permission_parent = 'offre'
+
     offre = models.OneToOneField(Offre, on_delete=models.CASCADE, related_name="affaire")
     date_debut = models.DateTimeField(auto_now_add=True)
     date_fin_prevue = models.DateTimeField(null=True, blank=True)
@@ -208,50 +421,72 @@ class Affaire(Document):
         default='EN_COURS'
     )
 
+    class Meta:
+        indexes = document_indexes('affaire')
+
     def sync_with_offre(self):
         """Synchronise les champs de l'Affaire avec ceux de l'Offre"""
         self.client = self.offre.client
         self.entity = self.offre.entity
 
     def cree_rapports(self):
-        """Crée les rapports pour chaque combinaison site-produit"""
-        from .models import Rapport  # Import local pour éviter les imports circulaires
-        
-        # Supprime les rapports existants
-        Rapport.objects.filter(affaire=self).delete()
-        
-        # Crée un rapport pour chaque combinaison site-produit
-        for site in self.offre.sites.all():
-            for produit in self.offre.produit.all():
-                Rapport.objects.create(
-                    affaire=self,
-                    site=site,
-                    produit=produit,
-                    client=self.client,
-                    entity=self.entity,
-                    doc_type='RAP',
-                    statut='BROUILLON'
-                )
-                if produit.category.code == 'FOR':
-                    self.cree_formation(site, produit)
+        """Crée les rapports (et les formations) pour chaque combinaison site-produit"""
+        return self.sync_rapports()
 
-    def cree_formation(self, site, produit):
-        """Crée une formation pour le site et le produit donnés"""
-        from .models import Formation
-        formation = Formation.objects.create(
-            titre=f"Formation {produit.name}",
+    def sync_rapports(self):
+        """
+        Aligne les rapports sur la matrice sites × produits actuelle de l'offre :
+        seuls les couples manquants sont créés et seuls les rapports orphelins
+        (site ou produit retiré de l'offre, doublons) sont supprimés.
+        """
+        from .services import bulk_create_rapports  # Import local pour éviter les imports circulaires
+
+        sites = {site.pk: site for site in self.offre.sites.all()}
+        produits = {produit.pk: produit for produit in self.offre.produit.select_related('category')}
+
+        existants = set()
+        orphelins = []
+        for pk, site_id, produit_id in Rapport.objects.filter(affaire=self).values_list('pk', 'site_id', 'produit_id'):
+            if site_id in sites and produit_id in produits and (site_id, produit_id) not in existants:
+                existants.add((site_id, produit_id))
+            else:
+                orphelins.append(pk)
+
+        if orphelins:
+            Rapport.objects.filter(pk__in=orphelins).delete()
+
+        manquants = [
+            (site, produit)
+            for site in sites.values()
+            for produit in produits.values()
+            if (site.pk, produit.pk) not in existants
+        ]
+        if not manquants:
+            return []
+        return bulk_create_rapports(self, manquants)
+
+    def nouvelle_formation(self, rapport):
+        """Prépare, sans la sauvegarder, la formation associée au rapport donné"""
+        return Formation(
+            titre=f"Formation {rapport.produit.name}",
             client=self.client,
             affaire=self,
-            rapport=Rapport.objects.get(affaire=self, site=site, produit=produit),
+            rapport=rapport,
             date_debut=self.date_debut,
             date_fin=self.date_fin_prevue,
-            description=f"Formation {produit.name} pour le site {self.client.nom}"
+            description=f"Formation {rapport.produit.name} pour le site {self.client.nom}"
         )
-        return formation
-    
 
+    def cree_formation(self, site, produit):
+        """Crée une formation pour le site et le produit donnés"""
+        formation = self.nouvelle_formation(Rapport.objects.get(affaire=self, site=site, produit=produit))
+        formation.save()
+        return formation
 
+    def build_reference(self, rank, date):
+        return f"{self.entity.code}-AFF-{self.offre.id}-{date.year}-{date.month:02d}-{self.client.id}-{rank}-{self.sequence_number:04d}"
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
         creating = not self.pk  # Vérifie si c'est une création
         
@@ -262,65 +497,67 @@ class Affaire(Document):
             # Génère la référence
             if not self.reference:
                 if not self.sequence_number:
-                    last_sequence = Affaire.objects.filter(
-                        entity=self.entity,
-                        doc_type='AFF',
-                        date_creation__year=now().year,
-                        date_creation__month=now().month
-                    ).aggregate(Max('sequence_number'))['sequence_number__max']
-                    self.sequence_number = (last_sequence or 0) + 1
-
-                total_affaires_client = Affaire.objects.filter(client=self.client).count() + 1
+                    self.sequence_number = self.allocate_sequence_number(doc_type='AFF')
+
+                total_affaires_client = self.next_client_rank(self.client)
                 date = self.date_creation or now()
-                self.reference = f"{self.entity.code}-AFF-{self.offre.id}-{date.year}-{date.month:02d}-{self.client.id}-{total_affaires_client}-{self.sequence_number:04d}"
+                self.reference = self.build_reference(total_affaires_client, date)
 
         super().save(*args, **kwargs)
 
         if creating:
             # Crée les rapports après la sauvegarde initiale
-            self.cree_rapports()
+            self.sync_rapports()
 
     def __str__(self):
         return f"Affaire {self.reference} - {self.offre.client.nom}"
 
 class Facture(Document):
+    reference_code = 'FAC'
+    permission_parent = 'affaire'
+
     affaire = models.OneToOneField(Affaire, on_delete=models.CASCADE, related_name="facture")
 
+    class Meta:
+        indexes = document_indexes('facture')
+
+    def build_reference(self, rank, date):
+        return f"{self.entity.code}-FAC-{self.affaire.id}-{self.affaire.offre_id}-{date.year}-{date.month:02d}-{self.client.id}-{rank}-{self.sequence_number:04d}"
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.reference:
             if not self.sequence_number:
-                last_sequence = Facture.objects.filter(
-                    entity=self.entity,
-                    doc_type='FAC',
-                    date_creation__year=now().year,
-                    date_creation__month=now().month
-                ).aggregate(Max('sequence_number'))['sequence_number__max']
-                self.sequence_number = (last_sequence or 0) + 1
-            total_factures_client = Facture.objects.filter(client=self.affaire.client).count() + 1
+                self.sequence_number = self.allocate_sequence_number(doc_type='FAC')
+            total_factures_client = self.next_client_rank(self.affaire.client)
             date = self.date_creation or now()
-            self.reference = f"{self.entity.code}-FAC-{self.affaire.id}-{self.affaire.offre.id}-{date.year}-{date.month:02d}-{self.client.id}-{total_factures_client}-{self.sequence_number:04d}"
+            self.reference = self.build_reference(total_factures_client, date)
         super().save(*args, **kwargs)
 
 
 class Rapport(Document):
+    reference_code = 'RAP'
+    permission_parent = 'affaire'
+
     affaire = models.ForeignKey(Affaire, on_delete=models.CASCADE, related_name="rapports")
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
     produit = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="rapports")
 
+    class Meta:
+        indexes = document_indexes('rapport')
+
+
+    def build_reference(self, rank, date):
+        return f"{self.entity.code}-RAP-{self.affaire.id}-{self.affaire.offre_id}-{date.year}-{date.month:02d}-{self.client.id}-{self.produit.code}-{rank}-{self.sequence_number:04d}"
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.reference:
             if not self.sequence_number:
-                last_sequence = Rapport.objects.filter(
-                    entity=self.entity,
-                    doc_type='RAP',
-                    date_creation__year=now().year,
-                    date_creation__month=now().month
-                ).aggregate(Max('sequence_number'))['sequence_number__max']
-                self.sequence_number = (last_sequence or 0) + 1
-            total_rapports_client = Rapport.objects.filter(client=self.affaire.client).count() + 1
+                self.sequence_number = self.allocate_sequence_number(doc_type='RAP')
+            total_rapports_client = self.next_client_rank(self.affaire.client)
             date = self.date_creation or now()
-            self.reference = f"{self.entity.code}-RAP-{self.affaire.id}-{self.affaire.offre.id}-{date.year}-{date.month:02d}-{self.client.id}-{self.produit.code}-{total_rapports_client}-{self.sequence_number:04d}"
+            self.reference = self.build_reference(total_rapports_client, date)
         super().save(*args, **kwargs)
 
 
@@ -336,6 +573,18 @@ class Formation(models.Model):
     def __str__(self):
         return f"{self.titre} - {self.client.nom}"
 
+    def details_attestation(self):
+        """Texte repris dans le champ details_formation des attestations de la formation"""
+        details = [self.titre]
+        if self.date_debut:
+            periode = f"Du {self.date_debut:%d/%m/%Y}"
+            if self.date_fin:
+                periode += f" au {self.date_fin:%d/%m/%Y}"
+            details.append(periode)
+        if self.description:
+            details.append(self.description)
+        return "\n".join(details)
+
 
 class Participant(models.Model):
     nom = models.CharField(max_length=255)
@@ -350,28 +599,242 @@ class Participant(models.Model):
 
 
 class AttestationFormation(Document):
+    reference_code = 'ATT'
+    permission_parent = 'affaire'
+
     affaire = models.ForeignKey(Affaire, on_delete=models.CASCADE, related_name="attestations")
     formation = models.ForeignKey(Formation, on_delete=models.CASCADE, related_name="attestations")
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name= "attestation")
     details_formation = models.TextField()
 
+    class Meta:
+        indexes = document_indexes('attestation')
+
+    @staticmethod
+    def sequence_scope(client_id, formation_id):
+        """Les attestations sont numérotées par client et par formation."""
+        return f"{client_id}-{formation_id}"
+
+    def build_reference(self, rank, date):
+        return f"{self.entity.code}-ATT-{self.affaire.id}-{date.year}-{date.month:02d}-{self.client.id}-{rank}-{self.formation.id}-{self.participant.id}-{self.sequence_number:04d}"
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if not self.reference:
             if not self.sequence_number:
-                last_sequence = AttestationFormation.objects.filter(
-                    entity=self.entity,
+                self.sequence_number = self.allocate_sequence_number(
+                    scope=self.sequence_scope(self.affaire.client_id, self.formation_id),
                     client=self.affaire.client,
                     formation=self.formation,
-                    doc_type='ATT',
-                    date_creation__year=now().year,
-                    date_creation__month=now().month
-                ).aggregate(Max('sequence_number'))['sequence_number__max']
-                self.sequence_number = (last_sequence or 0) + 1
-            total_attestations_client = AttestationFormation.objects.filter(client=self.client).count() + 1
+                    doc_type='ATT'
+                )
+            total_attestations_client = self.next_client_rank(self.client)
             date = self.date_creation or now()
-            self.reference = f"{self.entity.code}-ATT-{self.affaire.id}-{date.year}-{date.month:02d}-{self.client.id}-{total_attestations_client}-{self.formation.id}-{self.participant.id}-{self.sequence_number:04d}"
+            self.reference = self.build_reference(total_attestations_client, date)
         super().save(*args, **kwargs)
 
 
-class DocumentPermission:
-    pass
\ No newline at end of file
+DOCUMENT_MODELS = (Offre, Proforma, Affaire, Facture, Rapport, AttestationFormation)
+
+
+class DocumentIndex(models.Model):
+    """
+    Une ligne par document, tous types confondus : les listes transverses (flux d'un
+    client, comptes par type) se font en une requête indexée au lieu d'une par modèle.
+    Tenue à jour par les signaux de document/signals.py et par les opérations en masse ;
+    `manage.py rebuild_document_index` la reconstruit entièrement.
+    """
+    INDEX_FIELDS = ['reference', 'entity', 'client', 'statut', 'date_creation']
+
+    doc_type = models.CharField(max_length=3)  # reference_code du modèle : OFF, PRO, etc.
+    object_id = models.PositiveBigIntegerField()  # clé des documents (BigAutoField)
+    reference = models.CharField(max_length=50)
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name="+")
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="+")
+    statut = models.CharField(max_length=20)
+    date_creation = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'object_id'], name='unique_document_index')
+        ]
+        indexes = [
+            models.Index(fields=['date_creation', 'id'], name='docindex_date_idx'),
+            models.Index(fields=['client', 'date_creation', 'id'], name='docindex_client_date_idx'),
+            models.Index(fields=['entity', 'date_creation', 'id'], name='docindex_entity_date_idx'),
+            models.Index(fields=['statut', 'date_creation', 'id'], name='docindex_statut_date_idx'),
+            models.Index(fields=['reference'], name='docindex_reference_idx'),
+        ]
+
+    def __str__(self):
+        return self.reference
+
+    @staticmethod
+    def document_model(doc_type):
+        return {model.reference_code: model for model in DOCUMENT_MODELS}[doc_type]
+
+    @classmethod
+    def index(cls, documents):
+        """Crée ou met à jour (une seule requête par lot) les lignes de `documents`."""
+        attnames = [cls._meta.get_field(field).attname for field in cls.INDEX_FIELDS]
+        entries = [
+            cls(
+                doc_type=document.reference_code,
+                object_id=document.pk,
+                **{attname: getattr(document, attname) for attname in attnames}
+            )
+            for document in documents
+        ]
+        return cls.objects.bulk_create(
+            entries,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['doc_type', 'object_id'],
+            update_fields=cls.INDEX_FIELDS,
+        )
+
+    @classmethod
+    def refresh(cls, model, pks):
+        """Réindexe des documents modifiés par QuerySet.update() (qui n'émet pas de signal)."""
+        return cls.index(model.objects.filter(pk__in=pks).only('pk', *cls.INDEX_FIELDS))
+
+    @classmethod
+    def unindex(cls, model, pks):
+        return cls.objects.filter(doc_type=model.reference_code, object_id__in=pks).delete()
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcule toute la table à partir des documents existants."""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            for model in DOCUMENT_MODELS:
+                documents = model.objects.only('pk', *cls.INDEX_FIELDS).order_by('pk').iterator(chunk_size=2000)
+                while batch := list(islice(documents, 2000)):
+                    cls.index(batch)
+        return cls.objects.count()
+
+
+class Job(models.Model):
+    """Tâche exécutée en arrière-plan par la commande `run_jobs` (voir document/jobs.py)."""
+    STATUTS = [
+        ('EN_ATTENTE', 'En attente'),
+        ('EN_COURS', 'En cours'),
+        ('TERMINE', 'Terminé'),
+        ('ECHEC', 'Échec'),
+    ]
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    statut = models.CharField(max_length=10, choices=STATUTS, default='EN_ATTENTE')
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=now)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'run_after'], name='job_statut_run_after_idx'),
+            models.Index(fields=['date_creation', 'id'], name='job_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.statut})"
+
+
+class ModelVersion(models.Model):
+    """
+    Version de chaque modèle, incrémentée après chaque transaction qui l'a modifié
+    (voir document/signals.py).
+    Sert de validateur HTTP pour les modèles sans date_modification et pour les
+    données imbriquées dans les réponses d'autres modèles.
+    """
+    label = models.CharField(max_length=100, unique=True)  # app_label.model
+    version = models.PositiveBigIntegerField(default=0)
+    date_modification = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f"{self.label} v{self.version}"
+
+    @classmethod
+    def bump(cls, *model_classes):
+        date = now()
+        for model in model_classes:
+            label = model._meta.label_lower
+            versions = cls.objects.filter(label=label)
+            if not versions.update(version=F('version') + 1, date_modification=date):
+                _, created = cls.objects.get_or_create(label=label, defaults={'version': 1, 'date_modification': date})
+                if not created:
+                    # Ligne créée entre-temps par une transaction concurrente : l'incrément est refait
+                    versions.update(version=F('version') + 1, date_modification=date)
+
+    @classmethod
+    def bump_on_commit(cls, *model_classes):
+        """
+        Comme bump(), mais après le commit et une seule fois par modèle et par transaction :
+        les écritures (et suppressions en cascade) d'une transaction ne font plus chacune
+        un UPDATE sur la ligne de version, que tous les écrivains se disputent.
+        Hors transaction, la version est incrémentée immédiatement.
+
+        Les modèles en attente sont rassemblés dans le callback on_commit de la transaction,
+        que la connexion référence faiblement : après un rollback, Django abandonne le
+        callback, la référence est morte et la transaction suivante en enregistre un nouveau.
+        """
+        connection = transaction.get_connection()
+        pending = getattr(connection, 'pending_model_versions', None)
+        callback = pending() if pending is not None else None
+        if callback is not None:
+            callback.model_versions.update(model_classes)
+            return
+
+        model_versions = set(model_classes)
+
+        def bump_versions():
+            connection.pending_model_versions = None
+            cls.bump(*model_versions)
+
+        # Pas de référence du callback à lui-même : sans cycle, il est libéré dès que Django l'abandonne
+        bump_versions.model_versions = model_versions
+        connection.pending_model_versions = weakref.ref(bump_versions)
+        transaction.on_commit(bump_versions)
+
+    @classmethod
+    def current(cls, model_classes):
+        """{label: (version, date_modification)} des modèles donnés, en une requête."""
+        labels = [model._meta.label_lower for model in model_classes]
+        return {
+            label: (version, date)
+            for label, version, date in cls.objects.filter(label__in=labels).values_list('label', 'version', 'date_modification')
+        }
+
+
+class DocumentPermission(models.Model):
+    """
+    Droits d'un utilisateur sur un document, appliqués quand ENFORCE_DOCUMENT_PERMISSIONS
+    est actif (voir document/permissions.py). Sans ligne, le document n'est ni lisible ni
+    modifiable par l'utilisateur (hors superutilisateurs).
+
+    Les lignes sont écrites à la création, que le contrôle soit actif ou non : l'auteur
+    d'un document créé par l'API reçoit lecture et écriture, et un document dérivé
+    (proforma, affaire, facture, rapport, attestation) reprend les droits de son
+    document parent (`permission_parent`).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="document_permissions")
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()  # clé des documents (BigAutoField)
+    document = GenericForeignKey('content_type', 'object_id')
+    can_read = models.BooleanField(default=True)
+    can_edit = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'content_type', 'object_id'], name='unique_document_permission')
+        ]
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'], name='docperm_document_idx'),
+        ]
+
+    def __str__(self):
+        droits = 'lecture/écriture' if self.can_edit else 'lecture' if self.can_read else 'aucun'
+        return f"{self.user} -> {self.content_type.model} #{self.object_id} ({droits})"
\ No newline at end of file
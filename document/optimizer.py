@@ -0,0 +1,149 @@
+"""
+Préchargement automatique des relations lues par un sérialiseur.
+
+Les champs du sérialiseur sont parcourus une fois par classe : sérialiseurs imbriqués,
+sources pointées (`client.nom`), clés primaires de relations multiples. Les relations
+simples (clé étrangère, one-to-one) deviennent des select_related, les relations
+multiples des prefetch_related ; sous une relation multiple, tout est préchargé.
+
+Un SerializerMethodField n'est pas analysable : le sérialiseur déclare alors ses
+besoins dans Meta (`select_related = ['participant']`, `prefetch_related = [...]`).
+
+Pour un sous-ensemble de champs (?fields=), serializer_columns donne en plus les
+colonnes à lire, passées à only().
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def optimize(queryset, serializer_class, fields=None):
+    """
+    Applique à `queryset` les select_related / prefetch_related requis par `serializer_class`.
+    Avec `fields` (champs demandés par ?fields=), seules leurs relations sont chargées.
+    """
+    fields = frozenset(fields) if fields else None
+    select_related, prefetch_related = serializer_relations(serializer_class, fields)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+@lru_cache(maxsize=None)
+def serializer_relations(serializer_class, fields=None):
+    """(select_related, prefetch_related) de `serializer_class`, calculés une fois par classe et jeu de champs."""
+    select_related, prefetch_related = set(), set()
+    collect_relations(serializer_class(), '', False, select_related, prefetch_related, fields)
+    # Un chemin déjà couvert par un chemin plus long est inutile
+    select_related = {path for path in select_related if not any(other.startswith(path + '__') for other in select_related)}
+    return tuple(sorted(select_related)), tuple(sorted(prefetch_related))
+
+
+def selected_fields(serializer, fields=None):
+    return [field for name, field in serializer.fields.items() if fields is None or name in fields]
+
+
+def collect_relations(serializer, prefix, prefetching, select_related, prefetch_related, fields=None):
+    model = serializer.Meta.model
+    selected = selected_fields(serializer, fields)
+
+    # Besoins déclarés pour les SerializerMethodField, utiles seulement s'ils sont demandés
+    if fields is None or any(isinstance(field, serializers.SerializerMethodField) for field in selected):
+        for path in getattr(serializer.Meta, 'select_related', ()):
+            (prefetch_related if prefetching else select_related).add(prefix + path)
+        for path in getattr(serializer.Meta, 'prefetch_related', ()):
+            prefetch_related.add(prefix + path)
+
+    for field in selected:
+        if field.write_only or field.source == '*':
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        relation = getattr(field, 'child_relation', None)
+
+        path, many = relation_path(model, field.source.split('.'))
+        if not path:
+            continue
+        lookup = prefix + '__'.join(path)
+
+        if many or relation is not None:
+            prefetch_related.add(lookup)
+        elif isinstance(nested, serializers.ModelSerializer) or len(path) < len(field.source.split('.')) \
+                or is_reverse_one_to_one(model, path):
+            (prefetch_related if prefetching else select_related).add(lookup)
+
+        if isinstance(nested, serializers.ModelSerializer):
+            collect_relations(nested, lookup + '__', prefetching or many, select_related, prefetch_related)
+
+
+@lru_cache(maxsize=None)
+def serializer_columns(serializer_class, fields):
+    """
+    Colonnes à charger (chemins pour only()) pour les champs `fields` de `serializer_class`,
+    ou None si elles ne peuvent pas être déterminées (SerializerMethodField, propriété...).
+    """
+    columns = set()
+    if not collect_columns(serializer_class(), '', columns, fields):
+        return None
+    return tuple(sorted(columns))
+
+
+def collect_columns(serializer, prefix, columns, fields=None):
+    model = serializer.Meta.model
+    for field in selected_fields(serializer, fields):
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            return False
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+
+        current, path = model, []
+        attrs = field.source.split('.')
+        for position, attr in enumerate(attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return False
+            path.append(attr)
+            if not model_field.is_relation:
+                columns.add(prefix + '__'.join(path))
+                break
+            if model_field.many_to_many or model_field.one_to_many:
+                break  # préchargé : ses colonnes sont lues par sa propre requête
+            if not model_field.concrete:
+                # one-to-one inverse : jointure sans colonne de ce côté
+                columns.add(prefix + '__'.join(path) + '__pk')
+            else:
+                columns.add(prefix + '__'.join(path))
+            current = model_field.related_model
+            if position == len(attrs) - 1 and isinstance(nested, serializers.ModelSerializer):
+                if not collect_columns(nested, prefix + '__'.join(path) + '__', columns):
+                    return False
+    return True
+
+
+def relation_path(model, attrs):
+    """
+    Relations traversées par une source (`offre.client.nom` -> ['offre', 'client']) et
+    indicateur de relation multiple. Une source sans relation donne un chemin vide.
+    """
+    path, many = [], False
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation:
+            break
+        path.append(attr)
+        many = many or field.many_to_many or field.one_to_many
+        model = field.related_model
+    return path, many
+
+
+def is_reverse_one_to_one(model, path):
+    """Une clé étrangère se lit sans requête (attname) ; un one-to-one inverse, non."""
+    field = model._meta.get_field(path[0])
+    return len(path) == 1 and field.one_to_one and not field.concrete
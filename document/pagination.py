@@ -0,0 +1,212 @@
+"""
+Pagination par curseur (keyset) : la page suivante est sélectionnée par un filtre
+sur les valeurs de tri du dernier élément, jamais par un OFFSET.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Curseur invalide.")
+    if not isinstance(values, list):
+        raise ValueError("Curseur invalide.")
+    return values
+
+
+def keyset_filter(model, ordering, values):
+    """
+    Condition « strictement après `values` » pour un tri `ordering` (ex: ('-date_creation', '-id')) :
+    (a > x) OR (a = x AND b > y) OR ..., chaque comparaison suivant le sens de son champ.
+    Les champs facultatifs sont triés NULL en dernier (voir order_expressions).
+    """
+    if len(values) != len(ordering):
+        raise ValueError("Curseur invalide.")
+
+    condition = Q()
+    egalites = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        model_field = model._meta.get_field(name)
+        try:
+            value = model_field.to_python(value)
+        except Exception:
+            raise ValueError("Curseur invalide.")
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        if value is None:
+            # NULL en dernier : rien ne suit NULL sur ce champ, hormis à égalité
+            egalites &= Q(**{f'{name}__isnull': True})
+            continue
+        apres = Q(**{f'{name}__{lookup}': value})
+        if model_field.null:
+            apres |= Q(**{f'{name}__isnull': True})
+        condition |= egalites & apres
+        egalites &= Q(**{name: value})
+
+    # Borne sur le premier champ, redondante mais directement utilisable par un index :
+    # la lecture commence au curseur au lieu de parcourir les pages précédentes
+    first = model._meta.get_field(ordering[0].lstrip('-'))
+    first_value = first.to_python(values[0])
+    if first_value is not None and not first.null:
+        lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+        condition &= Q(**{f'{first.name}__{lookup}': first_value})
+    return condition
+
+
+def order_expressions(model, ordering):
+    """Expressions ORDER BY de `ordering`, NULL en dernier pour les champs facultatifs."""
+    expressions = []
+    for field in ordering:
+        name = field.lstrip('-')
+        if not model._meta.get_field(name).null:
+            expressions.append(field)
+        elif field.startswith('-'):
+            expressions.append(F(name).desc(nulls_last=True))
+        else:
+            expressions.append(F(name).asc(nulls_last=True))
+    return expressions
+
+
+def cursor_values(obj, ordering):
+    """Valeurs de tri d'un objet, ou d'une ligne de values() (clés = noms des champs)."""
+    values = []
+    for field in ordering:
+        if isinstance(obj, dict):
+            value = obj[field.lstrip('-')]
+        else:
+            value = getattr(obj, obj._meta.get_field(field.lstrip('-')).attname)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return values
+
+
+def keyset_page(queryset, ordering, cursor=None, size=50):
+    """
+    Retourne (éléments, curseur suivant) pour la page qui suit `cursor`.
+    Le dernier champ de `ordering` doit être unique (la clé primaire) pour un ordre stable.
+    """
+    queryset = queryset.order_by(*order_expressions(queryset.model, ordering))
+    if cursor:
+        queryset = queryset.filter(keyset_filter(queryset.model, ordering, decode_cursor(cursor)))
+
+    items = list(queryset[:size + 1])
+    if len(items) <= size:
+        return items, None
+    items = items[:size]
+    return items, encode_cursor(cursor_values(items[-1], ordering))
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par défaut de l'API : curseur opaque (`?cursor=`) sur le tri de la requête
+    (`?ordering=` ou, à défaut, `ordering`), complété par la clé primaire pour un ordre stable.
+    Sans tri explicite : date de création décroissante si le modèle en a une, sinon id décroissant.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-date_creation', '-id')
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE or 50
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+        self.next_cursor = None
+        self.request = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(queryset)
+        try:
+            items, self.next_cursor = keyset_page(
+                queryset, ordering, cursor=request.query_params.get(self.cursor_query_param), size=self.get_page_size(request)
+            )
+        except ValueError as e:
+            raise ValidationError({self.cursor_query_param: str(e)})
+        return items
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "Un entier est attendu."})
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        model = queryset.model
+        requested = [field for field in queryset.query.order_by if isinstance(field, str)]
+        unsupported = [field for field in requested if not is_local_field(model, field.lstrip('-'))]
+        if unsupported:
+            raise ValidationError({api_settings.ORDERING_PARAM: unsupported_ordering_message(unsupported)})
+        if requested:
+            # Le tri demandé est conservé ; la clé primaire, dans le même sens, départage les égalités
+            pk_order = ('-' if requested[-1].startswith('-') else '') + 'id'
+            return tuple(field for field in requested if field.lstrip('-') not in ('id', 'pk')) + (pk_order,)
+        if is_local_field(model, 'date_creation'):
+            return self.ordering
+        return ('-id',)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter qui refuse (400) un ?ordering= inapplicable au lieu de l'ignorer
+    silencieusement : champ absent de `ordering_fields`, ou champ d'un modèle lié, que
+    la pagination par curseur ne sait pas reprendre.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if params:
+            fields = [param.strip() for param in params.split(',') if param.strip()]
+            valid = self.remove_invalid_fields(queryset, fields, view, request)
+            invalid = [field for field in fields if field not in valid]
+            invalid += [field for field in valid if not is_local_field(queryset.model, field.lstrip('-'))]
+            if invalid:
+                raise ValidationError({self.ordering_param: unsupported_ordering_message(invalid)})
+            if valid:
+                return valid
+        return self.get_default_ordering(view)
+
+
+def unsupported_ordering_message(fields):
+    return f"Tri non pris en charge : {', '.join(fields)}."
+
+
+def is_local_field(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return field.concrete and not field.many_to_many
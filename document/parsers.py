@@ -0,0 +1,68 @@
+import codecs
+import csv
+import io
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser, JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+# orjson lit en flottant les entiers hors 64 bits : les corps contenant 19 chiffres de suite
+# passent par le module json (détection par translate, bien plus rapide qu'une regex)
+DIGITS_AS_ZERO = bytes.maketrans(b'0123456789', b'0' * 10)
+LONG_NUMBER = b'0' * 19
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser décodé par orjson pour les corps UTF-8. Un corps que orjson refuse (JSON
+    invalide, NaN...), ou qui contient un nombre d'au moins 19 chiffres, est lu par
+    JSONParser : résultat et message d'erreur restent ceux de DRF.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if LONG_NUMBER in body.translate(DIGITS_AS_ZERO):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+class CSVParser(BaseParser):
+    """
+    Corps text/csv : retourne un itérateur de lignes (voir csv_rows),
+    lu au fil de l'eau sans charger le fichier en mémoire.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return csv_rows(codecs.getreader(encoding)(stream))
+
+
+def csv_rows(text):
+    """
+    Lignes d'un CSV (flux texte) : couples (numéro de ligne du fichier, dict), clés
+    d'en-tête en minuscules. Le séparateur (virgule, point-virgule ou tabulation) est
+    déduit de l'en-tête ; un BOM éventuel (export Excel) est ignoré.
+    """
+    header = text.readline().lstrip('\ufeff')
+    if not header.strip():
+        return
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    fieldnames = [name.strip().lower() for name in next(csv.reader([header], dialect))]
+    reader = csv.DictReader(text, fieldnames=fieldnames, dialect=dialect)
+    for row in reader:
+        yield reader.line_num + 1, row
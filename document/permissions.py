@@ -1,6 +1,177 @@
-from rest_framework import permissions
+"""
+Droits par document (DocumentPermission), appliqués si ENFORCE_DOCUMENT_PERMISSIONS est actif.
 
-from document.models import DocumentPermission
+Les droits d'un utilisateur sont chargés en une requête, une fois par requête HTTP
+(document_permissions) ; les listes sont filtrées en SQL (readable,
+DocumentPermissionFilter) plutôt qu'objet par objet.
+
+À la création (grant_on_create), un document reprend les droits de son document
+parent, et l'utilisateur déclaré par created_by() reçoit lecture et écriture.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Exists, OuterRef, Q
+from django.http import Http404
+from rest_framework import filters, permissions
+
+from document.models import DOCUMENT_MODELS, DocumentPermission
+
+
+def enforced(request):
+    """Les droits par document s'appliquent-ils à cette requête ?"""
+    if not getattr(settings, 'ENFORCE_DOCUMENT_PERMISSIONS', False):
+        return False
+    return not request.user.is_superuser
+
+
+def is_document(model):
+    return issubclass(model, DOCUMENT_MODELS)
+
+
+class DocumentPermissions:
+    """Droits d'un utilisateur, indexés par (content_type_id, object_id), chargés au premier accès."""
+
+    def __init__(self, user):
+        self.user = user
+        self._rights = None
+
+    @property
+    def rights(self):
+        if self._rights is None:
+            self._rights = {}
+            if self.user.is_authenticated:
+                self._rights = {
+                    (content_type_id, object_id): (can_read, can_edit)
+                    for content_type_id, object_id, can_read, can_edit in DocumentPermission.objects.filter(
+                        user=self.user
+                    ).values_list('content_type_id', 'object_id', 'can_read', 'can_edit')
+                }
+        return self._rights
+
+    def get(self, model, pk):
+        content_type = ContentType.objects.get_for_model(model)
+        return self.rights.get((content_type.pk, pk), (False, False))
+
+    def can_read(self, model, pk):
+        return self.get(model, pk)[0]
+
+    def can_edit(self, model, pk):
+        return self.get(model, pk)[1]
+
+
+def document_permissions(request):
+    """Cache des droits de l'utilisateur, propre à la requête."""
+    cache = getattr(request, '_document_permissions', None)
+    if cache is None or cache.user != request.user:
+        cache = request._document_permissions = DocumentPermissions(request.user)
+    return cache
+
+
+def readable_condition(user, model, object_id='pk'):
+    """Condition « `user` peut lire le document `model` d'id `object_id` » (sous-requête EXISTS)."""
+    return Exists(DocumentPermission.objects.filter(
+        user=user,
+        content_type=ContentType.objects.get_for_model(model),
+        object_id=OuterRef(object_id),
+        can_read=True,
+    ))
+
+
+def readable_ids(user, model):
+    """Ids des documents `model` lisibles par `user` (queryset de DocumentPermission.object_id)."""
+    return DocumentPermission.objects.filter(
+        user=user,
+        content_type=ContentType.objects.get_for_model(model),
+        can_read=True,
+    ).values('object_id')
+
+
+def readable(queryset, request):
+    """Documents de `queryset` lisibles par l'utilisateur ; autres modèles inchangés."""
+    if not enforced(request) or not is_document(queryset.model):
+        return queryset
+    if not request.user.is_authenticated:
+        return queryset.none()
+    return queryset.filter(readable_condition(request.user, queryset.model))
+
+
+def readable_index(queryset, request):
+    """Lignes de DocumentIndex dont le document est lisible par l'utilisateur."""
+    if not enforced(request):
+        return queryset
+    if not request.user.is_authenticated:
+        return queryset.none()
+    condition = Q()
+    for model in DOCUMENT_MODELS:
+        condition |= Q(doc_type=model.reference_code) & Q(readable_condition(request.user, model, 'object_id'))
+    return queryset.filter(condition)
+
+
+def check_parent_readable(request, model, validated_data):
+    """
+    Un document ne peut être rattaché qu'à un document parent lisible : la réponse
+    embarque le parent, et le document créé en hérite les droits. Sinon 404, comme en lecture.
+    """
+    if not enforced(request) or not is_document(model) or model.permission_parent is None:
+        return
+    parent = validated_data.get(model.permission_parent)
+    if parent is not None and not document_permissions(request).can_read(type(parent), parent.pk):
+        raise Http404
+
+
+_creator = ContextVar('document_creator', default=None)
+
+
+@contextmanager
+def created_by(user):
+    """Les documents créés dans ce bloc, dérivés compris, sont accordés à `user`."""
+    token = _creator.set(user if user is not None and user.is_authenticated else None)
+    try:
+        yield
+    finally:
+        _creator.reset(token)
+
+
+def grant_on_create(model, documents):
+    """
+    Droits des documents `model` qui viennent d'être créés : copie de ceux de leur
+    document parent, puis lecture et écriture pour l'auteur (created_by), s'il y en a un.
+    """
+    if not documents:
+        return
+    content_type = ContentType.objects.get_for_model(model)
+    grants = {}
+    if model.permission_parent is not None:
+        field = model._meta.get_field(model.permission_parent)
+        children = defaultdict(list)
+        for document in documents:
+            children[getattr(document, field.attname)].append(document.pk)
+        inherited = DocumentPermission.objects.filter(
+            content_type=ContentType.objects.get_for_model(field.related_model),
+            object_id__in=children,
+        ).values_list('user_id', 'object_id', 'can_read', 'can_edit')
+        for user_id, parent_id, can_read, can_edit in inherited:
+            for pk in children[parent_id]:
+                grants[user_id, pk] = (can_read, can_edit)
+    creator = _creator.get()
+    if creator is not None:
+        for document in documents:
+            grants[creator.pk, document.pk] = (True, True)
+    DocumentPermission.objects.bulk_create([
+        DocumentPermission(user_id=user_id, content_type=content_type, object_id=pk, can_read=can_read, can_edit=can_edit)
+        for (user_id, pk), (can_read, can_edit) in grants.items()
+    ], update_conflicts=True, unique_fields=['user', 'content_type', 'object_id'], update_fields=['can_read', 'can_edit'])
+
+
+class DocumentPermissionFilter(filters.BaseFilterBackend):
+    """Restreint les listes aux documents lisibles, en SQL."""
+
+    def filter_queryset(self, request, queryset, view):
+        return readable(queryset, request)
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -10,13 +181,12 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return obj.created_by == request.user
 
 class HasDocumentPermission(permissions.BasePermission):
+    """Lecture (méthodes sûres) ou modification d'un document selon ses DocumentPermission."""
+
     def has_object_permission(self, request, view, obj):
-        if request.user.is_superuser:
+        if not enforced(request) or not is_document(type(obj)):
             return True
-        try:
-            perm = obj.permissions.get(user=request.user)
-            if request.method in permissions.SAFE_METHODS:
-                return perm.can_read
-            return perm.can_edit
-        except DocumentPermission.DoesNotExist:
-            return False
\ No newline at end of file
+        rights = document_permissions(request)
+        if request.method in permissions.SAFE_METHODS:
+            return rights.can_read(type(obj), obj.pk)
+        return rights.can_edit(type(obj), obj.pk)
@@ -0,0 +1,179 @@
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from functools import lru_cache
+
+from django.utils.functional import Promise
+from rest_framework import serializers
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+try:
+    import orjson
+except ImportError:  # dépendance facultative : repli sur le module json
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+SCALARS = frozenset([str, int, bool, type(None)])
+# Objets que l'encodeur de DRF (default) convertit en chaîne : aucun flottant à vérifier
+STRING_LIKE = (str, int, Promise, datetime.date, datetime.time, datetime.timedelta, uuid.UUID, bytes)
+# Champs DRF dont la représentation n'est jamais un flottant
+FLOAT_FREE_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.DateTimeField,
+    serializers.DateField, serializers.TimeField, serializers.DurationField, serializers.UUIDField,
+    serializers.FileField, serializers.RelatedField,
+)
+
+
+@lru_cache(maxsize=None)
+def serializer_float_free(serializer_class):
+    """Vrai si aucun champ de `serializer_class`, sérialiseurs imbriqués compris, ne peut rendre un flottant."""
+    try:
+        fields = serializer_class().fields
+    except Exception:  # sérialiseur non instanciable sans arguments : contenu parcouru
+        return False
+    return all(field_float_free(field) for field in fields.values() if not field.write_only)
+
+
+def field_float_free(field):
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return serializer_float_free(type(field))
+    if isinstance(field, serializers.ManyRelatedField):
+        field = field.child_relation
+    if isinstance(field, serializers.DecimalField):
+        return bool(field.coerce_to_string)
+    if isinstance(field, serializers.ChoiceField):
+        return not any(isinstance(choice, float) for choice in field.choices)
+    if isinstance(field, serializers.SlugRelatedField):  # valeur d'un attribut quelconque
+        return False
+    return isinstance(field, FLOAT_FREE_FIELDS)
+
+
+def float_free(data):
+    """
+    Vrai si `data` est la sortie (ReturnDict / ReturnList) d'un sérialiseur sans champ
+    flottant : son contenu n'a pas à être parcouru. Suppose la sortie non modifiée après
+    coup, comme les vues qui la passent telle quelle à Response.
+    """
+    serializer = data.serializer
+    if serializer is None:
+        return False
+    return serializer_float_free(type(getattr(serializer, 'child', serializer)))
+
+
+def float_matches(value):
+    """
+    Vrai si orjson écrit le flottant `value` comme json (repr) : fini et hors de la
+    notation exponentielle de repr (1e+16, 1e-05), qu'orjson écrit autrement.
+    """
+    return value == 0 or 1e-4 <= abs(value) < 1e16
+
+
+def orjson_floats_match(data, keys=False):
+    """
+    Vrai si les flottants de `data` (Decimal compris, que l'encodeur de DRF convertit en
+    flottant) s'écrivent comme avec json ; avec `keys`, les clés des dictionnaires sont
+    vérifiées aussi. Seules les valeurs sont parcourues : chaînes, entiers et None sont
+    écartés d'un test de type, et la sortie d'un sérialiseur sans champ flottant n'est pas
+    parcourue du tout (float_free). Un objet dont le contenu n'est pas connu (itérable passé
+    à l'encodeur de DRF) donne False : l'appelant se replie alors sur json.
+    """
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if type(obj) in (ReturnDict, ReturnList) and float_free(obj):
+            continue
+        if isinstance(obj, dict):
+            if keys:
+                stack.append(list(obj))
+            values = obj.values()
+        else:
+            values = obj
+        for value in values:
+            kind = type(value)
+            if kind in SCALARS:
+                continue
+            if kind is float or isinstance(value, (float, Decimal)):
+                if not float_matches(float(value)):
+                    return False
+            elif isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+            elif not isinstance(value, STRING_LIKE):
+                return False
+    return True
+
+
+def fast_dumps(data):
+    """
+    Encode `data` en JSON compact (UTF-8) comme le JSONRenderer de DRF, avec orjson quand il
+    est installé. Les types que orjson ne rend pas à l'identique (dates, Decimal, chaînes
+    paresseuses...) passent par l'encodeur de DRF. Retourne None si orjson est absent, refuse
+    les données ou écrirait leurs flottants autrement (voir orjson_floats_match) : l'appelant
+    encode alors avec le module json.
+    """
+    if orjson is None:
+        return None
+    keys = False
+    try:
+        ret = orjson.dumps(data, default=encoders.JSONEncoder().default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        # Clés non textuelles (entiers, flottants...) : nouvel essai, clés vérifiées elles aussi
+        keys = True
+        try:
+            ret = orjson.dumps(
+                data, default=encoders.JSONEncoder().default, option=ORJSON_OPTIONS | orjson.OPT_NON_STR_KEYS
+            )
+        except orjson.JSONEncodeError:
+            return None
+    if not orjson_floats_match(data, keys):
+        return None
+    # Comme DRF : U+2028 et U+2029 échappés (JSON sous-ensemble strict de JavaScript)
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encodé par orjson, sortie identique à celle de DRF. L'indentation
+    (?indent=, API navigable), les réglages non compacts ou ASCII et les données contenant
+    des flottants en notation exponentielle ou non finis restent au module json (NaN et
+    Infinity lèvent donc la même erreur qu'avec DRF).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.compact and not self.ensure_ascii \
+                and self.get_indent(accepted_media_type, renderer_context or {}) is None:
+            ret = fast_dumps(data)
+            if ret is not None:
+                return ret
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    JSON délimité par des retours à la ligne (un objet par ligne).
+    Les vues qui le proposent diffusent elles-mêmes leurs lignes ; ce renderer
+    ne sert qu'aux réponses ordinaires (erreurs notamment).
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return ndjson_line(data)
+
+
+def ndjson_line(data):
+    line = fast_dumps(data)
+    if line is not None:
+        return line + b'\n'
+    return (json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False) + '\n').encode('utf-8')
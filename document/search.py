@@ -0,0 +1,257 @@
+"""
+Recherche plein texte (SQLite FTS5).
+
+Une table virtuelle `document_search` indexe les références des documents, le nom et
+l'email des clients, le nom et la localisation des sites, le nom des participants.
+Chaque ligne a pour rowid `object_id * 16 + code du type`, ce qui permet de la
+remplacer ou de la supprimer sans parcourir l'index. La table est créée par la
+migration 0010 (SQLite uniquement) et tenue à jour par les signaux de
+document/signals.py et par les opérations en masse ; `manage.py rebuild_search_index`
+la reconstruit entièrement.
+
+Les termes recherchés sont des préfixes (`kip-off-20` trouve KIP-OFF-2026-...), tous
+requis, classés par bm25. Sans FTS5 (autre base), la recherche retombe sur les
+`LIKE '%...%'` de SearchFilter.
+"""
+from functools import lru_cache
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Affaire, Client, Facture, Offre, Participant, Proforma, Rapport, Site
+from .permissions import enforced, is_document, readable, readable_ids
+
+TABLE = 'document_search'
+ROWID_FACTOR = 16
+
+
+class SearchSource:
+    """Modèle indexé : type exposé par /search/, code de rowid et champs indexés."""
+
+    def __init__(self, kind, code, model, fields):
+        self.kind = kind
+        self.code = code
+        self.model = model
+        self.fields = fields
+
+    def content(self, values):
+        return ' '.join(str(value) for value in values if value)
+
+    def rows(self, objects):
+        return [
+            (obj.pk * ROWID_FACTOR + self.code, self.kind, obj.pk, self.content(getattr(obj, field) for field in self.fields))
+            for obj in objects
+        ]
+
+
+# Les codes font partie des rowid déjà écrits : ne pas les renuméroter
+SOURCES = [
+    SearchSource('offres', 1, Offre, ['reference']),
+    SearchSource('proformas', 2, Proforma, ['reference']),
+    SearchSource('affaires', 3, Affaire, ['reference']),
+    SearchSource('factures', 4, Facture, ['reference']),
+    SearchSource('rapports', 5, Rapport, ['reference']),
+    SearchSource('clients', 6, Client, ['nom', 'email']),
+    SearchSource('sites', 7, Site, ['nom', 'localisation']),
+    SearchSource('participants', 8, Participant, ['nom', 'prenom', 'email']),
+]
+SOURCES_BY_MODEL = {source.model: source for source in SOURCES}
+SOURCES_BY_KIND = {source.kind: source for source in SOURCES}
+
+
+@lru_cache(maxsize=None)
+def search_available():
+    """La table FTS5 existe-t-elle (base SQLite migrée) ? Vérifié une fois par processus."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def match_expression(query):
+    """
+    Expression MATCH de la saisie `query` : chaque terme devient une phrase préfixe
+    (`"kip-off-20"*`), les guillemets sont neutralisés. None si rien n'est cherchable.
+    """
+    terms = [term.replace('"', '""') for term in query.split() if any(char.isalnum() for char in term)]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class SearchIndex:
+    """Écriture dans la table FTS5 ; sans effet si elle n'existe pas."""
+
+    @classmethod
+    def index(cls, model, objects):
+        source = SOURCES_BY_MODEL.get(model)
+        if source is None or not search_available():
+            return
+        rows = source.rows(objects)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(f'INSERT INTO {TABLE} (rowid, kind, object_id, content) VALUES (%s, %s, %s, %s)', rows)
+
+    @classmethod
+    def refresh(cls, model, pks):
+        source = SOURCES_BY_MODEL.get(model)
+        if source is not None:
+            cls.index(model, model.objects.filter(pk__in=pks).only('pk', *source.fields))
+
+    @classmethod
+    def unindex(cls, model, pks):
+        source = SOURCES_BY_MODEL.get(model)
+        if source is None or not search_available():
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk * ROWID_FACTOR + source.code,) for pk in pks])
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcule toute la table à partir des données existantes ; retourne le nombre de lignes."""
+        if not search_available():
+            return 0
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {TABLE}')
+            for source in SOURCES:
+                objects = source.model.objects.only('pk', *source.fields).order_by('pk').iterator(chunk_size=2000)
+                while batch := list(islice(objects, 2000)):
+                    cls.index(source.model, batch)
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+                cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+                return cursor.fetchone()[0]
+
+    @classmethod
+    def search(cls, query, kinds=None, limit=20, readable_by=None):
+        """
+        [(type, id, libellé, score)] classés par pertinence (bm25, plus petit = meilleur).
+        Avec `readable_by`, les documents que cet utilisateur ne peut pas lire sont
+        exclus en SQL, avant le LIMIT.
+        """
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        sql = f'SELECT kind, object_id, content, bm25({TABLE}) AS score FROM {TABLE} WHERE {TABLE} MATCH %s'
+        params = [expression]
+        if kinds:
+            sql += f" AND kind IN ({', '.join(['%s'] * len(kinds))})"
+            params += list(kinds)
+        if readable_by is not None:
+            documents = [source for source in SOURCES if is_document(source.model)]
+            conditions = [f"kind NOT IN ({', '.join(['%s'] * len(documents))})"]
+            params += [source.kind for source in documents]
+            for source in documents:
+                subquery, subparams = readable_ids(readable_by, source.model).query.sql_with_params()
+                conditions.append(f'(kind = %s AND object_id IN ({subquery}))')
+                params += [source.kind, *subparams]
+            sql += f" AND ({' OR '.join(conditions)})"
+        sql += ' ORDER BY score LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    @classmethod
+    def matching_ids(cls, model, query):
+        """Sous-requête SQL (sql, params) des ids de `model` correspondant à `query`, ou None."""
+        expression = match_expression(query)
+        if expression is None:
+            return None
+        return (
+            f'SELECT object_id FROM {TABLE} WHERE {TABLE} MATCH %s AND kind = %s',
+            [expression, SOURCES_BY_MODEL[model].kind]
+        )
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Paramètre ?search= des viewsets servi par l'index FTS5 pour les modèles indexés,
+    dont les champs indexés couvrent les `search_fields` du viewset. L'ordre de la liste
+    est conservé (pagination par curseur). Les autres modèles gardent SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        source = SOURCES_BY_MODEL.get(queryset.model)
+        search_fields = self.get_search_fields(view, request)
+        if source is None or not search_available() or not search_fields \
+                or not set(search_fields) <= set(source.fields):
+            return super().filter_queryset(request, queryset, view)
+
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        subquery = SearchIndex.matching_ids(queryset.model, query)
+        if subquery is None:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(*subquery))
+
+
+class SearchView(APIView):
+    """
+    Recherche globale : /search/?q=kip-off&types=offres,clients&limit=20.
+    Résultats classés par pertinence, chaque terme étant un préfixe.
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': "Ce paramètre est obligatoire."})
+
+        kinds = [kind.strip() for kind in request.query_params.get('types', '').split(',') if kind.strip()]
+        unknown = sorted(set(kinds) - set(SOURCES_BY_KIND))
+        if unknown:
+            raise ValidationError({'types': f"Types inconnus : {', '.join(unknown)} (attendus : {', '.join(SOURCES_BY_KIND)})."})
+
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': "Un entier est attendu."})
+        limit = max(1, min(limit, self.MAX_LIMIT))
+
+        if search_available():
+            # Documents non lisibles exclus dans la requête, pour que le LIMIT porte sur les lisibles
+            readable_by = request.user if enforced(request) else None
+            results = [
+                {'type': kind, 'id': object_id, 'libelle': content, 'score': score}
+                for kind, object_id, content, score in SearchIndex.search(query, kinds, limit, readable_by)
+            ]
+        else:
+            results = self.search_without_index(request, query, kinds or list(SOURCES_BY_KIND), limit)
+        return Response({'query': query, 'results': results})
+
+    def search_without_index(self, request, query, kinds, limit):
+        """Repli sans FTS5 : recherche LIKE par type, sans classement."""
+        results = []
+        for kind in kinds:
+            source = SOURCES_BY_KIND[kind]
+            condition = Q()
+            for term in query.split():
+                term_condition = Q()
+                for field in source.fields:
+                    term_condition |= Q(**{f'{field}__icontains': term})
+                condition &= term_condition
+            for obj in readable(source.model.objects.filter(condition), request).only('pk', *source.fields)[:limit - len(results)]:
+                results.append({
+                    'type': kind,
+                    'id': obj.pk,
+                    'libelle': source.content(getattr(obj, field) for field in source.fields),
+                    'score': None,
+                })
+            if len(results) >= limit:
+                break
+        return results
@@ -1,34 +1,56 @@
 from rest_framework import serializers
 from .models import (
     Entity, Client, Site, Category, Product, Offre, Proforma, 
-    Affaire, Facture, Rapport, Formation, Participant, AttestationFormation
+    Affaire, Facture, Rapport, Formation, Participant, AttestationFormation, Job, DocumentIndex
 )
 
+
+class SparseFieldsMixin:
+    """
+    Limite la représentation aux champs demandés par ?fields= (liste transmise par la vue
+    dans le contexte, clé `fields`). Seul le sérialiseur racine est concerné : les
+    sérialiseurs imbriqués restent complets.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested and self.is_root():
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
 # Entity Serializers
-class EntityListSerializer(serializers.ModelSerializer):
+class EntityListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Entity
         fields = ['id', 'code', 'name']
 
-class EntityDetailSerializer(serializers.ModelSerializer):
+class EntityDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Entity
         fields = '__all__'
 
 # Client Serializers
-class ClientListSerializer(serializers.ModelSerializer):
+class ClientListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = ['id', 'nom', 'email']
 
-class ClientDetailSerializer(serializers.ModelSerializer):
+class ClientDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     
     class Meta:
         model = Client
         fields = '__all__'
 
 # Site Serializers
-class SiteListSerializer(serializers.ModelSerializer):
+class SiteListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_nom = serializers.CharField(source='client.nom', read_only=True)
     clientId = serializers.IntegerField(source='client.id', read_only=True)
     
@@ -36,7 +58,7 @@ class SiteListSerializer(serializers.ModelSerializer):
         model = Site
         fields = ['id', 'nom', 'client_nom', 'localisation', 'clientId']
 
-class SiteDetailSerializer(serializers.ModelSerializer):
+class SiteDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client = ClientListSerializer(read_only=True)
     class Meta:
         model = Site
@@ -48,20 +70,20 @@ class SiteEditSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # Category Serializers
-class CategoryListSerializer(serializers.ModelSerializer):
+class CategoryListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     entity_name = serializers.CharField(source='entity.name', read_only=True)
     
     class Meta:
         model = Category
         fields = ['id', 'code', 'name', 'entity_name']
 
-class CategoryDetailSerializer(serializers.ModelSerializer):
+class CategoryDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
 # Product Serializers
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     categoryId = serializers.IntegerField(source='category.id', read_only=True)
     
@@ -69,13 +91,13 @@ class ProductListSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'code', 'name', 'category_name', 'categoryId']
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
 
 # Offre Serializers
-class OffreListSerializer(serializers.ModelSerializer):
+class OffreListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_nom = serializers.CharField(source='client.nom', read_only=True)
     entity_code = serializers.CharField(source='entity.code', read_only=True)
     
@@ -83,7 +105,7 @@ class OffreListSerializer(serializers.ModelSerializer):
         model = Offre
         fields = ['id', 'reference', 'client_nom', 'entity_code', 'statut', 'date_creation']
 
-class OffreDetailSerializer(serializers.ModelSerializer):
+class OffreDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     entity = EntityDetailSerializer(read_only=True)
     client = ClientDetailSerializer(read_only=True)
     sites = SiteListSerializer(many=True, read_only=True)
@@ -98,8 +120,66 @@ class OffreEditSerializer(serializers.ModelSerializer):
         model = Offre
         fields = ['client', 'entity', 'statut', 'sites', 'produit','doc_type']
 
+def integer_pk(data):
+    """Clé primaire entière de `data` (entier JSON ou chaîne de chiffres), sinon None."""
+    if isinstance(data, int) and not isinstance(data, bool):
+        return data
+    if isinstance(data, str) and data.isdigit():
+        return int(data)
+    return None
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Consulte d'abord les objets préchargés par BulkListSerializer avant d'interroger la base."""
+    preloaded = None
+
+    def to_internal_value(self, data):
+        # true vaudrait 1 et 1.5 serait tronqué par la requête : refusés comme par DRF
+        if isinstance(data, bool) or (isinstance(data, float) and not data.is_integer()):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if self.preloaded is not None:
+            pk = integer_pk(data)
+            if pk in self.preloaded:
+                return self.preloaded[pk]
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Valide une liste d'objets en résolvant les clés primaires de chaque relation
+    en une seule requête, au lieu d'une requête par élément et par relation.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            for field in self.child.fields.values():
+                relation = getattr(field, 'child_relation', field)
+                if not isinstance(relation, PreloadedPrimaryKeyRelatedField) or field.read_only:
+                    continue
+                pks = set()
+                for item in data:
+                    value = item.get(field.field_name) if isinstance(item, dict) else None
+                    values = value if isinstance(value, list) else [value]
+                    pks.update(pk for pk in map(integer_pk, values) if pk is not None)
+                relation.preloaded = relation.get_queryset().in_bulk(pks)
+        return super().to_internal_value(data)
+
+
+class OffreBulkCreateSerializer(OffreEditSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta(OffreEditSerializer.Meta):
+        list_serializer_class = BulkListSerializer
+
+    def validate_statut(self, value):
+        if value == 'VALIDE':
+            raise serializers.ValidationError("Une offre importée en masse ne peut pas être créée validée.")
+        return value
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
+
 # Proforma Serializers
-class ProformaListSerializer(serializers.ModelSerializer):
+class ProformaListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_nom = serializers.CharField(source='client.nom', read_only=True)
     offre_reference = serializers.CharField(source='offre.reference', read_only=True)
     
@@ -107,7 +187,7 @@ class ProformaListSerializer(serializers.ModelSerializer):
         model = Proforma
         fields = ['id', 'reference', 'client_nom', 'offre_reference', 'statut', 'date_creation']
 
-class ProformaDetailSerializer(serializers.ModelSerializer):
+class ProformaDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     offre = OffreListSerializer(read_only=True)
     entity = EntityDetailSerializer(read_only=True)
     client = ClientDetailSerializer(read_only=True)
@@ -117,7 +197,7 @@ class ProformaDetailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # Affaire Serializers
-class AffaireListSerializer(serializers.ModelSerializer):
+class AffaireListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_nom = serializers.CharField(source='client.nom', read_only=True)
     offre_reference = serializers.CharField(source='offre.reference', read_only=True)
     
@@ -125,7 +205,7 @@ class AffaireListSerializer(serializers.ModelSerializer):
         model = Affaire
         fields = ['id', 'reference', 'client_nom', 'offre_reference', 'statut', 'date_debut', 'date_fin_prevue']
 
-class AffaireDetailSerializer(serializers.ModelSerializer):
+class AffaireDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     offre = OffreDetailSerializer(read_only=True)
     rapports = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
     formations = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
@@ -136,7 +216,7 @@ class AffaireDetailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # Facture Serializers
-class FactureListSerializer(serializers.ModelSerializer):
+class FactureListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_nom = serializers.CharField(source='client.nom', read_only=True)
     affaire_reference = serializers.CharField(source='affaire.reference', read_only=True)
     
@@ -144,7 +224,7 @@ class FactureListSerializer(serializers.ModelSerializer):
         model = Facture
         fields = ['id', 'reference', 'client_nom', 'affaire_reference', 'statut', 'date_creation']
 
-class FactureDetailSerializer(serializers.ModelSerializer):
+class FactureDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     affaire = AffaireListSerializer(read_only=True)
     
     class Meta:
@@ -152,7 +232,7 @@ class FactureDetailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # Rapport Serializers
-class RapportListSerializer(serializers.ModelSerializer):
+class RapportListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     affaire = AffaireListSerializer(read_only=True)
     site = SiteListSerializer(read_only=True)
     produit = ProductListSerializer(read_only=True)    
@@ -160,7 +240,7 @@ class RapportListSerializer(serializers.ModelSerializer):
         model = Rapport
         fields = ['id', 'reference', 'site', 'produit', 'statut', 'date_creation', 'affaire']
 
-class RapportDetailSerializer(serializers.ModelSerializer):
+class RapportDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     affaire = AffaireListSerializer(read_only=True)
     site = SiteDetailSerializer(read_only=True)
     produit = ProductDetailSerializer(read_only=True)
@@ -170,7 +250,7 @@ class RapportDetailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # Formation Serializers
-class FormationListSerializer(serializers.ModelSerializer):
+class FormationListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client = ClientListSerializer(read_only=True)
     affaire = AffaireListSerializer(read_only=True)
     
@@ -178,7 +258,7 @@ class FormationListSerializer(serializers.ModelSerializer):
         model = Formation
         fields = ['id', 'titre', 'client', 'affaire', 'date_debut', 'date_fin']
 
-class FormationDetailSerializer(serializers.ModelSerializer):
+class FormationDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     participants = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
     attestations = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
     
@@ -187,31 +267,36 @@ class FormationDetailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # Participant Serializers
-class ParticipantListSerializer(serializers.ModelSerializer):
+class ParticipantListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     formation_titre = serializers.CharField(source='formation.titre', read_only=True)
     
     class Meta:
         model = Participant
         fields = ['id', 'nom', 'prenom', 'email', 'formation_titre']
 
-class ParticipantDetailSerializer(serializers.ModelSerializer):
+class ParticipantDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Participant
         fields = '__all__'
 
 # AttestationFormation Serializers
-class AttestationFormationListSerializer(serializers.ModelSerializer):
+class AttestationFormationListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     participant_nom = serializers.SerializerMethodField()
     formation_titre = serializers.CharField(source='formation.titre', read_only=True)
     
     class Meta:
         model = AttestationFormation
         fields = ['id', 'reference', 'participant_nom', 'formation_titre', 'date_creation']
+        select_related = ['participant']  # lu par get_participant_nom
+        values_sources = {'participant_nom': ['participant__nom', 'participant__prenom']}
     
     def get_participant_nom(self, obj):
-        return f"{obj.participant.nom} {obj.participant.prenom}"
+        return self.values_participant_nom(obj.participant.nom, obj.participant.prenom)
 
-class AttestationFormationDetailSerializer(serializers.ModelSerializer):
+    def values_participant_nom(self, nom, prenom):
+        return f"{nom} {prenom}"
+
+class AttestationFormationDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     participant = ParticipantDetailSerializer(read_only=True)
     formation = FormationListSerializer(read_only=True)
     affaire = AffaireListSerializer(read_only=True)
@@ -220,6 +305,20 @@ class AttestationFormationDetailSerializer(serializers.ModelSerializer):
         model = AttestationFormation
         fields = '__all__'
 
+# Job Serializers
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'payload', 'statut', 'result', 'error', 'attempts', 'max_attempts',
+                  'run_after', 'date_creation', 'date_modification']
+
+class DocumentIndexSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='object_id', read_only=True)
+
+    class Meta:
+        model = DocumentIndex
+        fields = ['id', 'doc_type', 'reference', 'entity', 'client', 'statut', 'date_creation']
+
 # Entity Edit Serializer
 class EntityEditSerializer(serializers.ModelSerializer):
     class Meta:
@@ -280,6 +379,12 @@ class ParticipantEditSerializer(serializers.ModelSerializer):
         model = Participant
         fields = '__all__'
 
+class ParticipantImportSerializer(serializers.ModelSerializer):
+    """Une ligne d'import de participants (la formation est celle de l'URL)."""
+    class Meta:
+        model = Participant
+        fields = ['nom', 'prenom', 'email', 'telephone', 'fonction']
+
 # AttestationFormation Edit Serializer
 class AttestationFormationEditSerializer(serializers.ModelSerializer):
     class Meta:
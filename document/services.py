@@ -0,0 +1,309 @@
+import unicodedata
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import (
+    AttestationFormation, DocumentIndex, Formation, ModelVersion, Offre, Participant, Proforma, Rapport
+)
+from .permissions import grant_on_create
+from .search import SearchIndex
+from .serializers import ParticipantImportSerializer
+
+BATCH_SIZE = 500
+IMPORT_MAX_ROWS = 1000
+
+# En-têtes acceptés pour l'import de participants (sans accents, en minuscules)
+PARTICIPANT_COLUMNS = {
+    'nom': 'nom',
+    'prenom': 'prenom',
+    'email': 'email',
+    'e-mail': 'email',
+    'mail': 'email',
+    'courriel': 'email',
+    'telephone': 'telephone',
+    'tel': 'telephone',
+    'fonction': 'fonction',
+    'poste': 'fonction',
+}
+
+
+def assign_references(documents, date, client_id=lambda doc: doc.client_id, **sequence_kwargs):
+    """
+    Attribue numéros de séquence et références à des documents non sauvegardés.
+    Les numéros sont réservés par blocs contigus (un par entité, un par client)
+    pour éviter une requête par document.
+    """
+    if not documents:
+        return documents
+
+    by_entity = defaultdict(list)
+    by_client = defaultdict(list)
+    for document in documents:
+        by_entity[document.entity].append(document)
+        by_client[client_id(document)].append(document)
+
+    for group in by_entity.values():
+        first = group[0].allocate_sequence_number(count=len(group), **sequence_kwargs)
+        for offset, document in enumerate(group):
+            document.sequence_number = first + offset
+
+    ranks = type(documents[0]).next_client_ranks({pk: len(group) for pk, group in by_client.items()})
+    for pk, group in by_client.items():
+        for offset, document in enumerate(group):
+            document.reference = document.build_reference(ranks[pk] + offset, date)
+
+    return documents
+
+
+@transaction.atomic
+def bulk_create_offres(offres_data, batch_size=BATCH_SIZE):
+    """
+    Crée des offres en masse à partir de données validées (client, entity, statut,
+    doc_type, sites, produit) : références calculées en mémoire, puis insertion
+    des offres et de leurs liens sites/produits par lots.
+    """
+    date = now()
+    offres = [
+        Offre(
+            client=data['client'],
+            entity=data['entity'],
+            statut=data.get('statut', 'BROUILLON'),
+            doc_type=data['doc_type'],
+        )
+        for data in offres_data
+    ]
+    assign_references(offres, date)
+    offres = Offre.objects.bulk_create(offres, batch_size=batch_size)
+    DocumentIndex.index(offres)
+    SearchIndex.index(Offre, offres)
+    grant_on_create(Offre, offres)
+
+    OffreSite = Offre.sites.through
+    OffreProduit = Offre.produit.through
+    OffreSite.objects.bulk_create(
+        [
+            OffreSite(offre_id=offre.pk, site_id=site.pk)
+            for offre, data in zip(offres, offres_data)
+            for site in data.get('sites', [])
+        ],
+        batch_size=batch_size
+    )
+    OffreProduit.objects.bulk_create(
+        [
+            OffreProduit(offre_id=offre.pk, product_id=produit.pk)
+            for offre, data in zip(offres, offres_data)
+            for produit in data.get('produit', [])
+        ],
+        batch_size=batch_size
+    )
+    ModelVersion.bump_on_commit(Offre)
+    return offres
+
+
+@transaction.atomic
+def bulk_create_proformas(offres, batch_size=BATCH_SIZE):
+    """Crée en masse les proformas d'offres validées (client et entité préchargés)."""
+    proformas = [
+        Proforma(offre=offre, client=offre.client, entity=offre.entity, doc_type='PRO')
+        for offre in offres
+    ]
+    assign_references(proformas, now(), doc_type='PRO')
+    proformas = Proforma.objects.bulk_create(proformas, batch_size=batch_size)
+    DocumentIndex.index(proformas)
+    SearchIndex.index(Proforma, proformas)
+    grant_on_create(Proforma, proformas)
+    ModelVersion.bump_on_commit(Proforma)
+    return proformas
+
+
+@transaction.atomic
+def bulk_valider_offres(offre_ids):
+    """
+    Valide en une transaction toutes les offres BROUILLON parmi `offre_ids` (un seul
+    UPDATE conditionnel) et crée leurs proformas en masse.
+    Retourne un résultat par identifiant demandé, dans l'ordre de la demande.
+    """
+    offres = Offre.objects.select_for_update().select_related('client', 'entity').in_bulk(offre_ids)
+    eligibles = [pk for pk, offre in offres.items() if offre.statut == 'BROUILLON']
+
+    date = now()
+    validees = Offre.objects.filter(pk__in=eligibles, statut='BROUILLON').update(
+        statut='VALIDE', date_validation=date, date_modification=date
+    )
+    if validees != len(eligibles):
+        # Offres modifiées ou supprimées entre la lecture et l'UPDATE (pas de verrou de ligne
+        # sous SQLite) : seules celles datées par cet UPDATE ont été validées ici
+        actuelles = dict(Offre.objects.filter(pk__in=eligibles).values_list('pk', 'statut'))
+        validees = set(
+            Offre.objects.filter(pk__in=eligibles, statut='VALIDE', date_validation=date).values_list('pk', flat=True)
+        )
+        for pk in eligibles:
+            if pk not in actuelles:
+                del offres[pk]
+            elif pk not in validees:
+                offres[pk].statut = actuelles[pk]
+        eligibles = [pk for pk in eligibles if pk in validees]
+    DocumentIndex.refresh(Offre, eligibles)
+    ModelVersion.bump_on_commit(Offre)
+    for pk in eligibles:
+        offres[pk].statut = 'VALIDE'
+        offres[pk].date_validation = date
+
+    deja_crees = set(Proforma.objects.filter(offre_id__in=eligibles).values_list('offre_id', flat=True))
+    proformas = {
+        proforma.offre_id: proforma
+        for proforma in bulk_create_proformas([offres[pk] for pk in eligibles if pk not in deja_crees])
+    }
+
+    results = []
+    for pk in offre_ids:
+        offre = offres.get(pk)
+        if offre is None:
+            results.append({'id': pk, 'resultat': 'INTROUVABLE', 'detail': "Offre introuvable."})
+        elif pk not in eligibles:
+            results.append({
+                'id': pk,
+                'resultat': 'REFUSE',
+                'detail': f"Seule une offre en brouillon peut être validée (statut actuel : {offre.statut})."
+            })
+        else:
+            proforma = proformas.get(pk)
+            results.append({
+                'id': pk,
+                'resultat': 'VALIDE',
+                'proforma': proforma.reference if proforma else None,
+            })
+    return results
+
+
+@transaction.atomic
+def bulk_create_rapports(affaire, pairs, batch_size=BATCH_SIZE):
+    """
+    Crée les rapports d'une affaire pour les couples (site, produit) donnés, ainsi que
+    les formations des produits de catégorie FOR. Les produits doivent avoir leur
+    catégorie préchargée (select_related('category')).
+    """
+    date = now()
+    rapports = [
+        Rapport(
+            affaire=affaire,
+            site=site,
+            produit=produit,
+            client=affaire.client,
+            entity=affaire.entity,
+            doc_type='RAP',
+            statut='BROUILLON'
+        )
+        for site, produit in pairs
+    ]
+    assign_references(rapports, date, client_id=lambda rapport: rapport.affaire.client_id, doc_type='RAP')
+    rapports = Rapport.objects.bulk_create(rapports, batch_size=batch_size)
+    DocumentIndex.index(rapports)
+    SearchIndex.index(Rapport, rapports)
+    grant_on_create(Rapport, rapports)
+
+    Formation.objects.bulk_create(
+        [affaire.nouvelle_formation(rapport) for rapport in rapports if rapport.produit.category.code == 'FOR'],
+        batch_size=batch_size
+    )
+    ModelVersion.bump_on_commit(Rapport, Formation)
+    return rapports
+
+
+@transaction.atomic
+def bulk_create_attestations(formation, batch_size=BATCH_SIZE):
+    """
+    Crée en une opération les attestations de tous les participants de la formation
+    qui n'en ont pas encore. Retourne les attestations créées.
+    """
+    formation = Formation.objects.select_for_update().select_related(
+        'affaire__client', 'affaire__entity'
+    ).get(pk=formation.pk)
+    affaire = formation.affaire
+    details = formation.details_attestation()
+
+    attestations = [
+        AttestationFormation(
+            affaire=affaire,
+            formation=formation,
+            participant=participant,
+            client=affaire.client,
+            entity=affaire.entity,
+            doc_type='ATT',
+            details_formation=details
+        )
+        for participant in formation.participants.filter(attestation__isnull=True).order_by('pk')
+    ]
+    assign_references(
+        attestations,
+        now(),
+        scope=AttestationFormation.sequence_scope(affaire.client_id, formation.pk),
+        client=affaire.client,
+        formation=formation,
+        doc_type='ATT'
+    )
+    attestations = AttestationFormation.objects.bulk_create(attestations, batch_size=batch_size)
+    DocumentIndex.index(attestations)
+    grant_on_create(AttestationFormation, attestations)
+    ModelVersion.bump_on_commit(AttestationFormation)
+    return attestations
+
+
+def strip_accents(value):
+    return ''.join(char for char in unicodedata.normalize('NFKD', value) if not unicodedata.combining(char))
+
+
+def participant_row(row):
+    """Ligne importée ramenée aux champs du participant ; les cellules vides sont ignorées."""
+    data = {}
+    for key, value in row.items():
+        field = PARTICIPANT_COLUMNS.get(strip_accents(str(key)).strip().lower()) if key is not None else None
+        if field and value not in (None, ''):
+            data[field] = value
+    return data
+
+
+def participant_key(email, nom, prenom):
+    """Clé de dédoublonnage d'un participant dans sa formation."""
+    return tuple(strip_accents(value or '').strip().lower() for value in (email, nom, prenom))
+
+
+@transaction.atomic
+def import_participants(formation, rows, max_rows=IMPORT_MAX_ROWS):
+    """
+    Importe des participants dans `formation` depuis `rows`, itérable de couples
+    (numéro de ligne, dict) lu en un seul passage. Chaque ligne est validée seule : les
+    lignes invalides sont signalées sans empêcher l'import des autres. Les participants
+    déjà inscrits ou répétés dans le fichier (même email, nom et prénom) sont ignorés.
+    Insertion en une opération ; retourne le rapport d'import.
+    """
+    formation = Formation.objects.select_for_update().get(pk=formation.pk)
+    known = {participant_key(*values) for values in formation.participants.values_list('email', 'nom', 'prenom')}
+
+    participants, doublons, erreurs = [], [], []
+    for count, (ligne, row) in enumerate(rows, 1):
+        if count > max_rows:
+            erreurs.append({'ligne': ligne, 'erreurs': {'non_field_errors': [f"Import limité à {max_rows} lignes."]}})
+            break
+        if not isinstance(row, dict):
+            erreurs.append({'ligne': ligne, 'erreurs': {'non_field_errors': ["Un objet est attendu."]}})
+            continue
+        serializer = ParticipantImportSerializer(data=participant_row(row))
+        if not serializer.is_valid():
+            erreurs.append({'ligne': ligne, 'erreurs': serializer.errors})
+            continue
+        data = serializer.validated_data
+        key = participant_key(data.get('email'), data['nom'], data['prenom'])
+        if key in known:
+            doublons.append(ligne)
+            continue
+        known.add(key)
+        participants.append(Participant(formation=formation, **data))
+
+    participants = Participant.objects.bulk_create(participants, batch_size=BATCH_SIZE)
+    if participants:
+        SearchIndex.index(Participant, participants)
+        ModelVersion.bump_on_commit(Participant)
+    return {'participants': participants, 'doublons': doublons, 'erreurs': erreurs}
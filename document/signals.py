@@ -0,0 +1,100 @@
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.timezone import now
+
+from .models import (
+    DOCUMENT_MODELS, Affaire, ClientDocumentCounter, DocumentIndex, DocumentSequence, Job, ModelVersion, Offre
+)
+from .permissions import grant_on_create
+from .search import SOURCES, SearchIndex
+
+# Tables techniques, absentes des réponses de l'API : pas de version à tenir
+UNVERSIONED_MODELS = {ClientDocumentCounter, DocumentIndex, DocumentSequence, Job, ModelVersion}
+
+
+def decrement_client_counter(sender, instance, **kwargs):
+    """Garde le compteur par client égal au nombre de documents existants."""
+    ClientDocumentCounter.decrement(instance.client_id, sender.reference_code)
+
+
+for model in DOCUMENT_MODELS:
+    post_delete.connect(decrement_client_counter, sender=model, dispatch_uid=f"decrement_client_counter_{model.__name__}")
+
+
+def index_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        DocumentIndex.index([instance])
+
+
+def unindex_document(sender, instance, **kwargs):
+    DocumentIndex.unindex(sender, [instance.pk])
+
+
+for model in DOCUMENT_MODELS:
+    post_save.connect(index_document, sender=model, dispatch_uid=f"index_document_{model.__name__}")
+    post_delete.connect(unindex_document, sender=model, dispatch_uid=f"unindex_document_{model.__name__}")
+
+
+def grant_document(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        grant_on_create(sender, [instance])
+
+
+for model in DOCUMENT_MODELS:
+    post_save.connect(grant_document, sender=model, dispatch_uid=f"grant_document_{model.__name__}")
+
+
+def index_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        SearchIndex.index(sender, [instance])
+
+
+def unindex_search(sender, instance, **kwargs):
+    SearchIndex.unindex(sender, [instance.pk])
+
+
+for source in SOURCES:
+    post_save.connect(index_search, sender=source.model, dispatch_uid=f"index_search_{source.model.__name__}")
+    post_delete.connect(unindex_search, sender=source.model, dispatch_uid=f"unindex_search_{source.model.__name__}")
+
+
+def sync_affaire_rapports(sender, instance, action, reverse, pk_set, **kwargs):
+    """Répercute sur les rapports de l'affaire les sites et produits ajoutés ou retirés de l'offre."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if not pk_set:
+            return
+        affaires = Affaire.objects.filter(offre__in=pk_set)
+    else:
+        affaires = Affaire.objects.filter(offre=instance)
+    for affaire in affaires.select_related('offre', 'client', 'entity'):
+        affaire.sync_rapports()
+
+
+for through in (Offre.sites.through, Offre.produit.through):
+    m2m_changed.connect(sync_affaire_rapports, sender=through, dispatch_uid=f"sync_affaire_rapports_{through.__name__}")
+
+
+def bump_model_version(sender, raw=False, **kwargs):
+    if not raw:
+        ModelVersion.bump_on_commit(sender)
+
+
+for model in apps.get_app_config('document').get_models():
+    if model not in UNVERSIONED_MODELS and not model._meta.auto_created:
+        post_save.connect(bump_model_version, sender=model, dispatch_uid=f"bump_model_version_save_{model.__name__}")
+        post_delete.connect(bump_model_version, sender=model, dispatch_uid=f"bump_model_version_delete_{model.__name__}")
+
+
+def touch_offre(sender, instance, action, reverse, pk_set, **kwargs):
+    """Les sites et produits font partie de l'offre : leur modification la date et la versionne."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    offres = Offre.objects.filter(pk__in=pk_set or []) if reverse else Offre.objects.filter(pk=instance.pk)
+    offres.update(date_modification=now())
+    ModelVersion.bump_on_commit(Offre)
+
+
+for through in (Offre.sites.through, Offre.produit.through):
+    m2m_changed.connect(touch_offre, sender=through, dispatch_uid=f"touch_offre_{through.__name__}")
@@ -0,0 +1,58 @@
+"""
+Profil de performance SQLite, appliqué à chaque nouvelle connexion (signal connection_created).
+
+Les pragmas viennent du réglage SQLITE_PRAGMAS (dict vide : profil désactivé). Une
+base en journal WAL reçoit en plus WAL_PRAGMAS : synchronous=NORMAL n'y fait pas
+courir de risque de corruption, contrairement au journal DELETE (synchronous reste
+alors à FULL, valeur par défaut de SQLite).
+
+Le journal WAL (lecteurs non bloqués par l'écrivain) n'est pas dans le profil par
+défaut : il est enregistré dans le fichier de la base, dont il modifie l'en-tête, et
+crée les fichiers -wal/-shm à côté. Il s'active explicitement, une fois, avec
+`manage.py db_maintenance --enable-wal` (ou journal_mode dans SQLITE_PRAGMAS).
+L'entretien (ANALYZE, optimize, vacuum incrémental, checkpoint WAL) est fait par
+`manage.py db_maintenance`.
+"""
+import re
+
+from django.conf import settings
+
+# busy_timeout d'abord : le passage en WAL peut avoir à attendre un verrou
+PRAGMA_ORDER = ['busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store']
+PRAGMA_VALUE = re.compile(r'^-?\d+$|^[A-Za-z]+$')
+
+
+def apply_pragmas(cursor, pragmas):
+    """Exécute les pragmas `pragmas` ({nom: valeur}) sur `cursor` (DB-API)."""
+    for name in sorted(pragmas, key=lambda name: PRAGMA_ORDER.index(name) if name in PRAGMA_ORDER else len(PRAGMA_ORDER)):
+        value = str(pragmas[name])
+        if not name.isidentifier() or not PRAGMA_VALUE.match(value):
+            raise ValueError(f"Pragma SQLite invalide : {name} = {value}")
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# Pragmas ajoutés quand la base est en WAL, sauf s'ils sont fixés par SQLITE_PRAGMAS
+WAL_PRAGMAS = {'synchronous': 'NORMAL'}
+
+
+def configure(cursor, pragmas):
+    """Applique `pragmas` sur `cursor`, puis WAL_PRAGMAS si la base est en journal WAL."""
+    apply_pragmas(cursor, pragmas)
+    cursor.execute('PRAGMA journal_mode')
+    if cursor.fetchone()[0].lower() == 'wal':
+        apply_pragmas(cursor, {name: value for name, value in WAL_PRAGMAS.items() if name not in pragmas})
+
+
+def enable_wal(cursor):
+    """Passe la base en journal WAL (réglage persistant) ; retourne le mode obtenu."""
+    cursor.execute('PRAGMA journal_mode = WAL')
+    return cursor.fetchone()[0].lower()
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            configure(cursor, pragmas)
@@ -1,3 +1,1158 @@
-from django.test import TestCase
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import uuid
+from importlib import import_module
+from datetime import time
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.http import StreamingHttpResponse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase, APITransactionTestCase
+
+from . import DocumentAggregator, jobs
+from .pagination import KeysetPagination, keyset_filter
+from .parsers import FastJSONParser
+from .permissions import document_permissions
+from .renderers import FastJSONRenderer, float_free
+from .search import SearchIndex
+from .sqlite import apply_pragmas, configure, enable_wal
+from .serializers import (
+    AttestationFormationListSerializer, OffreDetailSerializer, OffreListSerializer, RapportListSerializer
+)
+from .services import bulk_create_attestations
+from .urls import router
+from .values import values_mapping
+from .models import (
+    DOCUMENT_MODELS, Affaire, AttestationFormation, Category, Client, ClientDocumentCounter, DocumentIndex, DocumentPermission,
+    DocumentSequence, Entity, Facture, Formation, Job, ModelVersion, Offre, Participant, Product, Proforma, Rapport,
+    Site
+)
+
+
+def creer_offre(nb_sites, nb_produits, client=None, entity=None):
+    """Crée une offre validable couvrant `nb_sites` sites et `nb_produits` produits (moitié FOR)."""
+    entity = entity or Entity.objects.get_or_create(code='KIP', defaults={'name': 'KES INSPECTIONS & PROJECTS'})[0]
+    client = client or Client.objects.create(nom='Client test')
+    formation = Category.objects.get_or_create(code='FOR', entity=entity, defaults={'name': 'FORMATION'})[0]
+    inspection = Category.objects.get_or_create(code='INS', entity=entity, defaults={'name': 'INSPECTION'})[0]
+
+    sites = [Site.objects.create(nom=f"Site {i}", client=client) for i in range(nb_sites)]
+    produits = [
+        Product.objects.create(
+            code=f"VTE{i}",
+            name=f"Produit {i}",
+            category=formation if i % 2 else inspection
+        )
+        for i in range(nb_produits)
+    ]
+    offre = Offre.objects.create(client=client, entity=entity, doc_type='OFF')
+    offre.sites.set(sites)
+    offre.produit.set(produits)
+    return offre
+
+
+def creer_affaire(offre):
+    return Affaire.objects.create(offre=offre, client=offre.client, entity=offre.entity, doc_type='AFF')
+
+
+class NumerotationTests(TestCase):
+    def setUp(self):
+        self.offre = creer_offre(1, 1)
+        self.entity = self.offre.entity
+
+    def compteur(self, doc_type='OFF', scope=''):
+        return DocumentSequence.objects.get(entity=self.entity, doc_type=doc_type, scope=scope).last_number
+
+    def test_numeros_consecutifs(self):
+        suivante = Offre.objects.create(client=self.offre.client, entity=self.entity, doc_type='OFF')
+        self.assertEqual(suivante.sequence_number, self.offre.sequence_number + 1)
+        self.assertEqual(self.compteur(), suivante.sequence_number)
+
+    def test_reservation_par_bloc(self):
+        premier = DocumentSequence.allocate(self.entity, 'OFF', count=5)
+        self.assertEqual(premier, self.offre.sequence_number + 1)
+        self.assertEqual(self.compteur(), premier + 4)
+        suivante = Offre.objects.create(client=self.offre.client, entity=self.entity, doc_type='OFF')
+        self.assertEqual(suivante.sequence_number, premier + 5)
+
+    def test_compteur_repris_des_documents_existants(self):
+        Offre.objects.filter(pk=self.offre.pk).update(sequence_number=41)
+        DocumentSequence.objects.all().delete()
+        suivante = Offre.objects.create(client=self.offre.client, entity=self.entity, doc_type='OFF')
+        self.assertEqual(suivante.sequence_number, 42)
+
+    def test_migration_initialise_les_compteurs(self):
+        affaire = creer_affaire(self.offre)
+        attendus = dict(DocumentSequence.objects.values_list('doc_type', 'last_number'))
+        DocumentSequence.objects.all().delete()
+
+        import_module('document.migrations.0003_documentsequence').backfill_sequences(apps, None)
+
+        self.assertEqual(dict(DocumentSequence.objects.values_list('doc_type', 'last_number')), attendus)
+        rapport = Rapport.objects.create(
+            affaire=affaire, site=self.offre.sites.get(), produit=self.offre.produit.get(),
+            client=affaire.client, entity=self.entity, doc_type='RAP'
+        )
+        self.assertEqual(rapport.sequence_number, attendus['RAP'] + 1)
+
+    def test_attestations_numerotees_par_formation(self):
+        affaire = creer_affaire(creer_offre(2, 2, client=self.offre.client))
+        numeros = {}
+        for formation in affaire.formations.all():
+            for i in range(2):
+                participant = Participant.objects.create(formation=formation, nom=f"Nom {i}", prenom="Prénom")
+                attestation = AttestationFormation.objects.create(
+                    affaire=affaire, formation=formation, participant=participant, client=affaire.client,
+                    entity=self.entity, doc_type='ATT', details_formation=formation.details_attestation()
+                )
+                numeros.setdefault(formation.pk, []).append(attestation.sequence_number)
+
+        self.assertEqual(len(numeros), 2)
+        for formation_id, sequence in numeros.items():
+            self.assertEqual(sequence, [1, 2])
+            scope = AttestationFormation.sequence_scope(affaire.client_id, formation_id)
+            self.assertEqual(self.compteur('ATT', scope), 2)
+
+
+class CompteursClientTests(TestCase):
+    def nouvelle_offre(self, client):
+        return Offre.objects.create(client=client, entity=self.entity, doc_type='OFF')
+
+    def setUp(self):
+        self.offre = creer_offre(1, 1)
+        self.entity, self.client_ = self.offre.entity, self.offre.client
+
+    def assertRangCommeAvant(self, offre):
+        """Référence identique à l'ancien calcul : rang = count() des offres du client avant insertion + 1."""
+        rang = Offre.objects.filter(client=self.client_).exclude(pk=offre.pk).count() + 1
+        date = offre.date_creation
+        self.assertEqual(
+            offre.reference,
+            f"KIP-OFF-{date.year}-{date.month:02d}-{self.client_.pk}-{rang}-{offre.sequence_number:04d}"
+        )
+
+    def test_rang_apres_suppressions(self):
+        offres = [creer_offre(1, 1, client=self.client_)] + [self.nouvelle_offre(self.client_) for _ in range(2)]
+        offres[1].delete()
+        self.offre.delete()
+        self.assertRangCommeAvant(self.nouvelle_offre(self.client_))
+
+        # Suppression en cascade (affaire, rapports) : les compteurs suivent aussi
+        affaire = creer_affaire(offres[0])
+        offres[0].delete()
+        self.assertFalse(Affaire.objects.filter(pk=affaire.pk).exists())
+        self.assertEqual(
+            dict(ClientDocumentCounter.objects.filter(client=self.client_).values_list('doc_type', 'total')),
+            {'OFF': 2, 'AFF': 0, 'RAP': 0}
+        )
+        self.assertRangCommeAvant(self.nouvelle_offre(self.client_))
+
+    def test_rebuild_corrige_les_compteurs(self):
+        creer_affaire(self.offre)
+        self.nouvelle_offre(self.client_)
+        ClientDocumentCounter.objects.update(total=99)
+
+        call_command('rebuild_client_counters', stdout=io.StringIO())
+
+        self.assertEqual(
+            dict(ClientDocumentCounter.objects.filter(client=self.client_).values_list('doc_type', 'total')),
+            {'OFF': 2, 'AFF': 1, 'RAP': 1}
+        )
+        self.assertRangCommeAvant(self.nouvelle_offre(self.client_))
+
+
+class CreationEnMasseTests(APITestCase):
+    def setUp(self):
+        self.offre = creer_offre(1, 1)
+        self.entity = self.offre.entity
+        self.clients = [self.offre.client, Client.objects.create(nom='Autre client')]
+
+    def donnees(self, client):
+        return {
+            'client': client.pk, 'entity': self.entity.pk, 'doc_type': 'OFF',
+            'sites': [self.offre.sites.get().pk], 'produit': [self.offre.produit.get().pk]
+        }
+
+    def test_references_identiques_aux_creations_unitaires(self):
+        ordre = [self.clients[0], self.clients[1], self.clients[0]]
+
+        # Références obtenues par des save() successifs, puis annulées
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                attendues = [
+                    Offre.objects.create(client=client, entity=self.entity, doc_type='OFF').reference
+                    for client in ordre
+                ]
+                raise RuntimeError
+
+        response = self.client.post('/offres/bulk/', [self.donnees(client) for client in ordre], format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([offre['reference'] for offre in response.data], attendues)
+
+        suivante = Offre.objects.create(client=self.clients[0], entity=self.entity, doc_type='OFF')
+        derniere = Offre.objects.get(reference=attendues[-1])
+        self.assertEqual(suivante.sequence_number, derniere.sequence_number + 1)
+        self.assertEqual(suivante.reference.split('-')[5], '4')  # 4e offre du client
+
+    def test_cles_invalides_refusees(self):
+        for valeur in (True, 1.5, [self.clients[0].pk]):
+            with self.subTest(valeur=valeur):
+                donnees = {**self.donnees(self.clients[0]), 'client': valeur}
+                response = self.client.post('/offres/bulk/', [donnees], format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('client', response.data[0])
+        self.assertEqual(self.client.post('/offres/bulk/', [], format='json').status_code, 400)
+        self.assertEqual(Offre.objects.count(), 1)
+
+
+class CreeRapportsTests(TestCase):
+    def test_cree_un_rapport_par_couple_site_produit(self):
+        affaire = creer_affaire(creer_offre(3, 4))
+
+        self.assertEqual(Rapport.objects.filter(affaire=affaire).count(), 12)
+        self.assertEqual(Formation.objects.filter(affaire=affaire).count(), 6)
+        references = set(Rapport.objects.values_list('reference', flat=True))
+        self.assertEqual(len(references), 12)
+
+    def test_nombre_de_requetes_constant(self):
+        """
+        Le nombre de requêtes ne dépend pas de la taille de la matrice sites × produits
+        (dans la limite d'un lot d'insertion, borné par SQLite à 999 paramètres).
+        """
+        creer_affaire(creer_offre(1, 1))  # crée les compteurs du mois
+
+        query_counts = []
+        for nb_sites, nb_produits in [(1, 2), (4, 4), (9, 10)]:
+            offre = creer_offre(nb_sites, nb_produits, client=Client.objects.create(nom='Client'))
+            with CaptureQueriesContext(connection) as queries:
+                creer_affaire(offre)
+            query_counts.append(len(queries))
+
+        self.assertEqual(len(set(query_counts)), 1, query_counts)
+
+    def test_sync_rapports_ne_touche_que_la_difference(self):
+        offre = creer_offre(3, 2)
+        affaire = creer_affaire(offre)
+        site_retire, *sites_gardes = offre.sites.all()
+        conserves = set(Rapport.objects.filter(site__in=sites_gardes).values_list('pk', flat=True))
+
+        offre.sites.remove(site_retire)
+        nouveau_site = Site.objects.create(nom='Nouveau site', client=offre.client)
+        offre.sites.add(nouveau_site)
+
+        rapports = Rapport.objects.filter(affaire=affaire)
+        self.assertEqual(rapports.count(), 6)
+        self.assertFalse(rapports.filter(site=site_retire).exists())
+        self.assertEqual(rapports.filter(site=nouveau_site).count(), 2)
+        self.assertTrue(conserves <= set(rapports.values_list('pk', flat=True)))
+        self.assertEqual(affaire.sync_rapports(), [])
+
+
+class ValidationEnArrierePlanTests(APITestCase):
+    def test_valider_offre_delegue_la_cascade(self):
+        offre = creer_offre(2, 2)
+
+        response = self.client.post(f'/offres/{offre.pk}/valider/')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Proforma.objects.filter(offre=offre).exists())
+        job = Job.objects.get(pk=response.data['job'])
+        self.assertEqual(self.client.get(f'/jobs/{job.pk}/').data['statut'], 'EN_ATTENTE')
+
+        jobs.run(jobs.claim_next())
+
+        job.refresh_from_db()
+        self.assertEqual(job.statut, 'TERMINE')
+        self.assertEqual(job.result['proforma'], offre.proforma.pk)
+
+    def test_patch_valide_delegue_la_cascade(self):
+        offre = creer_offre(2, 2)
+        Offre.objects.filter(pk=offre.pk).update(statut='VALIDE', date_validation=now())
+        proforma = Proforma.objects.create(offre=offre, client=offre.client, entity=offre.entity, doc_type='PRO')
+
+        response = self.client.patch(f'/proformas/{proforma.pk}/', {'statut': 'VALIDE'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Affaire.objects.filter(offre=offre).exists())
+        jobs.run(jobs.claim_next())
+        self.assertEqual(Affaire.objects.get(offre=offre).rapports.count(), 4)
+
+        # Proforma réenregistré après création de l'affaire : pas de nouveau job
+        proforma.refresh_from_db()
+        proforma.save()
+        self.assertIsNone(jobs.claim_next())
+
+    def test_job_relance_idempotent(self):
+        offre = creer_offre(1, 1)
+        self.client.post(f'/offres/{offre.pk}/valider/')
+        job = jobs.run(jobs.claim_next())
+
+        # Une seconde exécution ne recrée pas le proforma
+        Job.objects.filter(pk=job.pk).update(statut='EN_ATTENTE')
+        jobs.run(jobs.claim_next())
+
+        self.assertEqual(Proforma.objects.filter(offre=offre).count(), 1)
+
+    def test_job_en_echec_replanifie(self):
+        job = jobs.enqueue('valider_proforma', max_attempts=2, proforma_id=0)
+
+        jobs.run(jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.statut, job.attempts), ('EN_ATTENTE', 1))
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.date_creation)
+        jobs.run(jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.statut, job.attempts), ('ECHEC', 2))
+
+
+class ValidationEnMasseTests(APITestCase):
+    def valider(self, ids):
+        response = self.client.post('/offres/bulk_valider/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(result['id'], result['resultat']) for result in response.data['results']]
+
+    def test_statuts_melanges_puis_seconde_demande(self):
+        brouillons = [creer_offre(1, 1), creer_offre(1, 1)]
+        validee = creer_offre(1, 1)
+        Offre.objects.filter(pk=validee.pk).update(statut='VALIDE')
+        ids = [brouillons[0].pk, validee.pk, 999999, brouillons[1].pk]
+
+        self.assertEqual(
+            self.valider(ids),
+            [(brouillons[0].pk, 'VALIDE'), (validee.pk, 'REFUSE'), (999999, 'INTROUVABLE'), (brouillons[1].pk, 'VALIDE')]
+        )
+        self.assertEqual(
+            set(Proforma.objects.values_list('offre_id', flat=True)), {offre.pk for offre in brouillons}
+        )
+
+        # Les offres validées par la première demande sont refusées par la seconde
+        self.assertEqual(
+            self.valider(ids),
+            [(brouillons[0].pk, 'REFUSE'), (validee.pk, 'REFUSE'), (999999, 'INTROUVABLE'), (brouillons[1].pk, 'REFUSE')]
+        )
+        self.assertEqual(Proforma.objects.count(), 2)
+
+    def test_resultats_fideles_a_l_update(self):
+        offres = [creer_offre(1, 1), creer_offre(1, 1), creer_offre(1, 1)]
+        ids = [offre.pk for offre in offres]
+        in_bulk = QuerySet.in_bulk
+
+        def lecture_puis_ecriture_concurrente(queryset, *args, **kwargs):
+            lues = in_bulk(queryset, *args, **kwargs)
+            # Entre la lecture et l'UPDATE : une offre est envoyée, une autre supprimée
+            Offre.objects.filter(pk=offres[1].pk).update(statut='ENVOYE')
+            offres[2].delete()
+            return lues
+
+        with mock.patch.object(QuerySet, 'in_bulk', lecture_puis_ecriture_concurrente):
+            resultats = self.valider(ids)
+
+        self.assertEqual(resultats, [(ids[0], 'VALIDE'), (ids[1], 'REFUSE'), (ids[2], 'INTROUVABLE')])
+        self.assertEqual(list(Proforma.objects.values_list('offre_id', flat=True)), [ids[0]])
+        self.assertEqual(Offre.objects.get(pk=offres[1].pk).statut, 'ENVOYE')
+
+
+class GenerationAttestationsTests(APITestCase):
+    def setUp(self):
+        self.affaire = creer_affaire(creer_offre(1, 2))
+        self.formation = self.affaire.formations.get()
+
+    def inscrire(self, nombre, debut=0):
+        return [
+            Participant.objects.create(formation=self.formation, nom=f"Nom {i}", prenom="Prénom")
+            for i in range(debut, debut + nombre)
+        ]
+
+    def generer(self):
+        return self.client.post(f'/formations/{self.formation.pk}/generer_attestations/')
+
+    def test_generation_puis_nouveaux_participants(self):
+        premiers = self.inscrire(3)
+        response = self.generer()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['attestations']), 3)
+
+        attestations = AttestationFormation.objects.filter(formation=self.formation).order_by('sequence_number')
+        self.assertEqual([a.participant_id for a in attestations], [p.pk for p in premiers])
+        self.assertEqual([a.sequence_number for a in attestations], [1, 2, 3])
+        # Rangs client contigus (suivis, dans la référence, de la formation, du participant et du numéro)
+        self.assertEqual([a.reference.split('-')[-4] for a in attestations], ['1', '2', '3'])
+        self.assertEqual({a.details_formation for a in attestations}, {self.formation.details_attestation()})
+
+        self.assertEqual(self.generer().status_code, 200)  # rien de nouveau
+
+        nouveaux = self.inscrire(2, debut=3)
+        response = self.generer()
+        self.assertEqual(response.status_code, 201)
+        crees = AttestationFormation.objects.filter(pk__in=[a['id'] for a in response.data['attestations']])
+        self.assertEqual({a.participant_id for a in crees}, {p.pk for p in nouveaux})
+        self.assertEqual(sorted(a.sequence_number for a in crees), [4, 5])
+        self.assertEqual(AttestationFormation.objects.filter(formation=self.formation).count(), 5)
+
+
+class FiltresAgregateurTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='lecteur'))
+        self.offre = creer_offre(1, 1)
+
+    def compter(self, **params):
+        response = self.client.get('/documents/', {'types': 'offres', **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['metadata']['documents_par_type']['offres']
+
+    def test_intervalles_et_listes(self):
+        jour = now().date()
+        self.assertEqual(self.compter(date_creation=jour.isoformat()), 1)
+        self.assertEqual(self.compter(date_creation__gte=jour.strftime('%d/%m/%Y'), date_creation__lte=jour.isoformat()), 1)
+        self.assertEqual(self.compter(date_creation__lte='2000-01-01'), 0)
+        self.assertEqual(self.compter(statut__in='valide,brouillon'), 1)
+        self.assertEqual(self.compter(statut__in='VALIDE,REFUSE'), 0)
+
+    def test_format_normalise(self):
+        creer_affaire(self.offre)
+        response = self.client.get('/documents/', {'types': 'affaires', 'include': 'offres,clients,sites'})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        affaire = response.data['documents']['affaires'][0]
+        self.assertEqual(affaire['offre'], self.offre.pk)
+        included = response.data['included']
+        self.assertEqual([offre['id'] for offre in included['offres']], [self.offre.pk])
+        # Le client de l'offre jointe est joint une seule fois
+        self.assertEqual([client['id'] for client in included['clients']], [self.offre.client_id])
+        self.assertEqual(len(included['sites']), 1)
+
+    def test_filtres_invalides_refuses(self):
+        for params in [{'inconnu': '1'}, {'statut__regex': 'B'}, {'date_validation__gte': 'hier'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/documents/', params).status_code, 400)
+
+
+class PaginationAgregateurTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='lecteur'))
+
+    def parcourir(self, doc_type, page_size):
+        """Ids de toutes les pages de `doc_type`, en suivant curseurs_suivants[doc_type]."""
+        pages, params = [], {'types': doc_type, 'page_size': page_size}
+        while True:
+            response = self.client.get('/documents/', params)
+            self.assertEqual(response.status_code, 200, response.data)
+            pages.append([document['id'] for document in response.data['documents'][doc_type]])
+            cursor = response.data['metadata']['curseurs_suivants'][doc_type]
+            if cursor is None:
+                return pages
+            params[f'cursor_{doc_type}'] = cursor
+
+    def test_pages_sans_doublon_ni_trou(self):
+        for _ in range(3):
+            creer_affaire(creer_offre(2, 2))
+        # Dates identiques : l'ordre repose alors sur l'id
+        Offre.objects.filter(pk__in=Offre.objects.order_by('pk').values('pk')[:2]).update(date_creation=now())
+        Rapport.objects.update(date_creation=now())
+
+        for doc_type, model in [('offres', Offre), ('rapports', Rapport), ('formations', Formation)]:
+            ordering = ['-id'] if model is Formation else ['-date_creation', '-id']
+            attendus = list(model.objects.order_by(*ordering).values_list('pk', flat=True))
+            with self.subTest(doc_type=doc_type):
+                pages = self.parcourir(doc_type, page_size=2)
+                self.assertEqual([pk for page in pages for pk in page], attendus)
+                self.assertGreater(len(pages), 1)
+                self.assertTrue(all(len(page) == 2 for page in pages[:-1]), pages)
+
+
+class ExportNDJSONTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='lecteur'))
+
+    def exporter(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/documents/', {'types': 'offres', 'format': 'ndjson'})
+            lignes = b''.join(response.streaming_content).decode().splitlines()
+        return response, [json.loads(ligne) for ligne in lignes], len(queries)
+
+    @mock.patch.object(DocumentAggregator, 'EXPORT_CHUNK_SIZE', 2)
+    def test_une_ligne_par_document_requetes_par_lot(self):
+        for _ in range(4):
+            creer_offre(1, 2)
+        response, lignes, requetes_2_lots = self.exporter()
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(
+            [(ligne['type'], ligne['document']['id']) for ligne in lignes],
+            [('offres', pk) for pk in Offre.objects.order_by('-date_creation', '-id').values_list('pk', flat=True)]
+        )
+
+        for _ in range(4):
+            creer_offre(1, 2)
+        _, lignes, requetes_4_lots = self.exporter()
+        self.assertEqual(len(lignes), 8)
+        # Deux lots de plus : deux préchargements (produits, sites) par lot, rien par document
+        self.assertEqual(requetes_4_lots - requetes_2_lots, 2 * 2)
+
+
+class DocumentIndexTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='lecteur'))
+
+    def assertIndexAJour(self):
+        attendu = {
+            (model.reference_code, document.pk, document.reference, document.statut)
+            for model in DOCUMENT_MODELS
+            for document in model.objects.all()
+        }
+        self.assertEqual(
+            set(DocumentIndex.objects.values_list('doc_type', 'object_id', 'reference', 'statut')), attendu
+        )
+
+    def test_index_suit_creations_mises_a_jour_et_suppressions(self):
+        offre = creer_offre(2, 2)
+        creer_affaire(offre)
+        self.client.post('/offres/bulk_valider/', {'ids': [creer_offre(1, 1).pk]}, format='json')
+        self.assertIndexAJour()
+
+        Rapport.objects.filter(affaire__offre=offre).first().delete()
+        offre.delete()
+        self.assertIndexAJour()
+
+    def test_flux_client(self):
+        offre = creer_offre(2, 1)
+        creer_affaire(offre)
+        creer_offre(1, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/clients/{offre.client_id}/documents/', {'page_size': 2})
+        self.assertEqual(len(queries), 3, [query['sql'] for query in queries])  # client, page, comptes
+        self.assertEqual(response.data['documents_par_type'], {'OFF': 1, 'AFF': 1, 'RAP': 2})
+        self.assertEqual(len(response.data['results']), 2)
+
+        suite = self.client.get(
+            f'/clients/{offre.client_id}/documents/', {'page_size': 2, 'cursor': response.data['curseur_suivant']}
+        )
+        self.assertEqual(len(suite.data['results']), 2)
+        self.assertIsNone(suite.data['curseur_suivant'])
+
+
+class GetConditionnelTests(APITransactionTestCase):
+    """Hors transaction de test : les versions sont incrémentées au commit."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='lecteur'))
+
+    def assertNonModifie(self, url, etag, attendu=True):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304 if attendu else 200)
+        if attendu:
+            # Agrégat du queryset et lecture des versions, sans chargement d'objet
+            self.assertEqual(len(queries), 2, [query['sql'] for query in queries])
+        return response
+
+    def test_liste_et_detail(self):
+        offre = creer_offre(1, 1)
+        for url in ['/offres/', f'/offres/{offre.pk}/', '/documents/?types=offres']:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertNonModifie(url, etag)
+
+                offre.save()  # date_modification avance
+                etag = self.assertNonModifie(url, etag, attendu=False)['ETag']
+
+                Client.objects.filter(pk=offre.client_id).update(nom='Renommé')
+                offre.client.save()  # donnée imbriquée (client_nom) : version du modèle Client
+                self.assertNonModifie(url, etag, attendu=False)
+
+    def test_cle_mal_formee(self):
+        for url in ['/offres/abc/', '/clients/abc/', '/offres/999999/']:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_suppression(self):
+        creer_offre(1, 1)
+        autre = creer_offre(1, 1)
+        response = self.client.get('/offres/')
+
+        autre.delete()
+        self.assertNonModifie('/offres/', response['ETag'], attendu=False)
+
+
+class VersionsParTransactionTests(APITransactionTestCase):
+    def test_une_version_par_modele_et_par_transaction(self):
+        affaire = creer_affaire(creer_offre(2, 2))
+        avant = ModelVersion.current([Rapport, Formation])
+
+        with CaptureQueriesContext(connection) as queries:
+            # Suppression des 4 rapports et, en cascade, des 2 formations, en une transaction
+            affaire.offre.sites.clear()
+
+        apres = ModelVersion.current([Rapport, Formation])
+        self.assertEqual({label: version for label, (version, _) in apres.items()},
+                         {label: version + 1 for label, (version, _) in avant.items()})
+        increments = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "document_modelversion"')]
+        self.assertEqual(len(increments), 3, increments)  # offre, rapport, formation
+
+    def version(self, model):
+        return ModelVersion.current([model]).get(model._meta.label_lower, (0, None))[0]
+
+    def test_transaction_suivant_un_rollback(self):
+        avant = self.version(Client)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            ModelVersion.bump_on_commit(Client)
+            raise RuntimeError
+        self.assertEqual(self.version(Client), avant)
+
+        # Le callback abandonné au rollback ne capte pas les modèles de la transaction suivante
+        with transaction.atomic():
+            ModelVersion.bump_on_commit(Client)
+            ModelVersion.bump_on_commit(Client, Site)
+        self.assertEqual(self.version(Client), avant + 1)
+
+    def test_ligne_creee_par_une_transaction_concurrente(self):
+        ModelVersion.bump(Client)
+        avant = self.version(Client)
+        update = QuerySet.update
+        appels = []
+
+        def update_concurrent(queryset, **kwargs):
+            # Premier UPDATE : la ligne n'existe pas encore pour cette transaction
+            appels.append(kwargs)
+            return 0 if len(appels) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_concurrent):
+            ModelVersion.bump(Client)
+        self.assertEqual(self.version(Client), avant + 1)
+
+
+def creer_jeu_complet():
+    """Une chaîne complète offre -> proforma -> affaire (rapports, formations, participants, attestations) -> facture."""
+    offre = creer_offre(2, 2)
+    Proforma.objects.create(offre=offre, client=offre.client, entity=offre.entity, doc_type='PRO')
+    affaire = creer_affaire(offre)
+    Facture.objects.create(affaire=affaire, client=offre.client, entity=offre.entity, doc_type='FAC')
+    for formation in affaire.formations.all():
+        for i in range(2):
+            Participant.objects.create(formation=formation, nom=f"Nom {i}", prenom="Prénom")
+        bulk_create_attestations(formation)
+    return affaire
+
+
+class ListesSansNPlusUnTests(APITestCase):
+    def test_nombre_de_requetes_constant_par_viewset(self):
+        def compter_requetes(url):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            return len(queries)
+
+        urls = [f'/{prefix}/' for prefix, viewset, basename in router.registry]
+        creer_jeu_complet()
+        premiers = {url: compter_requetes(url) for url in urls}
+        for _ in range(3):
+            creer_jeu_complet()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(compter_requetes(url), premiers[url])
+
+
+class ChampsPartielsTests(APITestCase):
+    def test_fields_limite_champs_et_colonnes(self):
+        creer_jeu_complet()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/offres/', {'fields': 'id,reference,statut'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'reference', 'statut'})
+        requete = [q['sql'] for q in queries if 'FROM "document_offre"' in q['sql'] and 'COUNT' not in q['sql']][-1]
+        self.assertNotIn('JOIN', requete)
+        self.assertNotIn('"sequence_number"', requete)
+
+    def test_champ_inconnu_refuse(self):
+        response = self.client.get('/offres/', {'fields': 'id,inexistant'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('inexistant', str(response.data['fields']))
+
+
+class ListesDepuisValuesTests(APITestCase):
+    def test_meme_sortie_que_les_serialiseurs(self):
+        creer_jeu_complet()
+        for prefix, viewset, basename in router.registry:
+            if not hasattr(viewset, 'values_list'):
+                continue
+            for params in ({}, {'page_size': 2}, {'fields': 'id'}):
+                with self.subTest(prefix=prefix, params=params):
+                    rapide = self.client.get(f'/{prefix}/', params)
+                    with mock.patch.object(viewset, 'values_list', False):
+                        reference = self.client.get(f'/{prefix}/', params)
+                    self.assertEqual(rapide.status_code, 200)
+                    self.assertEqual(rapide.content, reference.content)
+
+    def test_listes_principales_prises_en_charge(self):
+        for serializer_class in (OffreListSerializer, RapportListSerializer, AttestationFormationListSerializer):
+            self.assertIsNotNone(values_mapping(serializer_class), serializer_class.__name__)
+
+
+class JSONRapideTests(TestCase):
+    def test_rendu_identique_a_drf(self):
+        offre = creer_offre(2, 2)
+        donnees = {
+            'offre': OffreDetailSerializer(offre).data,
+            'date': now(),
+            'jour': now().date(),
+            'heure': time(8, 30, 15, 120000),
+            'montant': Decimal('1250.50'),
+            'libelle': gettext_lazy('Brouillon'),
+            'uuid': uuid.uuid4(),
+            'texte': 'séparateur \u2028 paragraphe \u2029',
+            1: (1, 2.5, None, True),
+        }
+        self.assertEqual(FastJSONRenderer().render(donnees), JSONRenderer().render(donnees))
+        self.assertEqual(
+            FastJSONRenderer().render(donnees, 'application/json; indent=4'),
+            JSONRenderer().render(donnees, 'application/json; indent=4')
+        )
+
+    def test_flottants_identiques_a_drf(self):
+        for valeur in (1e16, -3e20, 1.2345678901234568e17, 1.5e-7, -2.5e-10, 1e-5, 5e-5, 1e-4, 0.1, -0.0, 1e15):
+            with self.subTest(valeur=valeur):
+                donnees = {'score': valeur, 'liste': [1, valeur], valeur: None}
+                self.assertEqual(FastJSONRenderer().render(donnees), JSONRenderer().render(donnees))
+        for valeur in (float('nan'), float('inf'), float('-inf')):
+            with self.subTest(valeur=valeur):
+                for renderer in (FastJSONRenderer(), JSONRenderer()):
+                    with self.assertRaises(ValueError):
+                        renderer.render({'score': valeur, 'date': None})
+
+    def test_flottants_hors_des_valeurs_simples(self):
+        class MesureSerializer(serializers.Serializer):
+            nom = serializers.CharField()
+            valeur = serializers.FloatField()
+
+        for donnees in (
+            {1e16: 'clé seule'},
+            {'montant': Decimal('1E-7')},
+            {'ensemble': {2.5e-8}},
+            MesureSerializer({'nom': 'a', 'valeur': 1e16}).data,
+            {'results': MesureSerializer([{'nom': 'a', 'valeur': 1e-7}], many=True).data},
+        ):
+            with self.subTest(donnees=donnees):
+                self.assertEqual(FastJSONRenderer().render(donnees), JSONRenderer().render(donnees))
+
+        # Sortie d'un sérialiseur sans champ flottant : pas de parcours
+        offres = [creer_offre(1, 1)]
+        self.assertTrue(float_free(OffreDetailSerializer(offres, many=True).data))
+        self.assertTrue(float_free(OffreListSerializer(offres[0]).data))
+        self.assertFalse(float_free(MesureSerializer({'nom': 'a', 'valeur': 0.5}).data))
+
+    def test_lecture_identique_a_drf(self):
+        for corps in ('{"a": [1, 2.5, "é"], "b": null}', '{"a": NaN}', '{"a": ', str(10 ** 30)):
+            with self.subTest(corps=corps):
+                resultats = []
+                for parser in (FastJSONParser(), JSONParser()):
+                    try:
+                        resultats.append(parser.parse(io.BytesIO(corps.encode())))
+                    except ParseError as e:
+                        resultats.append(str(e))
+                self.assertEqual(resultats[0], resultats[1])
+
+
+@skipUnless(connection.vendor == 'sqlite', "Pragmas propres à SQLite")
+class ProfilSQLiteTests(TestCase):
+    def test_pragmas_appliques_a_la_connexion(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -20000)
+            # Pas de WAL : synchronous reste à FULL
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_pragma_invalide_refuse(self):
+        with connection.cursor() as cursor:
+            for pragmas in (
+                {'busy_timeout': '1; DROP TABLE document_offre'}, {'cache size': 10},
+                {'synchronous': 'NORMAL OFF'}, {'cache_size': '-'},
+            ):
+                with self.subTest(pragmas=pragmas), self.assertRaises(ValueError):
+                    apply_pragmas(cursor, pragmas)
+
+    def test_ordre_des_pragmas(self):
+        base = sqlite3.connect(':memory:')
+        executees = []
+        base.set_trace_callback(executees.append)
+        apply_pragmas(base.cursor(), {'cache_size': -1000, 'journal_mode': 'MEMORY', 'busy_timeout': 100})
+        self.assertEqual(executees, [
+            'PRAGMA busy_timeout = 100', 'PRAGMA journal_mode = MEMORY', 'PRAGMA cache_size = -1000'
+        ])
+        self.assertEqual(base.execute('PRAGMA cache_size').fetchone()[0], -1000)
+        base.close()
+
+    def test_wal_uniquement_sur_demande(self):
+        def versions(chemin):
+            # Octets 18 et 19 de l'en-tête : 1 en journal classique, 2 en WAL
+            with open(chemin, 'rb') as fichier:
+                entete = fichier.read(20)
+            return entete[18], entete[19]
+
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'base.sqlite3')
+            base = sqlite3.connect(chemin)
+            configure(base.cursor(), settings.SQLITE_PRAGMAS)
+            self.assertEqual(base.execute('PRAGMA synchronous').fetchone()[0], 2)
+            base.execute('CREATE TABLE essai (id INTEGER PRIMARY KEY)')
+            base.commit()
+            self.assertEqual(os.listdir(dossier), ['base.sqlite3'])
+            base.close()
+            self.assertEqual(versions(chemin), (1, 1))
+
+            base = sqlite3.connect(chemin)
+            self.assertEqual(enable_wal(base.cursor()), 'wal')
+            base.close()
+            self.assertEqual(versions(chemin), (2, 2))
+
+            # Base en WAL : synchronous=NORMAL, sauf valeur fixée par le profil
+            for pragmas, attendu in (({}, 1), ({'synchronous': 'FULL'}, 2)):
+                base = sqlite3.connect(chemin)
+                configure(base.cursor(), pragmas)
+                self.assertEqual(base.execute('PRAGMA synchronous').fetchone()[0], attendu)
+                base.close()
+
+    def test_db_maintenance(self):
+        sortie = io.StringIO()
+        call_command('db_maintenance', stdout=sortie)
+        self.assertIn('Running ANALYZE', sortie.getvalue())
+        self.assertIn('WAL checkpoint skipped', sortie.getvalue())
+        self.assertIn('completed successfully', sortie.getvalue())
+
+        sortie = io.StringIO()
+        call_command('db_maintenance', '--skip-analyze', stdout=sortie)
+        self.assertNotIn('Running ANALYZE', sortie.getvalue())
+
+        # Base de test en mémoire : pas de WAL possible, l'échec est signalé
+        with self.assertRaises(CommandError):
+            call_command('db_maintenance', '--enable-wal', stdout=io.StringIO())
+
+
+@skipUnless(connection.vendor == 'sqlite', "Index FTS5 propre à SQLite")
+class RechercheTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('recherche'))
+        self.offre = creer_offre(1, 1)
+        self.societe = Client.objects.create(nom="Société Générale d'Électricité", email='contact@sge.example')
+
+    def rechercher(self, **params):
+        response = self.client.get('/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(resultat['type'], resultat['id']) for resultat in response.data['results']]
+
+    def test_prefixes_accents_et_types(self):
+        self.assertEqual(self.rechercher(q=self.offre.reference[:12], types='offres'), [('offres', self.offre.pk)])
+        self.assertIn(('clients', self.societe.pk), self.rechercher(q='societe electr'))
+        self.assertEqual(self.rechercher(q='societe', types='sites'), [])
+
+    def test_index_suit_les_modifications(self):
+        self.societe.nom = 'Nouveau nom'
+        self.societe.save()
+        self.assertEqual(self.rechercher(q='societe'), [])
+        self.assertIn(('clients', self.societe.pk), self.rechercher(q='nouveau'))
+        self.societe.delete()
+        self.assertEqual(self.rechercher(q='nouveau'), [])
+
+    def test_parametre_search_des_viewsets(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/clients/', {'search': 'sge.example'})
+        self.assertEqual([client['id'] for client in response.data['results']], [self.societe.pk])
+        self.assertTrue(any('MATCH' in query['sql'] for query in queries))
+
+    def test_reconstruction(self):
+        self.assertEqual(SearchIndex.rebuild(), Client.objects.count() + Site.objects.count() + Offre.objects.count())
+        self.assertEqual(self.rechercher(q=self.offre.reference), [('offres', self.offre.pk)])
+
+
+class ImportParticipantsTests(APITestCase):
+    def setUp(self):
+        self.formation = creer_affaire(creer_offre(1, 2)).formations.get()
+        Participant.objects.create(formation=self.formation, nom='Diallo', prenom='Awa', email='awa@example.com')
+        self.url = f'/formations/{self.formation.pk}/participants/import/'
+
+    def test_import_csv_avec_doublons_et_erreurs(self):
+        contenu = (
+            "\ufeffNom;Prénom;E-mail;Fonction\n"
+            "Diallo;Awa;AWA@example.com;Technicienne\n"  # déjà inscrite
+            "Koné;Ibrahim;ibrahim@example.com;Chef de chantier\n"
+            "Koné;Ibrahim;ibrahim@example.com;\n"  # répété dans le fichier
+            ";Sans nom;pas-un-email;\n"
+            "Traoré;Mariam;;\n"
+        ).encode('utf-8')
+        with self.assertNumQueries(8):  # + l'incrément de version, après le commit
+            response = self.client.post(self.url, contenu, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['crees'], 2)
+        self.assertEqual(response.data['doublons'], [2, 4])
+        self.assertEqual([erreur['ligne'] for erreur in response.data['erreurs']], [5])
+        self.assertEqual(set(response.data['erreurs'][0]['erreurs']), {'nom', 'email'})
+        self.assertEqual(self.formation.participants.count(), 3)
+        self.assertIsNone(self.formation.participants.get(nom='Traoré').email)
+
+    def test_import_json_et_fichier(self):
+        response = self.client.post(self.url, [{'nom': 'Ba', 'prenom': 'Oumar'}, 'invalide'], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['erreurs'][0]['ligne'], 2)
+
+        fichier = SimpleUploadedFile('participants.csv', b"nom,prenom\nSow,Fatou\n", content_type='text/csv')
+        response = self.client.post(self.url, {'fichier': fichier}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['participants'][0]['formation_titre'], self.formation.titre)
+
+
+@override_settings(ENFORCE_DOCUMENT_PERMISSIONS=True)
+class DroitsParDocumentTests(APITestCase):
+    def setUp(self):
+        self.utilisateur = User.objects.create_user('lecteur')
+        self.client.force_authenticate(self.utilisateur)
+        self.offres = [creer_offre(1, 1) for _ in range(3)]
+        self.accorder(self.offres[0], can_edit=True)
+        self.accorder(self.offres[1])
+
+    def accorder(self, document, can_edit=False):
+        return DocumentPermission.objects.create(user=self.utilisateur, document=document, can_edit=can_edit)
+
+    def test_listes_filtrees_en_sql(self):
+        def lister():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/offres/')
+            return {offre['id'] for offre in response.data['results']}, len(queries)
+
+        ids, requetes = lister()
+        self.assertEqual(ids, {self.offres[0].pk, self.offres[1].pk})
+        for _ in range(5):
+            self.accorder(creer_offre(1, 1))
+        ids, requetes_apres = lister()
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(requetes_apres, requetes)
+
+        response = self.client.get('/documents/flux/')
+        self.assertEqual(response.data['documents_par_type'], {'OFF': 7})
+
+    def test_controle_par_objet(self):
+        self.assertEqual(self.client.get(f'/offres/{self.offres[2].pk}/').status_code, 404)
+        self.assertEqual(self.client.patch(f'/offres/{self.offres[1].pk}/', {'statut': 'ENVOYE'}).status_code, 403)
+        self.assertEqual(self.client.patch(f'/offres/{self.offres[0].pk}/', {'statut': 'ENVOYE'}).status_code, 200)
+
+    def test_validation_en_masse_soumise_aux_droits(self):
+        ids = [offre.pk for offre in self.offres] + [999999]
+        response = self.client.post('/offres/bulk_valider/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [resultat['resultat'] for resultat in response.data['results']],
+            ['VALIDE', 'REFUSE', 'INTROUVABLE', 'INTROUVABLE']
+        )
+        # Offre illisible : même réponse qu'un id inexistant, aucun effet
+        self.assertEqual(response.data['results'][2]['detail'], response.data['results'][3]['detail'])
+        for offre in self.offres[1:]:
+            offre.refresh_from_db()
+            self.assertEqual(offre.statut, 'BROUILLON')
+        self.assertEqual(list(Proforma.objects.values_list('offre', flat=True)), [self.offres[0].pk])
+
+    def test_cache_des_droits_par_requete(self):
+        request = APIRequestFactory().get('/')
+        request.user = self.utilisateur
+        droits = document_permissions(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [droits.can_read(Offre, offre.pk) for offre in self.offres],
+                [True, True, False]
+            )
+            self.assertTrue(droits.can_edit(Offre, self.offres[0].pk))
+        self.assertIs(document_permissions(request), droits)
+
+    def test_droits_de_l_auteur(self):
+        modele = self.offres[2]
+        donnees = {
+            'client': modele.client_id, 'entity': modele.entity_id, 'doc_type': 'OFF',
+            'sites': [modele.sites.get().pk], 'produit': [modele.produit.get().pk]
+        }
+        response = self.client.post('/offres/', donnees, format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = [Offre.objects.latest('pk').pk]
+        response = self.client.post('/offres/bulk/', [donnees, donnees], format='json')
+        ids += [offre['id'] for offre in response.data]
+        for pk in ids:
+            with self.subTest(offre=pk):
+                self.assertEqual(self.client.get(f'/offres/{pk}/').status_code, 200)
+                self.assertEqual(self.client.patch(f'/offres/{pk}/', {'statut': 'ENVOYE'}).status_code, 200)
+
+        # Pas d'affaire sur une offre illisible : la réponse embarquerait l'offre
+        response = self.client.post('/affaires/', {'offre': modele.pk}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Affaire.objects.exists())
+
+        # Sur une offre en lecture seule : l'auteur lit aussi les rapports de l'affaire
+        response = self.client.post('/affaires/', {'offre': self.offres[1].pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        affaire = Affaire.objects.get(pk=response.data['id'])
+        rapport = affaire.rapports.get()
+        self.assertEqual(self.client.get(f'/rapports/{rapport.pk}/').status_code, 200)
+        # ni rattachement d'un document existant à un parent illisible
+        autre = creer_affaire(modele)
+        self.assertEqual(self.client.patch(f'/rapports/{rapport.pk}/', {'affaire': autre.pk}).status_code, 404)
+        rapport.refresh_from_db()
+        self.assertEqual(rapport.affaire, affaire)
+        self.assertFalse(modele.permissions.exists())
+
+    def test_documents_derives_heritent_des_droits(self):
+        autre = User.objects.create_user('autre')
+        DocumentPermission.objects.create(user=autre, document=self.offres[1], can_edit=True)
+        affaire = creer_affaire(self.offres[1])
+        proforma = Proforma.objects.create(offre=self.offres[1], client=affaire.client, entity=affaire.entity, doc_type='PRO')
+        formation = affaire.nouvelle_formation(affaire.rapports.get())
+        formation.save()
+        Participant.objects.create(formation=formation, nom='Diallo', prenom='Awa')
+        derives = [proforma, affaire, *affaire.rapports.all(), *bulk_create_attestations(formation)]
+
+        droits = {
+            (permission.user, permission.document): (permission.can_read, permission.can_edit)
+            for permission in DocumentPermission.objects.exclude(content_type__model='offre')
+        }
+        attendus = {}
+        for document in derives:
+            attendus[self.utilisateur, document] = (True, False)
+            attendus[autre, document] = (True, True)
+        self.assertEqual(droits, attendus)
+
+        # Sans droit sur l'offre, aucun droit sur ce qui en dérive
+        affaire = creer_affaire(self.offres[2])
+        self.assertFalse(any(document.permissions.exists() for document in [affaire, *affaire.rapports.all()]))
+
+    def test_recherche_limitee_aux_documents_lisibles(self):
+        nouvelles = [creer_offre(1, 1) for _ in range(4)]
+        for offre in nouvelles[2:]:
+            self.accorder(offre)
+        attendus = {('offres', offre.pk) for offre in self.offres[:2] + nouvelles[2:]}
+
+        def rechercher():
+            response = self.client.get('/search/', {'q': 'KIP-OFF', 'types': 'offres', 'limit': 4})
+            return {(resultat['type'], resultat['id']) for resultat in response.data['results']}
+
+        # Le LIMIT porte sur les documents lisibles : 4 résultats sur les 7 offres trouvées
+        self.assertEqual(rechercher(), attendus)
+        with mock.patch('document.search.search_available', return_value=False):
+            self.assertEqual(rechercher(), attendus)
+
+
+class DetailsCompletsTests(APITestCase):
+    def test_budget_de_requetes_fixe(self):
+        petite = creer_jeu_complet()
+        grande = creer_affaire(creer_offre(5, 8))
+        for formation in grande.formations.all():
+            Participant.objects.bulk_create(
+                Participant(formation=formation, nom=f"Nom {i}", prenom="Prénom") for i in range(6)
+            )
+            bulk_create_attestations(formation)
+
+        for affaire in (petite, grande):
+            with self.subTest(affaire=affaire.pk), self.assertNumQueries(7):
+                response = self.client.get(f'/affaires/{affaire.pk}/details_complets/')
+            self.assertEqual(response.status_code, 200)
+
+        statistiques = response.data['statistiques']
+        self.assertEqual(statistiques, {
+            'nombre_rapports': 40,
+            'nombre_formations': 20,
+            'nombre_total_participants': 120,
+            'nombre_attestations': 120,
+        })
+        self.assertEqual(len(response.data['formations'][0]['participants']), 6)
+
+
+class PaginationParCurseurTests(APITestCase):
+    def parcourir(self, url, **params):
+        ids, response = [], self.client.get(url, {'page_size': 3, **params})
+        while True:
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [item['id'] for item in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_parcours_complet_sans_doublon(self):
+        affaire = creer_affaire(creer_offre(4, 2))
+        # Dates de création identiques : la clé primaire départage
+        Rapport.objects.update(date_creation=affaire.date_creation)
+
+        ids = self.parcourir('/rapports/')
+        self.assertEqual(ids, list(Rapport.objects.order_by('-date_creation', '-id').values_list('id', flat=True)))
+        self.assertEqual(self.parcourir(f'/affaires/{affaire.pk}/rapports/'), ids)
+        self.assertEqual(
+            self.parcourir('/rapports/', ordering='date_creation'),
+            list(Rapport.objects.order_by('date_creation', 'id').values_list('id', flat=True))
+        )
+
+    def test_tri_sur_champ_facultatif(self):
+        for i in range(5):
+            affaire = creer_affaire(creer_offre(1, 1))
+            if i % 2:
+                Affaire.objects.filter(pk=affaire.pk).update(date_fin_prevue=now())
+
+        ids = self.parcourir('/affaires/', ordering='-date_fin_prevue')
+        self.assertEqual(sorted(ids), sorted(Affaire.objects.values_list('id', flat=True)))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_tri_inapplicable_refuse(self):
+        creer_affaire(creer_offre(1, 1))
+        for ordering in ('client__nom', '-inconnu', 'date_creation,client__nom'):
+            with self.subTest(ordering=ordering):
+                response = self.client.get('/rapports/', {'ordering': ordering})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ordering', response.data)
+        with self.assertRaises(ValidationError):
+            KeysetPagination().get_ordering(Rapport.objects.order_by('client__nom'))
+
+    def test_taille_de_page_bornee(self):
+        creer_affaire(creer_offre(15, 15))
+        response = self.client.get('/rapports/', {'page_size': 10000})
+        self.assertEqual(len(response.data['results']), 200)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Plans d'exécution propres à SQLite")
+class PlansDeRequeteTests(TestCase):
+    """Les requêtes les plus fréquentes sur les documents doivent passer par un index."""
+
+    def assertUtiliseUnIndex(self, queryset):
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        self.assertNotRegex(plan, rf"SCAN {table}\b(?! USING)", plan)
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan, plan)
+
+    def test_requetes_frequentes(self):
+        entity = Entity.objects.create(code='KIP', name='KIP')
+        client = Client.objects.create(nom='Client')
+        for model in DOCUMENT_MODELS:
+            document = model(entity=entity, client=client, doc_type=model.reference_code)
+            with self.subTest(model=model.__name__):
+                # Filtres de allocate_sequence_number : l'offre ne précise pas son type
+                filtres = {} if model is Offre else {'doc_type': model.reference_code}
+                self.assertUtiliseUnIndex(document.sequence_queryset(now(), **filtres))
+                self.assertUtiliseUnIndex(model.objects.filter(client=client).order_by('-date_creation'))
+                self.assertUtiliseUnIndex(model.objects.filter(entity=entity).order_by('-date_creation'))
+                self.assertUtiliseUnIndex(model.objects.filter(statut='BROUILLON').order_by('-date_creation'))
+                # Page profonde de la pagination par curseur : lecture à partir du curseur, sans OFFSET
+                self.assertUtiliseUnIndex(model.objects.filter(
+                    keyset_filter(model, ('-date_creation', '-id'), [now().isoformat(), 1000])
+                ).order_by('-date_creation', '-id'))
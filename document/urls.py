@@ -1,5 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .DocumentAggregator import DocumentAggregatorView, DocumentFeedView
+from .search import SearchView
 from .views import (
     EntityViewSet,
     ClientViewSet,
@@ -14,6 +16,7 @@ from .views import (
     FormationViewSet,
     ParticipantViewSet,
     AttestationFormationViewSet,
+    JobViewSet,
 )
 
 # Création du router
@@ -33,6 +36,7 @@ router.register(r'rapports', RapportViewSet, basename='rapport')
 router.register(r'formations', FormationViewSet, basename='formation')
 router.register(r'participants', ParticipantViewSet, basename='participant')
 router.register(r'attestations', AttestationFormationViewSet, basename='attestation')
+router.register(r'jobs', JobViewSet, basename='job')
 
 app_name = 'api'
 
@@ -40,6 +44,13 @@ app_name = 'api'
 urlpatterns = [
     # Inclusion des URLs générées par le router
     path('', include(router.urls)),
+
+    # Agrégateur de documents
+    path('documents/', DocumentAggregatorView.as_view(), name='document-aggregator'),
+    path('documents/flux/', DocumentFeedView.as_view(), name='document-feed'),
+
+    # Recherche plein texte
+    path('search/', SearchView.as_view(), name='search'),
     
     # URLs d'authentification de DRF
     path('auth/', include('rest_framework.urls', namespace='rest_framework')),
@@ -51,7 +62,16 @@ urlpatterns = [
 # /api/clients/
 # /api/clients/{pk}/
 # /api/clients/{pk}/sites/
+# /api/clients/{pk}/documents/
 # /api/offres/
 # /api/offres/{pk}/
+# /api/offres/bulk/
+# /api/offres/bulk_valider/
 # /api/offres/{pk}/valider/
+# /api/formations/{pk}/generer_attestations/
+# /api/formations/{pk}/participants/import/
+# /api/jobs/{pk}/
+# /api/documents/
+# /api/documents/flux/
+# /api/search/?q=
 # etc...
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Chemin de lecture rapide des listes : lignes construites depuis QuerySet.values().
+
+La correspondance champ du sérialiseur -> colonne (`client_nom` <- `client__nom`) est
+calculée une fois par classe ; chaque ligne est ensuite produite sans instancier de
+modèle ni parcourir le sérialiseur. Le rendu reste celui des champs DRF
+(`to_representation`), la forme JSON est donc identique à celle du sérialiseur.
+
+Pris en charge : champs de modèle, sources pointées à travers des clés étrangères,
+clés primaires de relations simples et sérialiseurs imbriqués sur une relation simple.
+Un SerializerMethodField n'est accepté que si le sérialiseur déclare ses colonnes dans
+Meta (`values_sources = {'participant_nom': ['participant__nom', ...]}`) et fournit
+`values_<nom>(*valeurs)`. Sinon la liste passe par le sérialiseur.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+from rest_framework.relations import PKOnlyObject
+from rest_framework.response import Response
+from rest_framework.utils.serializer_helpers import ReturnList
+
+
+class Unsupported(Exception):
+    """Le sérialiseur ne peut pas être rendu depuis values()."""
+
+
+@lru_cache(maxsize=None)
+def values_mapping(serializer_class, fields=None):
+    """
+    (colonnes à lire, fonction ligne -> dict) pour `serializer_class` restreint à `fields`,
+    ou None si un champ n'est pas pris en charge.
+    """
+    columns = []
+    try:
+        build = compile_serializer(serializer_class(), '', columns, fields)
+    except Unsupported:
+        return None
+    return tuple(dict.fromkeys(columns)), build
+
+
+def compile_serializer(serializer, prefix, columns, fields=None):
+    model = serializer.Meta.model
+    values_sources = getattr(serializer.Meta, 'values_sources', {})
+    writers = []
+    for name, field in serializer.fields.items():
+        if field.write_only or (fields is not None and name not in fields):
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            writers.append(compile_method(serializer, name, values_sources, prefix, columns))
+        elif isinstance(field, serializers.BaseSerializer):
+            writers.append(compile_nested(model, name, field, prefix, columns))
+        else:
+            writers.append(compile_field(model, name, field, prefix, columns))
+
+    def build(row):
+        ret = {}
+        for write in writers:
+            write(row, ret)
+        return ret
+    return build
+
+
+def compile_field(model, name, field, prefix, columns):
+    if field.source == '*' or isinstance(field, (serializers.ManyRelatedField, serializers.HyperlinkedRelatedField)):
+        raise Unsupported(name)
+
+    # Relations traversées (gardes : une relation vide rend le champ absent, comme DRF)
+    attrs = field.source.split('.')
+    guards, path, current = [], [], model
+    for position, attr in enumerate(attrs):
+        try:
+            model_field = current._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise Unsupported(name)
+        if model_field.is_relation and (model_field.many_to_many or model_field.one_to_many or not model_field.concrete):
+            raise Unsupported(name)
+        path.append(attr)
+        if not model_field.is_relation:
+            if position != len(attrs) - 1:
+                raise Unsupported(name)
+            break
+        if position == len(attrs) - 1:
+            break
+        guards.append(prefix + '__'.join(path))
+        current = model_field.related_model
+        # `client.id` se lit dans la clé étrangère, sans jointure
+        if attrs[position + 1] == current._meta.pk.name and position + 1 == len(attrs) - 1:
+            break
+
+    column = prefix + '__'.join(path)
+    columns.extend(guards)
+    columns.append(column)
+    to_representation = field.to_representation
+    is_relation = isinstance(field, serializers.RelatedField)
+
+    def write(row, ret):
+        for guard in guards:
+            if row[guard] is None:
+                try:
+                    ret[name] = missing_value(field)
+                except SkipField:
+                    pass
+                return
+        value = row[column]
+        if value is None:
+            ret[name] = None
+        else:
+            ret[name] = to_representation(PKOnlyObject(pk=value) if is_relation else value)
+    return write
+
+
+def missing_value(field):
+    """Valeur d'un champ dont la source traverse une relation vide (voir Field.get_attribute)."""
+    if field.default is not empty:
+        return field.get_default()
+    if field.allow_null:
+        return None
+    raise SkipField()
+
+
+def compile_nested(model, name, serializer, prefix, columns):
+    if isinstance(serializer, serializers.ListSerializer) or '.' in serializer.source:
+        raise Unsupported(name)
+    try:
+        relation = model._meta.get_field(serializer.source)
+    except FieldDoesNotExist:
+        raise Unsupported(name)
+    if not relation.is_relation or not relation.concrete or relation.many_to_many:
+        raise Unsupported(name)
+
+    guard = prefix + serializer.source
+    columns.append(guard)
+    build = compile_serializer(serializer, guard + '__', columns)
+
+    def write(row, ret):
+        ret[name] = None if row[guard] is None else build(row)
+    return write
+
+
+def compile_method(serializer, name, values_sources, prefix, columns):
+    method = getattr(serializer, f'values_{name}', None)
+    if name not in values_sources or method is None:
+        raise Unsupported(name)
+    sources = [prefix + source for source in values_sources[name]]
+    columns.extend(sources)
+
+    def write(row, ret):
+        ret[name] = method(*(row[source] for source in sources))
+    return write
+
+
+class ValuesListMixin:
+    """
+    Action list d'un viewset servie depuis values() quand son sérialiseur s'y prête
+    (voir values_mapping) ; `values_list = False` la désactive pour un viewset.
+    """
+    values_list = True
+
+    def list(self, request, *args, **kwargs):
+        mapping = None
+        if self.values_list:
+            mapping = values_mapping(self.get_serializer_class(), self.get_requested_fields())
+        if mapping is None:
+            return super().list(request, *args, **kwargs)
+
+        columns, build = mapping
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is not None:
+            ordering = self.paginator.get_ordering(queryset)
+            columns = tuple(dict.fromkeys(columns + tuple(field.lstrip('-') for field in ordering)))
+        rows = queryset.prefetch_related(None).values(*columns)
+
+        # ReturnList, comme serializer.data : le rendu sait quel sérialiseur a produit les lignes
+        serializer = self.get_serializer(many=True)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(ReturnList([build(row) for row in page], serializer=serializer))
+        return Response(ReturnList([build(row) for row in rows], serializer=serializer))
@@ -1,11 +1,32 @@
-from rest_framework import viewsets, status, filters
+import codecs
+import csv
+
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.reverse import reverse
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
 from django_filters.rest_framework import DjangoFilterBackend
+from . import jobs
+from .conditional import ConditionalGetMixin
+from .optimizer import optimize, serializer_columns
+from .pagination import KeysetOrderingFilter
+from .parsers import CSVParser, FastJSONParser, csv_rows
+from .permissions import (
+    DocumentPermissionFilter, HasDocumentPermission, check_parent_readable, created_by, document_permissions,
+    enforced, readable
+)
+from .search import FullTextSearchFilter
+from .values import ValuesListMixin
 from .models import (
     Entity, Client, Site, Category, Product, Offre, Proforma, 
-    Affaire, Facture, Rapport, Formation, Participant, AttestationFormation
+    Affaire, Facture, Rapport, Formation, Participant, AttestationFormation, Job, DocumentIndex, ModelVersion
 )
 from .serializers import (
     # Entity serializers
@@ -19,7 +40,7 @@ from .serializers import (
     # Product serializers
     ProductListSerializer, ProductDetailSerializer, ProductEditSerializer,
     # Offre serializers
-    OffreListSerializer, OffreDetailSerializer, OffreEditSerializer,
+    OffreListSerializer, OffreDetailSerializer, OffreEditSerializer, OffreBulkCreateSerializer, BulkIdsSerializer,
     # Proforma serializers
     ProformaListSerializer, ProformaDetailSerializer, ProformaEditSerializer,
     # Affaire serializers
@@ -34,11 +55,72 @@ from .serializers import (
     ParticipantListSerializer, ParticipantDetailSerializer, ParticipantEditSerializer,
     # AttestationFormation serializers
     AttestationFormationListSerializer, AttestationFormationDetailSerializer, AttestationFormationEditSerializer,
+    # Job serializers
+    JobSerializer,
 )
+from .DocumentAggregator import document_feed
+from .services import bulk_create_attestations, bulk_create_offres, bulk_valider_offres, import_participants
 
-class BaseModelViewSet(viewsets.ModelViewSet):
+class BaseModelViewSet(ConditionalGetMixin, ValuesListMixin, viewsets.ModelViewSet):
     # permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Droits par document, sans effet tant que ENFORCE_DOCUMENT_PERMISSIONS est inactif
+    permission_classes = [HasDocumentPermission]
+    # ?search= : index plein texte pour les modèles indexés (voir document/search.py)
+    filter_backends = [DocumentPermissionFilter, DjangoFilterBackend, FullTextSearchFilter, KeysetOrderingFilter]
+    # Actions dont le queryset est préchargé d'après leur sérialiseur (les actions
+    # personnalisées préchargent elles-mêmes ce qu'elles sérialisent)
+    optimized_actions = ('list', 'retrieve', 'update', 'partial_update')
+
+    fields_query_param = 'fields'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.optimized_actions:
+            queryset = optimize(queryset, self.get_serializer_class(), self.get_requested_fields())
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_requested_fields()
+        if fields and self.action in self.optimized_actions:
+            # Seules les colonnes des champs demandés sont lues, plus celles du tri (curseur)
+            columns = serializer_columns(self.get_serializer_class(), fields)
+            if columns is not None:
+                ordering = self.paginator.get_ordering(queryset) if self.paginator else ()
+                queryset = queryset.only(*columns, *(field.lstrip('-') for field in ordering))
+        return queryset
+
+    def perform_create(self, serializer):
+        check_parent_readable(self.request, self.queryset.model, serializer.validated_data)
+        # L'auteur reçoit lecture et écriture sur le document et sur ceux qui en dérivent
+        with created_by(self.request.user):
+            serializer.save()
+
+    def perform_update(self, serializer):
+        check_parent_readable(self.request, self.queryset.model, serializer.validated_data)
+        serializer.save()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+
+    def get_requested_fields(self):
+        """
+        Champs demandés par ?fields=id,reference,... (lectures uniquement), ou None.
+        Un nom absent du sérialiseur donne une erreur 400.
+        """
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = None
+            raw = self.request.query_params.get(self.fields_query_param) if self.request else None
+            if raw and self.request.method in SAFE_METHODS:
+                fields = frozenset(name.strip() for name in raw.split(',') if name.strip())
+                available = self.get_serializer_class()().fields
+                unknown = sorted(fields - set(available))
+                if unknown:
+                    raise ValidationError({self.fields_query_param: f"Champs inconnus : {', '.join(unknown)}."})
+                self._requested_fields = fields or None
+        return self._requested_fields
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -47,6 +129,17 @@ class BaseModelViewSet(viewsets.ModelViewSet):
             return self.edit_serializer_class
         return self.detail_serializer_class
 
+def job_accepted_response(request, job, detail):
+    """Réponse 202 renvoyée quand une cascade est déléguée à la file de jobs."""
+    return Response(
+        {
+            "detail": detail,
+            "job": job.pk,
+            "status_url": reverse('api:job-detail', args=[job.pk], request=request),
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
 class EntityViewSet(BaseModelViewSet):
     queryset = Entity.objects.all()
     serializer_class = EntityListSerializer
@@ -68,9 +161,15 @@ class ClientViewSet(BaseModelViewSet):
     @action(detail=True, methods=['get'])
     def sites(self, request, pk=None):
         client = self.get_object()
-        sites = Site.objects.filter(client=client)
-        serializer = SiteListSerializer(sites, many=True)
-        return Response(serializer.data)
+        sites = optimize(Site.objects.filter(client=client), SiteListSerializer)
+        serializer = SiteListSerializer(self.paginate_queryset(sites), many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def documents(self, request, pk=None):
+        """Tous les documents du client, tous types confondus (voir DocumentIndex)."""
+        client = self.get_object()
+        return document_feed(request, DocumentIndex.objects.filter(client=client))
     
 class SiteViewSet(BaseModelViewSet):
     queryset = Site.objects.all()
@@ -112,10 +211,44 @@ class OffreViewSet(BaseModelViewSet):
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return OffreEditSerializer
+        elif self.action == 'bulk':
+            return OffreBulkCreateSerializer
+        elif self.action == 'bulk_valider':
+            return BulkIdsSerializer
         elif self.action == 'list':
             return OffreListSerializer
         return OffreDetailSerializer
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+        with created_by(request.user):
+            offres = bulk_create_offres(serializer.validated_data)
+        return Response(
+            OffreListSerializer(offres, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['post'])
+    def bulk_valider(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        refus = {}
+        if enforced(request):
+            # Mêmes droits qu'en GET /offres/{pk}/ et POST /offres/{pk}/valider/ : une offre
+            # illisible est introuvable, une offre en lecture seule est refusée
+            droits = document_permissions(request)
+            for pk in ids:
+                if not droits.can_read(Offre, pk):
+                    refus[pk] = {'id': pk, 'resultat': 'INTROUVABLE', 'detail': "Offre introuvable."}
+                elif not droits.can_edit(Offre, pk):
+                    refus[pk] = {'id': pk, 'resultat': 'REFUSE', 'detail': "Droits insuffisants sur cette offre."}
+        autorisees = [pk for pk in ids if pk not in refus]
+        resultats = iter(bulk_valider_offres(autorisees) if autorisees else ())
+        return Response({"results": [refus.get(pk) or next(resultats) for pk in ids]})
+
     @action(detail=True, methods=['post'])
     def valider(self, request, pk=None):
         offre = self.get_object()
@@ -124,9 +257,20 @@ class OffreViewSet(BaseModelViewSet):
                 {"detail": "Seule une offre en brouillon peut être validée."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        offre.statut = 'VALIDE'
-        offre.save()
-        return Response({"detail": "Offre validée avec succès."})
+        with transaction.atomic():
+            # UPDATE conditionnel : la cascade (proforma) est exécutée par la file de jobs
+            validee = Offre.objects.filter(pk=offre.pk, statut='BROUILLON').update(
+                statut='VALIDE', date_validation=now(), date_modification=now()
+            )
+            if not validee:
+                return Response(
+                    {"detail": "Seule une offre en brouillon peut être validée."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            DocumentIndex.refresh(Offre, [offre.pk])
+            ModelVersion.bump_on_commit(Offre)
+            job = jobs.enqueue('valider_offre', offre_id=offre.pk)
+        return job_accepted_response(request, job, "Offre validée, création du proforma en cours.")
 
 class ProformaViewSet(BaseModelViewSet):
     queryset = Proforma.objects.all()
@@ -145,9 +289,23 @@ class ProformaViewSet(BaseModelViewSet):
                 {"detail": "Seul un proforma en brouillon peut être validé."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        proforma.statut = 'VALIDE'
-        proforma.save()
-        return Response({"detail": "Proforma validé avec succès."})
+        return self.valider_en_arriere_plan(request, proforma, 'BROUILLON')
+
+    def valider_en_arriere_plan(self, request, proforma, statut_actuel):
+        """Passe le proforma en VALIDE et délègue la création de l'affaire à la file de jobs."""
+        with transaction.atomic():
+            valide = Proforma.objects.filter(pk=proforma.pk, statut=statut_actuel).update(
+                statut='VALIDE', date_modification=now()
+            )
+            if not valide:
+                return Response(
+                    {"detail": "Le statut du proforma a changé entre-temps."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            DocumentIndex.refresh(Proforma, [proforma.pk])
+            ModelVersion.bump_on_commit(Proforma)
+            job = jobs.enqueue('valider_proforma', proforma_id=proforma.pk)
+        return job_accepted_response(request, job, "Proforma validé, création de l'affaire en cours.")
     
     @action(detail=True, methods=['post'])
     def change_status(self, request, pk=None):
@@ -169,6 +327,9 @@ class ProformaViewSet(BaseModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        if new_status == 'VALIDE':
+            return self.valider_en_arriere_plan(request, proforma, proforma.statut)
+
         # Mettre à jour le statut
         proforma.statut = new_status
         proforma.save()
@@ -190,79 +351,91 @@ class AffaireViewSet(BaseModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        affaire = serializer.save()
-        response_serializer = self.detail_serializer_class(affaire)
+        self.perform_create(serializer)
+        response_serializer = self.detail_serializer_class(serializer.instance)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'])
     def rapports(self, request, pk=None):
         affaire = self.get_object()
-        rapports = Rapport.objects.filter(affaire=affaire)
-        serializer = RapportListSerializer(rapports, many=True)
-        return Response(serializer.data)
+        rapports = optimize(readable(Rapport.objects.filter(affaire=affaire), request), RapportListSerializer)
+        serializer = RapportListSerializer(self.paginate_queryset(rapports), many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def formations(self, request, pk=None):
         affaire = self.get_object()
-        formations = Formation.objects.filter(affaire=affaire)
-        serializer = FormationListSerializer(formations, many=True)
-        return Response(serializer.data)
+        formations = optimize(Formation.objects.filter(affaire=affaire), FormationListSerializer)
+        serializer = FormationListSerializer(self.paginate_queryset(formations), many=True)
+        return self.get_paginated_response(serializer.data)
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'details_complets':
+            queryset = self.details_complets_queryset(queryset)
+        return queryset
+
+    def details_complets_queryset(self, queryset):
+        """
+        Tout ce que sérialise details_complets, en un nombre fixe de requêtes : les relations
+        simples en jointure, chaque relation multiple en une requête, les statistiques en
+        sous-requêtes annotées sur l'affaire.
+        Les Prefetch gardent le cache du gestionnaire (pas de to_attr) : les identifiants
+        (AffaireDetailSerializer, FormationDetailSerializer) et les listes détaillées sont
+        lus dans la même requête.
+        """
+        def total(model, lookup):
+            return Coalesce(Subquery(
+                model.objects.filter(**{lookup: OuterRef('pk')}).order_by()
+                .values(lookup).annotate(total=Count('pk')).values('total')
+            ), 0)
+
+        formations = Formation.objects.order_by('pk').prefetch_related(
+            Prefetch('participants', queryset=optimize(Participant.objects.order_by('pk'), ParticipantListSerializer)),
+            Prefetch('attestations', queryset=optimize(
+                AttestationFormation.objects.order_by('pk'), AttestationFormationListSerializer
+            )),
+        )
+        return queryset.select_related(
+            'client', 'offre__client', 'offre__entity', 'facture__affaire__client', 'facture__affaire__offre'
+        ).prefetch_related(
+            Prefetch('offre__produit', queryset=optimize(Product.objects.all(), ProductListSerializer)),
+            Prefetch('offre__sites', queryset=optimize(Site.objects.all(), SiteListSerializer)),
+            Prefetch('rapports', queryset=optimize(Rapport.objects.order_by('pk'), RapportListSerializer)),
+            Prefetch('formations', queryset=formations),
+        ).annotate(
+            nombre_rapports=total(Rapport, 'affaire'),
+            nombre_formations=total(Formation, 'affaire'),
+            nombre_total_participants=total(Participant, 'formation__affaire'),
+            nombre_attestations=total(AttestationFormation, 'affaire'),
+        )
+
     @action(detail=True, methods=['get'])
     def details_complets(self, request, pk=None):
         affaire = self.get_object()
 
-        # Récupérer l'offre associée avec ses détails
-        offre_serializer = OffreDetailSerializer(affaire.offre)
-
-        # Récupérer le client associé avec ses détails
-        client_serializer = ClientDetailSerializer(affaire.client)
-
-
-        # Récupérer les rapports
-        rapports = Rapport.objects.filter(affaire=affaire)
-        rapports_serializer = RapportListSerializer(rapports, many=True)
-
-        # Récupérer les formations et leurs participants
-        formations = Formation.objects.filter(affaire=affaire)
-        formations_data = []
-
-        for formation in formations:
-            formation_serializer = FormationDetailSerializer(formation)
-            participants = Participant.objects.filter(formation=formation)
-            participants_serializer = ParticipantListSerializer(participants, many=True)
-
-            # Récupérer les attestations pour cette formation
-            attestations = AttestationFormation.objects.filter(formation=formation)
-            attestations_serializer = AttestationFormationListSerializer(attestations, many=True)
-
-            formations_data.append({
-                'formation': formation_serializer.data,
-                'participants': participants_serializer.data,
-                'attestations': attestations_serializer.data
-            })
-
-        # Récupérer la facture si elle existe
-        try:
-            facture = Facture.objects.get(affaire=affaire)
-            facture_serializer = FactureDetailSerializer(facture)
-            facture_data = facture_serializer.data
-        except Facture.DoesNotExist:
-            facture_data = None
+        formations_data = [
+            {
+                'formation': FormationDetailSerializer(formation).data,
+                'participants': ParticipantListSerializer(formation.participants.all(), many=True).data,
+                'attestations': AttestationFormationListSerializer(formation.attestations.all(), many=True).data
+            }
+            for formation in affaire.formations.all()
+        ]
 
-        # Assembler toutes les données
+        facture = getattr(affaire, 'facture', None)
         data = {
             'affaire': AffaireDetailSerializer(affaire).data,
-            'client': client_serializer.data,
-            'offre': offre_serializer.data,
-            'rapports': rapports_serializer.data,
+            'client': ClientDetailSerializer(affaire.client).data,
+            'offre': OffreDetailSerializer(affaire.offre).data,
+            'rapports': RapportListSerializer(affaire.rapports.all(), many=True).data,
             'formations': formations_data,
-            'facture': facture_data,
+            'facture': FactureDetailSerializer(facture).data if facture else None,
             'statistiques': {
-                'nombre_rapports': rapports.count(),
-                'nombre_formations': formations.count(),
-                'nombre_total_participants': Participant.objects.filter(formation__affaire=affaire).count(),
-                'nombre_attestations': AttestationFormation.objects.filter(affaire=affaire).count(),
+                'nombre_rapports': affaire.nombre_rapports,
+                'nombre_formations': affaire.nombre_formations,
+                'nombre_total_participants': affaire.nombre_total_participants,
+                'nombre_attestations': affaire.nombre_attestations,
             }
         }
 
@@ -298,9 +471,67 @@ class FormationViewSet(BaseModelViewSet):
     @action(detail=True, methods=['get'])
     def participants(self, request, pk=None):
         formation = self.get_object()
-        participants = Participant.objects.filter(formation=formation)
-        serializer = ParticipantListSerializer(participants, many=True)
-        return Response(serializer.data)
+        participants = optimize(Participant.objects.filter(formation=formation), ParticipantListSerializer)
+        serializer = ParticipantListSerializer(self.paginate_queryset(participants), many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True,
+        methods=['post'],
+        url_path='participants/import',
+        parser_classes=[FastJSONParser, CSVParser, MultiPartParser]
+    )
+    def import_participants(self, request, pk=None):
+        """
+        Import de participants : tableau JSON, corps text/csv ou fichier CSV / JSON envoyé
+        dans le champ `fichier`. Colonnes : nom, prenom, email, telephone, fonction.
+        Les lignes invalides sont rapportées avec leur numéro, les autres importées.
+        """
+        formation = self.get_object()
+        try:
+            rapport = import_participants(formation, self.import_rows(request))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ValidationError({"fichier": f"Fichier illisible : {e}"})
+
+        participants = rapport['participants']
+        return Response(
+            {
+                "detail": f"{len(participants)} participant(s) importé(s).",
+                "crees": len(participants),
+                "doublons": rapport['doublons'],
+                "erreurs": rapport['erreurs'],
+                "participants": ParticipantListSerializer(participants, many=True).data,
+            },
+            status=status.HTTP_201_CREATED if participants else status.HTTP_200_OK
+        )
+
+    def import_rows(self, request):
+        """Lignes (numéro, dict) de la requête d'import, lues au fil de l'eau."""
+        fichier = request.FILES.get('fichier')
+        if fichier is not None:
+            if fichier.name.lower().endswith('.json'):
+                data = FastJSONParser().parse(fichier)
+            else:
+                return csv_rows(codecs.getreader('utf-8')(fichier))
+        else:
+            data = request.data
+        if isinstance(data, list):
+            return enumerate(data, 1)
+        if hasattr(data, '__next__'):  # corps text/csv
+            return data
+        raise ValidationError({"detail": "Un tableau JSON ou un fichier CSV (champ `fichier`) est attendu."})
+
+    @action(detail=True, methods=['post'])
+    def generer_attestations(self, request, pk=None):
+        formation = self.get_object()
+        attestations = bulk_create_attestations(formation)
+        return Response(
+            {
+                "detail": f"{len(attestations)} attestation(s) générée(s).",
+                "attestations": AttestationFormationListSerializer(attestations, many=True).data,
+            },
+            status=status.HTTP_201_CREATED if attestations else status.HTTP_200_OK
+        )
 
 class ParticipantViewSet(BaseModelViewSet):
     queryset = Participant.objects.all()
@@ -318,4 +549,11 @@ class AttestationFormationViewSet(BaseModelViewSet):
     edit_serializer_class = AttestationFormationEditSerializer
     filterset_fields = ['affaire', 'formation', 'participant']
     search_fields = ['reference']
-    ordering_fields = ['date_creation']
\ No newline at end of file
+    ordering_fields = ['date_creation']
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
+    filterset_fields = ['name', 'statut']
+    ordering_fields = ['date_creation']